@@ -1,18 +1,32 @@
 """HTML/JSON documents parser into Pydantic models"""
 
+from typing import TYPE_CHECKING, Any
+
 from pydantic import ValidationError
 
 from .base import DistilledObject as Distilled, UnsupportedMarkupDistiller
 from .nodes import InvalidNode, Node, NodeKind, TextNode
 
-try:
+if TYPE_CHECKING:
     from .markup import MarkupDistiller
-except ModuleNotFoundError:  # pragma: no cover
-    MarkupDistiller = UnsupportedMarkupDistiller  # type: ignore
 
 
 DistillerError = ValidationError
 
+
+# Markup distiller depends on HTML parsing packages, which are slow to import,
+# so these are imported on first access only, e.g. not at all for deserialization
+def __getattr__(name: str) -> Any:
+    if name != 'MarkupDistiller':
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    try:
+        from .markup import MarkupDistiller
+    except ModuleNotFoundError:  # pragma: no cover
+        MarkupDistiller = UnsupportedMarkupDistiller  # type: ignore
+    globals()[name] = MarkupDistiller
+    return MarkupDistiller
+
+
 __all__ = (
     'MarkupDistiller',
     'Distilled',
@@ -1,5 +1,8 @@
+from functools import partial
+from mmap import mmap
 from types import ModuleType
 from typing import (
+    TYPE_CHECKING,
     Any,
     AsyncIterator,
     Awaitable,
@@ -7,26 +10,48 @@ from typing import (
     Dict,
     Iterable,
     Iterator,
+    List,
     MutableSequence,
+    Optional,
     Sequence,
     Set,
     Tuple,
     Type,
+    Union,
 )
 
-from pydantic import BaseModel, Field
-from pydantic.schema import schema
+from pydantic import BaseModel, Field, PrivateAttr
 
+from .codegen import compile_node_codecs
+from .interning import Interner
 from .nodes import (
+    DESERIALIZE_CACHED,
+    DESERIALIZE_LAZY,
+    DESERIALIZE_MATERIALIZED,
+    DESERIALIZE_MODES,
     AllowedAttrs,
     AnyNode,
+    InvalidNode,
+    LazyNodeList,
+    Node,
     NodeType,
+    TextNode,
     deserialize_nodelist,
     load_nodes_types_from_module,
     nodelist_to_html,
     nodelist_to_plaintext,
     serialize_nodelist,
 )
+from .stats import STAGE_FINALIZE, DistillationStats, measure
+
+# Features beyond distillation and deserialization are imported on first use only,
+# see startup benchmark
+if TYPE_CHECKING:
+    from .binary import BinarySource, FilePath
+    from .chunks import DocumentChunk
+    from .columns import NodeColumns
+    from .diff import Patch
+    from .index import NodesIndex
 
 DistillerError = ValueError
 DistillationResult = Tuple['DistilledObject', Sequence[DistillerError]]
@@ -38,6 +63,7 @@ class BaseDistiller:
     return_type: Type['DistilledObject']
     registry: 'Registry'
     context: Dict[str, Any]
+    interner: Optional[Interner]
 
     class Registry(Set[NodeType]):
         def indexed(self) -> Dict[str, NodeType]:
@@ -50,8 +76,10 @@ class BaseDistiller:
         include: Iterable[str] = None,
         exclude: Iterable[str] = None,
         context: Dict[str, Any] = None,
+        interner: Interner = None,
     ):
         self.registry = self.Registry(load_nodes_types_from_module(types_module))
+        compile_node_codecs((Node, TextNode, InvalidNode, *self.registry))
         self.return_type = return_type or DistilledObject
         assert issubclass(
             self.return_type, DistilledObject
@@ -59,6 +87,7 @@ class BaseDistiller:
         self.include = set(include or ())
         self.exclude = set(exclude or ())
         self.context = context or {}
+        self.interner = interner
 
     def __call__(
         self,
@@ -68,7 +97,23 @@ class BaseDistiller:
     ) -> DistillationResult:
         ...  # pragma: no cover
 
+    def distill_many_threaded(
+        self,
+        sources: Iterable[Any],
+        context: Dict[str, Any] = None,
+        raise_validation_error: bool = False,
+        workers: int = None,
+    ) -> List[DistillationResult]:
+        # Results go in order of sources, see MarkupDistiller on thread safety
+        from concurrent.futures import ThreadPoolExecutor
+
+        distill = partial(self, context=context, raise_validation_error=raise_validation_error)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(distill, sources))
+
     def schema(self, title: str = None, description: str = None) -> Dict[str, Any]:
+        from pydantic.schema import schema
+
         return schema(self.registry, title=title, description=description)  # type: ignore
 
     def deserialize(
@@ -76,19 +121,124 @@ class BaseDistiller:
         nodes: Iterable[Dict[str, Any]],
         finalize_nodes: bool = False,
         context: Dict[str, Any] = None,
+        mode: str = DESERIALIZE_LAZY,
         **values: Any,
     ) -> 'DistilledObject':
+        assert mode in DESERIALIZE_MODES, 'Invalid deserialization mode'
         deserialized = deserialize_nodelist(
-            nodes, types_index=self.registry.indexed(), context=context
+            nodes,
+            types_index=self.registry.indexed(),
+            context=context,
+            interner=self.interner,
+            mode=mode,
         )
-        return self.return_type.construct(
-            nodes=tuple(deserialized) if finalize_nodes else deserialized, **values
+        # Top-level nodes are materialized for finalization in any mode
+        nodes_: Iterable[AnyNode] = deserialized
+        if finalize_nodes or mode == DESERIALIZE_MATERIALIZED:
+            nodes_ = tuple(deserialized)
+        elif mode == DESERIALIZE_CACHED:
+            nodes_ = LazyNodeList(deserialized)
+        return self.return_type.construct(nodes=nodes_, **values)
+
+    def apply_patch(
+        self, obj: 'DistilledObject', patch: 'Patch', mode: str = DESERIALIZE_CACHED
+    ) -> 'DistilledObject':
+        from .diff import apply_patch
+
+        serialized = obj.serialize()
+        nodes = apply_patch(serialized.pop('nodes'), patch)
+        return self.deserialize(nodes, mode=mode, **serialized)
+
+    def read_binary(
+        self,
+        source: Union['BinarySource', 'FilePath'],
+        kinds: Iterable[str] = None,
+        context: Dict[str, Any] = None,
+        **values: Any,
+    ) -> 'DistilledObject':
+        from .binary import BinaryDocument
+
+        # Files are memory-mapped until results are closed (see DistilledObject.close),
+        # top-level nodes are decoded once accessed
+        if isinstance(source, (bytes, bytearray, memoryview, mmap)):
+            document = BinaryDocument(source)
+        else:
+            document = BinaryDocument.open(source)
+        deserialized = deserialize_nodelist(
+            document.roots(kinds),
+            types_index=self.registry.indexed(),
+            context=context,
+            interner=self.interner,
+            mode=DESERIALIZE_CACHED,
+        )
+        obj = self.return_type.construct(
+            nodes=LazyNodeList(deserialized), **{**document.meta, **values}
         )
+        obj._binary_document = document
+        return obj
+
+
+class DistilledState(BaseModel):
+    finalized: bool = False
+    # Parser of the source, its soup is kept for debugging until finalization, never pickled
+    parser: Any = None
+    tasks: 'DistilledObjectTasks' = Field(default_factory=list)
 
 
 class DistilledObject(BaseModel):
     nodes: Iterable[AnyNode] = Field(default=(), title='Distilled body')
 
+    # Every result has own state, so results of different calls never share tasks
+    _state: DistilledState = PrivateAttr(default_factory=DistilledState)
+    _stats: Optional[DistillationStats] = PrivateAttr(default=None)
+    _index: Optional[Tuple[Iterable[AnyNode], 'NodesIndex']] = PrivateAttr(default=None)
+    # Distilled source blocks, which may be reused on redistillation
+    _source_blocks: Any = PrivateAttr(default=None)
+    # Binary document, which nodes are read from, see BaseDistiller.read_binary
+    _binary_document: Any = PrivateAttr(default=None)
+
+    @property
+    def stats(self) -> Optional[DistillationStats]:
+        return self._stats
+
+    # Index is built on first query and is rebuilt once nodes are replaced,
+    # nodes changed in place require explicit reindexing
+    @property
+    def index(self) -> 'NodesIndex':
+        from .index import NodesIndex
+
+        if not isinstance(self.nodes, Sequence):
+            self.nodes = tuple(self.nodes)
+        if self._index is None or self._index[0] is not self.nodes:
+            self._index = (self.nodes, NodesIndex(self.nodes))
+        return self._index[1]
+
+    def reindex(self) -> 'NodesIndex':
+        self._index = None
+        return self.index
+
+    def walk(self) -> Iterator[AnyNode]:
+        return iter(self.index.order)
+
+    def find_all(self, kind: str) -> List[AnyNode]:
+        return self.index.find_all(kind)
+
+    def find_first(self, kind: str) -> Optional[AnyNode]:
+        return self.index.find_first(kind)
+
+    def iter_by_type(self, node_type: Type[Any]) -> Iterator[AnyNode]:
+        return self.index.iter_by_type(node_type)
+
+    def select(self, pattern: str) -> List[AnyNode]:
+        from .selectors import compile_selector
+
+        return list(compile_selector(pattern).select_indexed(self.index))
+
+    def select_first(self, pattern: str) -> Optional[AnyNode]:
+        from .selectors import compile_selector
+
+        return next(compile_selector(pattern).select_indexed(self.index), None)
+
     def serialize(self, **kwargs: Any) -> Dict[str, Any]:
         serialized = self.dict(exclude={'nodes'})
         nodes = serialize_nodelist(self.nodes, **kwargs)
@@ -119,15 +269,131 @@ class DistilledObject(BaseModel):
             self.nodes, delimiter=delimiter, include=include, exclude=exclude
         )
 
+    def excerpt_plaintext(
+        self,
+        max_chars: int,
+        delimiter: str = '\n\n',
+        include: Set[str] = None,
+        exclude: Set[str] = None,
+    ) -> str:
+        from .excerpts import nodelist_excerpt_plaintext
+
+        return nodelist_excerpt_plaintext(
+            self.nodes, max_chars, delimiter=delimiter, include=include, exclude=exclude
+        )
+
+    def excerpt_html(
+        self,
+        max_chars: int = None,
+        max_blocks: int = None,
+        include: Set[str] = None,
+        exclude: Set[str] = None,
+        exclude_invalid: bool = True,
+        allowed_attrs: AllowedAttrs = None,
+    ) -> str:
+        from .excerpts import nodelist_excerpt_html
+
+        return nodelist_excerpt_html(
+            self.nodes,
+            max_chars=max_chars,
+            max_blocks=max_blocks,
+            include=include,
+            exclude=exclude,
+            exclude_invalid=exclude_invalid,
+            allowed_attrs=allowed_attrs,
+        )
+
+    def iter_chunks(
+        self,
+        max_chars: int,
+        overlap: int = 0,
+        boundary_kinds: Iterable[str] = None,
+        delimiter: str = '\n\n',
+        include: Set[str] = None,
+        exclude: Set[str] = None,
+        with_html: bool = False,
+    ) -> Iterator['DocumentChunk']:
+        from .chunks import iter_chunks
+
+        return iter_chunks(
+            self.nodes,
+            max_chars,
+            overlap=overlap,
+            boundary_kinds=boundary_kinds,
+            delimiter=delimiter,
+            include=include,
+            exclude=exclude,
+            with_html=with_html,
+        )
+
+    def to_columns(
+        self, attrs: Iterable[str] = (), kinds: Iterable[str] = (), document_id: int = 0
+    ) -> 'NodeColumns':
+        from .columns import NodeColumns
+
+        columns = NodeColumns(attrs=attrs, kinds=kinds)
+        columns.append(self.nodes, document_id=document_id)
+        return columns
+
+    def diff(self, other: 'DistilledObject', **kwargs: Any) -> 'Patch':
+        from .diff import diff_nodelists
+
+        return diff_nodelists(self.serialize(**kwargs)['nodes'], other.serialize(**kwargs)['nodes'])
+
+    def to_binary(self, **kwargs: Any) -> bytes:
+        from .binary import encode_document
+
+        return encode_document(self.serialize(**kwargs))
+
+    # Results are pickled without index, parser and source blocks (these are for redistillation
+    # in the same process), one-shot nodes iterators are materialized.
+    # Nodes context data is not pickled, see Node
+    def __getstate__(self) -> Dict[str, Any]:
+        if not isinstance(self.nodes, Sequence):
+            self.nodes = tuple(self.nodes)
+        state = super().__getstate__()
+        distilled_state = self._state.copy(update={'parser': None})
+        private_values = {
+            **state['__private_attribute_values__'],
+            '_state': distilled_state,
+            '_index': None,
+            '_source_blocks': None,
+            '_binary_document': None,
+        }
+        return {**state, '__private_attribute_values__': private_values}
+
+    def freeze(self) -> None:
+        from .compact import CompactDocument
+
+        # Nodes are replaced with read-only compact records, which are rendered the same way.
+        # Source blocks refer to the original nodes, so frozen results are distilled anew
+        self.nodes = CompactDocument.from_nodes(self.nodes).nodes
+        self._source_blocks = None
+        self.close()
+
+    # Files read with read_binary are unmapped, nodes not decoded by then can't be read anymore
+    def close(self) -> None:
+        if self._binary_document is not None:
+            self._binary_document.close()
+            self._binary_document = None
+
+    def __enter__(self) -> 'DistilledObject':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
     @property
     def _tasks(self) -> Iterable[Callable]:
-        return filter(callable, self._State.tasks)
+        return filter(callable, self._state.tasks)
 
     def collect_tasks(self, nodes: Iterable[AnyNode] = None) -> None:
         for node in nodes or self.nodes:
             task = getattr(node, 'post_init_method', None)
             if task:
-                self._State.tasks.append(task)
+                self._state.tasks.append(task)
+                if self._stats is not None:
+                    self._stats.tasks += 1
             subnodes = getattr(node, 'children', [])
             if subnodes:
                 self.collect_tasks(subnodes)
@@ -139,9 +405,12 @@ class DistilledObject(BaseModel):
                 yield result
 
     def finalize(self) -> None:
-        for _ in self.run_tasks():
-            pass
-        self._State.finalized = True
+        with measure(self._stats, STAGE_FINALIZE):
+            for _ in self.run_tasks():
+                pass
+        self._state.finalized = True
+        self._state.parser = None
+        self._report_finalization()
 
     async def run_tasks_async(self) -> AsyncIterator[Any]:
         for task_result in self.run_tasks():
@@ -151,20 +420,24 @@ class DistilledObject(BaseModel):
                 yield task_result
 
     async def finalize_async(self) -> None:
-        async for _ in self.run_tasks_async():
-            pass
-        self._State.finalized = True
+        with measure(self._stats, STAGE_FINALIZE):
+            async for _ in self.run_tasks_async():
+                pass
+        self._state.finalized = True
+        self._state.parser = None
+        self._report_finalization()
+
+    def _report_finalization(self) -> None:
+        if self._stats is not None:
+            self._stats.finalized = True
+            self._stats.report()
 
     class Config:
         title = 'Distilled object'
 
-    class _State:
-        finalized: bool = False
-        parser: Any = None
-        tasks: 'DistilledObjectTasks' = []
-
 
 DistilledObjectTasks = MutableSequence[Callable]
+DistilledState.update_forward_refs()
 
 
 class UnsupportedMarkupDistiller:  # pragma: no cover
@@ -0,0 +1,346 @@
+from mmap import ACCESS_READ, mmap
+from os import PathLike
+from struct import Struct
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+MAGIC = b'DSTL'
+VERSION = 1
+# Magic, version, strings count, roots count, meta, strings, strings index & roots index offsets
+HEADER = Struct('<4sBIIQQQQ')
+STRING_OFFSET = Struct('<Q')
+# Root node offset & kind string id
+ROOT_ENTRY = Struct('<QI')
+FLOAT = Struct('<d')
+NO_KIND = 0xFFFFFFFF
+
+# Values tags
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STR = 5
+TAG_LIST = 6
+TAG_TUPLE = 7
+TAG_DICT = 8
+TAG_NODE = 9
+TAG_TEXT = 10
+
+BinarySource = Union[bytes, bytearray, memoryview, mmap]
+FilePath = Union[str, 'PathLike[str]']
+
+
+class BinaryDocumentError(ValueError):
+    pass
+
+
+def encode_document(serialized: Dict[str, Any]) -> bytes:
+    """
+    Encode serialized distilled object: all strings are stored once in strings table,
+    top-level nodes are indexed by offsets, so any of these may be decoded separately
+    """
+    encoder = _Encoder()
+    buffer = encoder.buffer
+    buffer += bytes(HEADER.size)
+    roots = []
+    meta = {}
+    for name, value in serialized.items():
+        if name != 'nodes':
+            meta[name] = value
+    for node in serialized.get('nodes', ()):
+        kind = node.get('kind') if isinstance(node, dict) else None
+        kind_id = encoder.string_id(kind) if isinstance(kind, str) else NO_KIND
+        roots.append((len(buffer), kind_id))
+        encoder.value(node)
+
+    meta_offset = len(buffer)
+    encoder.value(meta)
+    strings_offset = len(buffer)
+    strings_offsets = [0]
+    for string in encoder.strings:
+        buffer += string.encode()
+        strings_offsets.append(len(buffer) - strings_offset)
+    strings_index_offset = len(buffer)
+    for offset in strings_offsets:
+        buffer += STRING_OFFSET.pack(offset)
+    roots_index_offset = len(buffer)
+    for root in roots:
+        buffer += ROOT_ENTRY.pack(*root)
+
+    HEADER.pack_into(
+        buffer,
+        0,
+        MAGIC,
+        VERSION,
+        len(encoder.strings),
+        len(roots),
+        meta_offset,
+        strings_offset,
+        strings_index_offset,
+        roots_index_offset,
+    )
+    return bytes(buffer)
+
+
+class _Encoder:
+    buffer: bytearray
+    strings: Dict[str, int]
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.strings = {}
+
+    def string_id(self, value: str) -> int:
+        string_id = self.strings.get(value)
+        if string_id is None:
+            string_id = self.strings[value] = len(self.strings)
+        return string_id
+
+    def varint(self, value: int) -> None:
+        while value > 0x7F:
+            self.buffer.append(value & 0x7F | 0x80)
+            value >>= 7
+        self.buffer.append(value)
+
+    def value(self, value: Any) -> None:
+        buffer = self.buffer
+        # Booleans go before integers, as bool is subclassed from int
+        if value is None:
+            buffer.append(TAG_NONE)
+        elif value is True or value is False:
+            buffer.append(TAG_TRUE if value else TAG_FALSE)
+        elif isinstance(value, int):
+            buffer.append(TAG_INT)
+            # Zigzag encoding keeps small negative numbers short
+            self.varint(value << 1 if value >= 0 else (-value << 1) - 1)
+        elif isinstance(value, float):
+            buffer.append(TAG_FLOAT)
+            buffer += FLOAT.pack(value)
+        elif isinstance(value, str):
+            buffer.append(TAG_STR)
+            self.varint(self.string_id(value))
+        elif isinstance(value, dict):
+            self.mapping(value)
+        elif isinstance(value, (list, tuple)):
+            buffer.append(TAG_TUPLE if isinstance(value, tuple) else TAG_LIST)
+            self.varint(len(value))
+            for item in value:
+                self.value(item)
+        else:
+            raise BinaryDocumentError(f'Unsupported value type: {type(value).__name__}')
+
+    def mapping(self, value: Dict[str, Any]) -> None:
+        buffer = self.buffer
+        if not all(isinstance(key, str) for key in value):
+            raise BinaryDocumentError('Only string keys are supported')
+        if _is_text_node(value):
+            buffer.append(TAG_TEXT)
+            self.varint(self.string_id(value['content']))
+            return
+        if _is_node(value):
+            # Node is stored as kind, attributes and children, which go last
+            children = value.get('children', ())
+            buffer.append(TAG_NODE)
+            self.varint(self.string_id(value['kind']))
+            self.varint(len(value) - 1 - ('children' in value))
+            for key, item in value.items():
+                if key not in ('kind', 'children'):
+                    self.varint(self.string_id(key))
+                    self.value(item)
+            self.varint(len(children))
+            for child in children:
+                self.value(child)
+            return
+        buffer.append(TAG_DICT)
+        self.varint(len(value))
+        for key, item in value.items():
+            self.varint(self.string_id(key))
+            self.value(item)
+
+
+def _is_text_node(value: Dict[str, Any]) -> bool:
+    return (
+        len(value) == 2
+        and value.get('kind') == 'text'
+        and type(value.get('content')) is str
+        and next(iter(value)) == 'kind'
+    )
+
+
+def _is_node(value: Dict[str, Any]) -> bool:
+    keys = list(value)
+    if not keys or keys[0] != 'kind' or not isinstance(value['kind'], str):
+        return False
+    if 'children' not in value:
+        return True
+    children = value['children']
+    return (
+        keys[-1] == 'children'
+        and isinstance(children, tuple)
+        and len(children) > 0
+        and all(isinstance(child, dict) for child in children)
+    )
+
+
+class BinaryDocument:
+    """Reader of encoded documents, which decodes strings and nodes on first access only"""
+
+    buffer: BinarySource
+    strings_count: int
+    roots_count: int
+
+    def __init__(self, buffer: BinarySource):
+        if len(buffer) < HEADER.size:
+            raise BinaryDocumentError('Invalid distilled binary document')
+        (
+            magic,
+            version,
+            self.strings_count,
+            self.roots_count,
+            self._meta_offset,
+            self._strings_offset,
+            self._strings_index_offset,
+            self._roots_index_offset,
+        ) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise BinaryDocumentError('Invalid distilled binary document')
+        if version != VERSION:
+            raise BinaryDocumentError(f'Unsupported distilled binary document version: {version}')
+        self.buffer = buffer
+        self._strings: Dict[int, str] = {}
+        self._file_buffer: Optional[mmap] = None
+
+    @classmethod
+    def open(cls, path: FilePath) -> 'BinaryDocument':
+        with open(path, 'rb') as file:
+            buffer = mmap(file.fileno(), 0, access=ACCESS_READ)
+        document = cls(buffer)
+        document._file_buffer = buffer
+        return document
+
+    def close(self) -> None:
+        if self._file_buffer is not None:
+            self._file_buffer.close()
+
+    def __enter__(self) -> 'BinaryDocument':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.roots_count
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return self._decode(self._meta_offset)[0]  # type: ignore
+
+    def string(self, string_id: int) -> str:
+        string = self._strings.get(string_id)
+        if string is None:
+            start, end = (
+                STRING_OFFSET.unpack_from(self.buffer, self._strings_index_offset + i * 8)[0]
+                for i in (string_id, string_id + 1)
+            )
+            offset = self._strings_offset
+            string = str(self.buffer[offset + start : offset + end], 'utf-8')
+            self._strings[string_id] = string
+        return string
+
+    def root(self, index: int) -> Any:
+        offset, _ = self._root_entry(index)
+        return self._decode(offset)[0]
+
+    def root_kind(self, index: int) -> Optional[str]:
+        _, kind_id = self._root_entry(index)
+        return self.string(kind_id) if kind_id != NO_KIND else None
+
+    def roots(self, kinds: Iterable[str] = None) -> Iterator[Any]:
+        # Kinds are read from roots index, so filtered out nodes are never decoded
+        kinds = set(kinds) if kinds is not None else None
+        for index in range(self.roots_count):
+            if kinds is None or self.root_kind(index) in kinds:
+                yield self.root(index)
+
+    def _root_entry(self, index: int) -> Tuple[int, int]:
+        if not 0 <= index < self.roots_count:
+            raise IndexError(index)
+        offset = self._roots_index_offset + index * ROOT_ENTRY.size
+        return ROOT_ENTRY.unpack_from(self.buffer, offset)
+
+    def _varint(self, pos: int) -> Tuple[int, int]:
+        buffer = self.buffer
+        result = shift = 0
+        while True:
+            byte = buffer[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result, pos
+            shift += 7
+
+    # Most of varints (string ids, counts) are single-byte, so these are read inline
+    def _decode(self, pos: int) -> Tuple[Any, int]:
+        buffer = self.buffer
+        tag = buffer[pos]
+        pos += 1
+        if tag == TAG_STR or tag == TAG_TEXT:
+            string_id = buffer[pos]
+            if string_id < 0x80:
+                pos += 1
+            else:
+                string_id, pos = self._varint(pos)
+            string = self._strings.get(string_id)
+            if string is None:
+                string = self.string(string_id)
+            return (string if tag == TAG_STR else {'kind': 'text', 'content': string}), pos
+        if tag == TAG_NODE:
+            kind_id = buffer[pos]
+            if kind_id < 0x80:
+                pos += 1
+            else:
+                kind_id, pos = self._varint(pos)
+            kind = self._strings.get(kind_id)
+            node: Dict[str, Any] = {'kind': kind if kind is not None else self.string(kind_id)}
+            pos = self._decode_items(node, pos)
+            count = buffer[pos]
+            if count < 0x80:
+                pos += 1
+            else:
+                count, pos = self._varint(pos)
+            if count:
+                children = []
+                decode = self._decode
+                for _ in range(count):
+                    child, pos = decode(pos)
+                    children.append(child)
+                node['children'] = tuple(children)
+            return node, pos
+        if tag == TAG_DICT:
+            mapping: Dict[str, Any] = {}
+            return mapping, self._decode_items(mapping, pos)
+        if tag == TAG_LIST or tag == TAG_TUPLE:
+            count, pos = self._varint(pos)
+            items: List[Any] = []
+            for _ in range(count):
+                item, pos = self._decode(pos)
+                items.append(item)
+            return (tuple(items) if tag == TAG_TUPLE else items), pos
+        if tag == TAG_INT:
+            value, pos = self._varint(pos)
+            return (value >> 1 if not value & 1 else -((value + 1) >> 1)), pos
+        if tag == TAG_FLOAT:
+            return FLOAT.unpack_from(buffer, pos)[0], pos + FLOAT.size
+        if tag == TAG_NONE or tag == TAG_FALSE or tag == TAG_TRUE:
+            return (None, False, True)[tag], pos
+        raise BinaryDocumentError(f'Invalid value tag: {tag}')
+
+    def _decode_items(self, mapping: Dict[str, Any], pos: int) -> int:
+        count, pos = self._varint(pos)
+        for _ in range(count):
+            key_id, pos = self._varint(pos)
+            key = self._strings.get(key_id)
+            if key is None:
+                key = self.string(key_id)
+            mapping[key], pos = self._decode(pos)
+        return pos
@@ -0,0 +1,131 @@
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .diff import NodePath
+from .helpers import KNOWN_CONTAINER_KINDS
+from .nodes import INVALID_NODE_KIND, TEXT_NODE_KIND, AnyNode, Node, nodelist_to_plaintext
+
+
+class DocumentChunk(NamedTuple):
+    plaintext: str
+    # Paths of the nodes chunk text comes from, as indexes of nodes and their ancestors
+    paths: Tuple[NodePath, ...]
+    html: Optional[str] = None
+
+
+class _Unit(NamedTuple):
+    path: NodePath
+    plaintext: str
+    html: Optional[str]
+
+
+def iter_chunks(
+    nodelist: Iterable[AnyNode],
+    max_chars: int,
+    overlap: int = 0,
+    boundary_kinds: Iterable[str] = None,
+    delimiter: str = '\n\n',
+    include: Set[str] = None,
+    exclude: Set[str] = None,
+    with_html: bool = False,
+) -> Iterator[DocumentChunk]:
+    """
+    Split nodes into chunks of plaintext of at most given length. Nodes of boundary kinds
+    (containers by default) are split into their children, other nodes (e.g. paragraphs)
+    are never split, unless these are longer than a chunk by themselves. Chunks start
+    with the last nodes of the previous chunk, which text fits into the overlap
+    """
+    assert max_chars > 0, 'Invalid chunk length'
+    assert 0 <= overlap < max_chars, 'Chunks overlap must be shorter than chunks'
+    include = include | {TEXT_NODE_KIND} if include else set()
+    exclude = exclude or set()
+    boundary_kinds = KNOWN_CONTAINER_KINDS if boundary_kinds is None else set(boundary_kinds)
+    units = _iter_units(nodelist, (), boundary_kinds, delimiter, include, exclude, with_html)
+    chunk: List[_Unit] = []
+    size = 0
+    # Units, which are not in the previous chunk already
+    fresh = 0
+    for unit in units:
+        for part in _split_unit(unit, max_chars):
+            if chunk and size + len(delimiter) + len(part.plaintext) > max_chars:
+                yield _create_chunk(chunk, delimiter)
+                chunk = _overlapping_units(chunk, overlap, len(delimiter))
+                # Overlap is cut further, if it leaves no room for the next unit
+                needed = len(delimiter) + len(part.plaintext)
+                while chunk and _joined_size(chunk, len(delimiter)) + needed > max_chars:
+                    chunk.pop(0)
+                size = _joined_size(chunk, len(delimiter))
+                fresh = 0
+            size += len(part.plaintext) + (len(delimiter) if chunk else 0)
+            chunk.append(part)
+            fresh += 1
+    if fresh:
+        yield _create_chunk(chunk, delimiter)
+
+
+def _iter_units(
+    nodelist: Iterable[AnyNode],
+    path: NodePath,
+    boundary_kinds: Set[str],
+    delimiter: str,
+    include: Set[str],
+    exclude: Set[str],
+    with_html: bool,
+) -> Iterator[_Unit]:
+    for i, node in enumerate(nodelist):
+        if include and node.kind not in include or exclude and node.kind in exclude:
+            continue
+        node_path = path + (i,)
+        if isinstance(node, Node) and node.kind in boundary_kinds and node.children:
+            yield from _iter_units(
+                node.children, node_path, boundary_kinds, delimiter, include, exclude, with_html
+            )
+            continue
+        # Text of a unit is the same as of a top-level node, see nodelist_to_plaintext
+        plaintext = nodelist_to_plaintext(
+            (node,), delimiter=delimiter, include=include, exclude=exclude
+        )
+        if not plaintext:
+            continue
+        html = None
+        if with_html:
+            html = node.to_html(include=include, exclude=exclude | {INVALID_NODE_KIND})
+        yield _Unit(node_path, plaintext, html)
+
+
+def _split_unit(unit: _Unit, max_chars: int) -> Iterator[_Unit]:
+    # Units longer than a chunk are split at spaces, or anywhere if there are no spaces
+    plaintext = unit.plaintext
+    while len(plaintext) > max_chars:
+        end = plaintext.rfind(' ', 1, max_chars + 1)
+        if end == -1:
+            end = max_chars
+        yield unit._replace(plaintext=plaintext[:end].rstrip())
+        plaintext = plaintext[end:].lstrip()
+    if plaintext:
+        yield unit._replace(plaintext=plaintext)
+
+
+def _overlapping_units(units: List[_Unit], overlap: int, delimiter_size: int) -> List[_Unit]:
+    size = -delimiter_size
+    start = len(units)
+    while start > 0 and size + delimiter_size + len(units[start - 1].plaintext) <= overlap:
+        start -= 1
+        size += delimiter_size + len(units[start].plaintext)
+    return units[start:]
+
+
+def _joined_size(units: List[_Unit], delimiter_size: int) -> int:
+    if not units:
+        return 0
+    return sum(len(unit.plaintext) for unit in units) + delimiter_size * (len(units) - 1)
+
+
+def _create_chunk(units: List[_Unit], delimiter: str) -> DocumentChunk:
+    # Parts of a split unit share its path and HTML
+    paths = tuple(dict.fromkeys(unit.path for unit in units))
+    html = None
+    if units[0].html is not None:
+        html = ''.join({unit.path: unit.html for unit in units}.values())  # type: ignore
+    return DocumentChunk(
+        plaintext=delimiter.join(unit.plaintext for unit in units), paths=paths, html=html
+    )
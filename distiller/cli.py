@@ -0,0 +1,225 @@
+"""Batch distillation of HTML files and JSONL dumps into JSONL"""
+
+import sys
+from argparse import ArgumentParser, Namespace
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from glob import iglob
+from importlib import import_module
+from json import dumps as json_dumps, loads as json_loads
+from pathlib import Path
+from time import perf_counter
+from typing import IO, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .markup import MarkupDistiller
+from .markup.parser import WHITESPACE_KEEP, WHITESPACE_POLICIES, MarkupParserError
+
+FORMAT_JSON = 'json'
+FORMAT_HTML = 'html'
+FORMAT_PLAINTEXT = 'plaintext'
+FORMATS = (FORMAT_JSON, FORMAT_HTML, FORMAT_PLAINTEXT)
+STDIN = '-'
+HTML_SUFFIXES = ('.html', '.htm')
+
+# Source name, markup and failure of reading the source, if any
+Record = Tuple[str, str, Optional[str]]
+# Output line, number of errors and whether distillation failed
+DistilledRecord = Tuple[str, int, bool]
+
+argparser = ArgumentParser(
+    prog='python -m distiller',
+    description='Distill HTML files, directories, globs or JSONL dumps into JSONL',
+)
+argparser.add_argument(
+    'inputs', nargs='*', default=[STDIN], help='Files, directories, globs or "-" for stdin'
+)
+argparser.add_argument(
+    '--jsonl',
+    action='store_true',
+    help='Inputs are JSONL, with markup strings or objects on every line',
+)
+argparser.add_argument('--field', default='html', help='Markup field of JSONL objects')
+argparser.add_argument('--id-field', default='id', help='Source name field of JSONL objects')
+argparser.add_argument('--types', metavar='MODULE', help='Import path of node types module')
+argparser.add_argument('--rules', metavar='MODULE:NAME', help='Import path of mapper rules')
+argparser.add_argument('--tagify', metavar='CHARS', help='Custom tags chars, e.g. "[/]"')
+argparser.add_argument('--whitespace', choices=WHITESPACE_POLICIES, default=WHITESPACE_KEEP)
+argparser.add_argument('--context', type=json_loads, default=None, help='JSON object')
+argparser.add_argument('--format', choices=FORMATS, default=FORMAT_JSON)
+argparser.add_argument('--output', '-o', type=Path, help='Output file, stdout by default')
+argparser.add_argument('--workers', '-w', type=int, default=1)
+argparser.add_argument(
+    '--max-pending',
+    type=int,
+    default=None,
+    help='Max number of documents in flight, 4 per worker by default',
+)
+
+
+def main(argv: List[str] = None) -> int:
+    options = argparser.parse_args(argv)
+    if options.workers < 1:
+        argparser.error('number of workers must be positive')
+    output = options.output.open('w') if options.output else sys.stdout
+    started = perf_counter()
+    documents = failed = errors = size = 0
+
+    def counted(records: Iterable[Record]) -> Iterator[Record]:
+        nonlocal size
+        for record in records:
+            size += len(record[1].encode())
+            yield record
+
+    try:
+        records = counted(read_records(options.inputs, options))
+        for line, errors_count, is_failed in distill_records(records, options):
+            output.write(line + '\n')
+            documents += 1
+            errors += errors_count
+            failed += is_failed
+    finally:
+        if options.output:
+            output.close()
+
+    elapsed = perf_counter() - started
+    print(
+        f'Distilled {documents} documents ({size / 2 ** 20:.1f} MiB) in {elapsed:.2f} s, '
+        f'{documents / elapsed:.1f} docs/s, {size / 2 ** 20 / elapsed:.2f} MiB/s; '
+        f'errors: {errors}, failed documents: {failed}',
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+# Sources are read as bytes, so invalid ones (e.g. not UTF-8) fail alone, as invalid JSONL lines do
+def read_records(inputs: Iterable[str], options: Namespace) -> Iterator[Record]:
+    for path in iter_paths(inputs):
+        if path == STDIN:
+            yield from read_stream(sys.stdin.buffer, STDIN, options)
+            continue
+        with open(path, 'rb') as stream:
+            yield from read_stream(stream, path, options)
+
+
+def iter_paths(inputs: Iterable[str]) -> Iterator[str]:
+    for input_ in inputs:
+        if input_ == STDIN:
+            yield input_
+        elif Path(input_).is_dir():
+            for path in sorted(Path(input_).rglob('*')):
+                if path.suffix.lower() in HTML_SUFFIXES + ('.jsonl',):
+                    yield str(path)
+        elif Path(input_).exists():
+            yield input_
+        else:
+            yield from sorted(iglob(input_, recursive=True))
+
+
+def read_stream(stream: IO[bytes], name: str, options: Namespace) -> Iterator[Record]:
+    if not options.jsonl and not name.endswith('.jsonl'):
+        try:
+            yield name, str(stream.read(), 'utf-8'), None
+        except ValueError as exc:
+            yield name, '', describe_failure(exc)
+        return
+    for i, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        line_name = f'{name}:{i}'
+        try:
+            data = json_loads(str(line, 'utf-8'))
+        except ValueError as exc:
+            yield line_name, '', describe_failure(exc)
+            continue
+        if isinstance(data, str):
+            yield line_name, data, None
+        elif isinstance(data, dict):
+            yield str(data.get(options.id_field, line_name)), data.get(options.field) or '', None
+        else:
+            yield line_name, '', 'TypeError: JSONL line is neither a markup string nor an object'
+
+
+def distill_records(records: Iterable[Record], options: Namespace) -> Iterator[DistilledRecord]:
+    if options.workers == 1:
+        init_worker(options)
+        yield from map(distill_record, records)
+        return
+    with ProcessPoolExecutor(
+        max_workers=options.workers, initializer=init_worker, initargs=(options,)
+    ) as pool:
+        yield from map_bounded(
+            pool, distill_record, records, options.max_pending or options.workers * 4
+        )
+
+
+def map_bounded(
+    pool: Executor, fn: Callable[[Any], Any], items: Iterable[Any], max_pending: int
+) -> Iterator[Any]:
+    # Results go in order of items, which are read only as far as pending results allow
+    pending: Deque[Future] = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def create_distiller(options: Namespace) -> MarkupDistiller:
+    rules = None
+    if options.rules:
+        module_path, _, name = options.rules.partition(':')
+        rules = dict(getattr(import_module(module_path), name or 'RULES'))
+    return MarkupDistiller(
+        rules=rules,
+        types_module=import_module(options.types) if options.types else None,
+        tagify=options.tagify,
+        whitespace=options.whitespace,
+    )
+
+
+_worker: Dict[str, Any] = {}
+
+
+def init_worker(options: Namespace) -> None:
+    _worker.update(distiller=create_distiller(options), options=options)
+
+
+def distill_record(record: Record) -> DistilledRecord:
+    distill: MarkupDistiller = _worker['distiller']
+    options: Namespace = _worker['options']
+    name, markup, failure = record
+    output: Dict[str, Any] = {'source': name}
+    if failure is None:
+        try:
+            obj, errors = distill(markup, context=options.context)
+            obj.finalize()
+        except Exception as exc:
+            failure = describe_failure(exc)
+    if failure is not None:
+        output['failure'] = failure
+        return json_dumps(output, ensure_ascii=False), 0, True
+
+    if options.format == FORMAT_HTML:
+        output['html'] = obj.to_html()
+    elif options.format == FORMAT_PLAINTEXT:
+        output['plaintext'] = obj.to_plaintext()
+    else:
+        output.update(obj.serialize())
+    if errors:
+        output['errors'] = list(map(serialize_error, errors))  # type: ignore
+    line = json_dumps(output, ensure_ascii=False, default=str)
+    return line, len(errors), False
+
+
+def describe_failure(exc: Exception) -> str:
+    return f'{exc.__class__.__name__}: {exc}'
+
+
+def serialize_error(error: MarkupParserError) -> Dict[str, Any]:
+    return {
+        'kind': error.kind,
+        'context': error.context,
+        'count': error.count,
+        'reason': error.reason.errors(),
+    }
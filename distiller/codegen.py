@@ -0,0 +1,174 @@
+from functools import partial
+from marshal import dumps as marshal_dumps, loads as marshal_loads
+from types import CodeType
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel
+
+from .helpers import NodeKind, jsonify_node_value
+
+# Values of these types are serialized as they are, others are converted like pydantic does
+PLAIN_VALUE_TYPES = frozenset((str, int, float, bool, type(None), NodeKind))
+# Values of these types are rendered as HTML attributes as they are
+PLAIN_ATTR_TYPES = frozenset((str, int, NodeKind))
+# Arguments of serialization, which generated serializers support
+SERIALIZER_KWARGS = frozenset(('include', 'exclude'))
+EMPTY_NAMES: Set[str] = frozenset()  # type: ignore
+
+# Serialized values, names of fields to include (all if None) and to exclude
+NodeSerializer = Callable[[Dict[str, Any], Optional[Set[str]], Optional[Set[str]]], Dict[str, Any]]
+# Node values and names of fields to include (all if None)
+NodeAttrsRenderer = Callable[[Dict[str, Any], Optional[Set[str]]], str]
+
+
+class NodeCodec(NamedTuple):
+    serialize: NodeSerializer
+    render_attrs: NodeAttrsRenderer
+
+
+# Codecs are generated once node types are known to distillers, other types are serialized
+# with pydantic. Output of both is the same
+NODE_CODECS: Dict[type, NodeCodec] = {}
+# Compiled code of codecs by their file name and source, which is saved with precompiled
+# distillers, so other processes skip compilation
+COMPILED_CODECS: Dict[Tuple[str, str], CodeType] = {}
+
+
+def compile_node_codecs(node_types: Iterable[Type[BaseModel]]) -> None:
+    for node_type in node_types:
+        if node_type in NODE_CODECS:
+            continue
+        if not is_codec_compatible(node_type):
+            continue
+        NODE_CODECS[node_type] = create_node_codec(node_type)
+
+
+def is_codec_compatible(node_type: Type[BaseModel]) -> bool:
+    # Compact nodes module depends on nodes, which depend on codecs
+    from .compact import is_compactable
+
+    # Types with own serialization or rendering, fields included or excluded by config
+    # or custom encoders are left for pydantic
+    return (
+        is_compactable(node_type)
+        and getattr(node_type, '_iter') is getattr(BaseModel, '_iter')
+        and not node_type.__config__.json_encoders
+        and not node_type.__include_fields__
+        and not node_type.__exclude_fields__
+    )
+
+
+def create_node_codec(node_type: Type[BaseModel]) -> NodeCodec:
+    fields = [name for name in node_type.__fields__ if name != 'children']
+    namespace: Dict[str, Any] = {
+        'fields': frozenset(node_type.__fields__),
+        'plain_value_types': PLAIN_VALUE_TYPES,
+        'plain_attr_types': PLAIN_ATTR_TYPES,
+        'empty_names': EMPTY_NAMES,
+        'get_value': partial(
+            node_type._get_value,
+            to_dict=True,
+            by_alias=False,
+            include=None,
+            exclude=None,
+            exclude_unset=False,
+            exclude_defaults=False,
+            exclude_none=False,
+        ),
+        'render_value': _render_value,
+    }
+    flags = {name for name in fields if node_type.__fields__[name].outer_type_ is bool}
+    source = '\n'.join(
+        (
+            *_serializer_source(fields),
+            *_attrs_renderer_source(fields, flags),
+        )
+    )
+    filename = f'<{node_type.__name__} codec>'
+    code = COMPILED_CODECS.get((filename, source))
+    if code is None:
+        code = COMPILED_CODECS[(filename, source)] = compile(source, filename, 'exec')
+    exec(code, namespace)
+    return NodeCodec(namespace['serialize'], namespace['render_attrs'])
+
+
+# Marshalled code is specific to Python version, see precompiled mappers
+def dump_compiled_codecs() -> bytes:
+    return marshal_dumps(COMPILED_CODECS)
+
+
+def load_compiled_codecs(data: bytes) -> None:
+    COMPILED_CODECS.update(marshal_loads(data))
+
+
+def _serializer_source(fields: List[str]) -> Iterable[str]:
+    yield 'def serialize(values, include, exclude):'
+    yield '    exclude = exclude or empty_names'
+    yield '    serialized = {}'
+    for name in fields:
+        yield f'    if ({name!r} in values and {name!r} not in exclude'
+        yield f'            and (include is None or {name!r} in include)):'
+        yield f'        value = values[{name!r}]'
+        yield f'        serialized[{name!r}] = ('
+        yield '            value if value.__class__ in plain_value_types else get_value(value)'
+        yield '        )'
+    # Extra attributes of nodes go after fields, as these are set on init
+    yield '    for name, value in values.items():'
+    yield '        if name in fields or name in exclude:'
+    yield '            continue'
+    yield '        if include is not None and name not in include:'
+    yield '            continue'
+    yield '        serialized[name] = ('
+    yield '            value if value.__class__ in plain_value_types else get_value(value)'
+    yield '        )'
+    yield '    return serialized'
+
+
+def _attrs_renderer_source(fields: List[str], flags: Set[str]) -> Iterable[str]:
+    yield 'def render_attrs(values, include):'
+    yield '    attrs = []'
+    yield '    positional_attrs = []'
+    for name in fields:
+        yield f'    if {name!r} in values and (include is None or {name!r} in include):'
+        yield f'        value = values[{name!r}]'
+        if name in flags:
+            yield '        if value is True:'
+            yield f'            positional_attrs.append({name!r})'
+            yield '        elif value is not False:'
+        else:
+            yield '        if value.__class__ in plain_attr_types:'
+            yield f'            attrs.append(f\' {name}="{{value}}"\')'
+            yield '        else:'
+        yield f'            render_value({name!r}, get_value(value), attrs, positional_attrs)'
+    yield '    for name, value in values.items():'
+    yield '        if name in fields or include is not None and name not in include:'
+    yield '            continue'
+    yield '        if value.__class__ in plain_attr_types:'
+    yield '            attrs.append(f\' {name}="{value}"\')'
+    yield '        else:'
+    yield '            render_value(name, get_value(value), attrs, positional_attrs)'
+    yield '    if positional_attrs:'
+    yield '        return f\'{"".join(attrs)} {" ".join(positional_attrs)}\''
+    yield '    return "".join(attrs)'
+
+
+def _render_value(name: str, value: Any, attrs: List[str], positional_attrs: List[str]) -> None:
+    # Same as render_html_attrs, see nodes
+    if isinstance(value, bool):
+        if value is True:
+            positional_attrs.append(name)
+    elif isinstance(value, (str, int)):
+        attrs.append(f' {name}="{value}"')
+    else:
+        attrs.append(f' {name}="{jsonify_node_value(value)}"')
+
+
+def get_node_codec(node: BaseModel, kwargs: Dict[str, Any]) -> Optional[NodeCodec]:
+    codec = NODE_CODECS.get(node.__class__)
+    if codec is None or not kwargs.keys() <= SERIALIZER_KWARGS:
+        return None
+    # Nested include/exclude mappings are left for pydantic
+    for names in kwargs.values():
+        if names is not None and not isinstance(names, (set, frozenset)):
+            return None
+    return codec
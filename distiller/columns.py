@@ -0,0 +1,128 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .compact import CompactNode
+from .nodes import TEXT_NODE_KIND, AnyNode
+
+NO_PARENT = -1
+COLUMNS_NAMES = frozenset(('kind_id', 'depth', 'parent', 'document_id', 'text_length'))
+
+
+class NodeColumns:
+    """
+    Nodes of any number of documents as columns, one row per node in document order:
+    kind id (index of kinds table), depth, parent row (-1 for top-level nodes), document id,
+    length of text of the node and its descendants and values of selected attributes
+    (None for nodes without these). Numeric columns are arrays, which buffers may be
+    used by NumPy without copying, see to_numpy
+    """
+
+    kinds: List[str]
+    attrs_names: Tuple[str, ...]
+    kind_ids: array
+    depths: array
+    parents: array
+    document_ids: array
+    text_lengths: array
+    attrs: Dict[str, List[Any]]
+    documents_count: int
+
+    def __init__(self, attrs: Iterable[str] = (), kinds: Iterable[str] = ()):
+        # Kinds table may be predefined to keep kinds ids the same across exports
+        self.kinds = list(kinds)
+        self._kinds_index = {kind: i for i, kind in enumerate(self.kinds)}
+        self.attrs_names = tuple(attrs)
+        assert not COLUMNS_NAMES.intersection(self.attrs_names), 'Invalid attributes names'
+        self.kind_ids = array('I')
+        self.depths = array('H')
+        self.parents = array('q')
+        self.document_ids = array('q')
+        self.text_lengths = array('Q')
+        self.attrs = {name: [] for name in self.attrs_names}
+        self.documents_count = 0
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: Iterable[Iterable[AnyNode]],
+        document_ids: Iterable[int] = None,
+        attrs: Iterable[str] = (),
+        kinds: Iterable[str] = (),
+    ) -> 'NodeColumns':
+        # Documents are distilled objects or nodelists, ids are their positions by default
+        columns = cls(attrs=attrs, kinds=kinds)
+        ids = iter(document_ids) if document_ids is not None else None
+        for document in documents:
+            nodes = getattr(document, 'nodes', document)
+            columns.append(nodes, document_id=next(ids) if ids is not None else None)
+        return columns
+
+    def append(self, nodes: Iterable[AnyNode], document_id: int = None) -> None:
+        if document_id is None:
+            document_id = self.documents_count
+        self._append_nodes(nodes, document_id, 0, NO_PARENT)
+        self.documents_count += 1
+
+    def _append_nodes(self, nodes: Iterable[Any], document_id: int, depth: int, parent: int) -> int:
+        # Nodes are written before their children, text lengths are summed up on the way back
+        text_length = 0
+        for node in nodes:
+            kind = node.kind
+            content = getattr(node, 'content', '') if kind == TEXT_NODE_KIND else ''
+            # Blank text nodes are skipped, as on serialization
+            if kind == TEXT_NODE_KIND and content in ('', '\n'):
+                continue
+            row = len(self.kind_ids)
+            self.kind_ids.append(self._add_kind(kind))
+            self.depths.append(depth)
+            self.parents.append(parent)
+            self.document_ids.append(document_id)
+            self.text_lengths.append(0)
+            if self.attrs_names:
+                values = node.attrs if isinstance(node, CompactNode) else node.__dict__
+                for name in self.attrs_names:
+                    self.attrs[name].append(values.get(name))
+            children = getattr(node, 'children', None)
+            node_text_length = len(content)
+            if children:
+                node_text_length += self._append_nodes(children, document_id, depth + 1, row)
+            self.text_lengths[row] = node_text_length
+            text_length += node_text_length
+        return text_length
+
+    def _add_kind(self, kind: str) -> int:
+        kind_id = self._kinds_index.get(kind)
+        if kind_id is None:
+            kind_id = self._kinds_index[kind] = len(self.kinds)
+            self.kinds.append(kind)
+        return kind_id
+
+    def kind_id(self, kind: str) -> Optional[int]:
+        return self._kinds_index.get(kind)
+
+    def columns(self) -> Dict[str, Any]:
+        return {
+            'kind_id': self.kind_ids,
+            'depth': self.depths,
+            'parent': self.parents,
+            'document_id': self.document_ids,
+            'text_length': self.text_lengths,
+            **self.attrs,
+        }
+
+    def to_numpy(self) -> Dict[str, Any]:
+        # NumPy is optional. Numeric columns share memory with arrays, so these can't be
+        # appended to while NumPy arrays exist. Attributes columns are object arrays
+        import numpy
+
+        columns: Dict[str, Any] = {}
+        for name, column in self.columns().items():
+            if isinstance(column, array):
+                columns[name] = numpy.frombuffer(column, dtype=column.typecode)
+            else:
+                columns[name] = numpy.empty(len(column), dtype=object)
+                columns[name][:] = column
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.kind_ids)
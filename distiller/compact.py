@@ -0,0 +1,273 @@
+from array import array
+from collections import deque
+from copy import deepcopy
+from types import MappingProxyType
+from typing import Any, Deque, Dict, Hashable, Iterable, Iterator, List, Mapping, Set, Tuple, Type
+
+from .helpers import hashable_value
+from .nodes import (
+    AllowedAttrs,
+    AnyNode,
+    InvalidNode,
+    Node,
+    TextNode,
+    nodelist_to_html,
+    render_html_attrs,
+    serialize_nodelist,
+)
+
+NO_ATTRS = -1
+# Node types overriding any of these can't be rendered from compact records,
+# so their nodes are kept as they are
+RENDERING_METHODS = (
+    'dict',
+    'serialize',
+    'to_html',
+    'get_inner_html',
+    'to_plaintext',
+    'get_text_chunks',
+)
+LEAF_TYPES: Set[type] = {TextNode, InvalidNode}
+SCALAR_TYPES = (str, int, float, bool, type(None))
+_COMPACTABLE_TYPES: Dict[type, bool] = {TextNode: True, InvalidNode: True}
+
+
+class CompactDocument:
+    kinds: List[str]
+    types: List[type]
+    kind_ids: array
+    type_ids: array
+    parents: array
+    first_children: array
+    children_counts: array
+    text: str
+    text_offsets: array
+    attrs_ids: array
+    attrs_table: List[Dict[str, Any]]
+    objects: Dict[int, AnyNode]
+    roots_count: int
+
+    def __init__(self) -> None:
+        self.kinds = []
+        self.types = []
+        self.kind_ids = array('H')
+        self.type_ids = array('H')
+        self.parents = array('i')
+        self.first_children = array('I')
+        self.children_counts = array('I')
+        self.text = ''
+        self.text_offsets = array('I', (0,))
+        self.attrs_ids = array('i')
+        self.attrs_table = []
+        self.objects = {}
+        self.roots_count = 0
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[AnyNode]) -> 'CompactDocument':
+        doc = cls()
+        kinds_index: Dict[str, int] = {}
+        types_index: Dict[type, int] = {}
+        attrs_index: Dict[Hashable, int] = {}
+        text_chunks: List[str] = []
+        text_size = 0
+
+        # Nodes are laid out breadth-first, so children of any node are stored contiguously
+        queue: Deque[Tuple[AnyNode, int]] = deque((node, -1) for node in nodes)
+        doc.roots_count = enqueued = len(queue)
+        while queue:
+            node, parent = queue.popleft()
+            index = len(doc.kind_ids)
+            node_type = type(node)
+            doc.parents.append(parent)
+            doc.kind_ids.append(_table_id(kinds_index, doc.kinds, node.kind))
+            doc.type_ids.append(_table_id(types_index, doc.types, node_type))
+
+            children: List[AnyNode] = []
+            attrs: Dict[str, Any] = {}
+            if node_type is TextNode:
+                text_chunks.append(node.content)  # type: ignore
+                text_size += len(node.content)  # type: ignore
+            elif not is_compactable(node_type):
+                doc.objects[index] = node
+            else:
+                attrs = node.dict(exclude={'kind', 'children'})
+                if isinstance(node, Node):
+                    children = list(node.children)
+            doc.text_offsets.append(text_size)
+            doc.attrs_ids.append(_attrs_id(attrs_index, doc.attrs_table, attrs))
+            doc.first_children.append(enqueued)
+            doc.children_counts.append(len(children))
+            queue.extend((child, index) for child in children)
+            enqueued += len(children)
+
+        doc.text = ''.join(text_chunks)
+        return doc
+
+    @property
+    def nodes(self) -> Tuple[AnyNode, ...]:
+        return tuple(map(self.node, range(self.roots_count)))
+
+    def node(self, index: int) -> Any:
+        obj = self.objects.get(index)
+        return obj if obj is not None else CompactNode(self, index)
+
+    def __len__(self) -> int:
+        return len(self.kind_ids)
+
+
+class CompactNode:
+    __slots__ = ('document', 'index')
+
+    document: CompactDocument
+    index: int
+
+    def __init__(self, document: CompactDocument, index: int):
+        self.document = document
+        self.index = index
+
+    @property
+    def kind(self) -> str:
+        return self.document.kinds[self.document.kind_ids[self.index]]  # type: ignore
+
+    @property
+    def node_type(self) -> Type[AnyNode]:
+        return self.document.types[self.document.type_ids[self.index]]  # type: ignore
+
+    @property
+    def is_element(self) -> bool:
+        return self.node_type not in LEAF_TYPES
+
+    @property
+    def attrs(self) -> Mapping[str, Any]:
+        attrs_id = self.document.attrs_ids[self.index]
+        return MappingProxyType(self.document.attrs_table[attrs_id] if attrs_id != NO_ATTRS else {})
+
+    @property
+    def content(self) -> str:
+        offsets = self.document.text_offsets
+        return self.document.text[offsets[self.index] : offsets[self.index + 1]]
+
+    @property
+    def children(self) -> Tuple[Any, ...]:
+        first = self.document.first_children[self.index]
+        count = self.document.children_counts[self.index]
+        return tuple(map(self.document.node, range(first, first + count)))
+
+    @property
+    def parent(self) -> Any:
+        parent = self.document.parents[self.index]
+        return self.document.node(parent) if parent >= 0 else None
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.attrs[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def serialize(self, **kwargs: Any) -> Dict[str, Any]:
+        include: Set[str] = kwargs.pop('include', None)
+        exclude: Set[str] = kwargs.pop('exclude', None) or set()
+        assert not kwargs, f'Unsupported compact nodes serialization options: {", ".join(kwargs)}'
+        if self.node_type is TextNode:
+            items: Mapping[str, Any] = {'kind': self.kind, 'content': self.content}
+        else:
+            items = {'kind': self.kind, **self.attrs}
+        serialized = {
+            name: value if isinstance(value, SCALAR_TYPES) else deepcopy(value)
+            for name, value in items.items()
+            if name not in exclude and (include is None or name in include)
+        }
+        if self.is_element and self.document.children_counts[self.index]:
+            children = serialize_nodelist(
+                self.children, include=include, exclude=exclude | {'children'}
+            )
+            serialized.update(children=tuple(children))
+        return serialized
+
+    def to_html(
+        self,
+        include: Set[str] = None,
+        exclude: Set[str] = None,
+        allowed_attrs: AllowedAttrs = None,
+        **kwargs: Any,
+    ) -> str:
+        node_type = self.node_type
+        if node_type is TextNode:
+            return self.content
+        tagname = self.kind
+        if node_type is InvalidNode:
+            return f'<{tagname} />'
+        if not tagname:
+            return ''
+        serialized: Mapping[str, Any] = {'kind': tagname, **self.attrs}
+        if allowed_attrs is not None:
+            self_allowed_attrs = set(allowed_attrs.get(tagname, ()))
+            serialized = {
+                name: value for name, value in serialized.items() if name in self_allowed_attrs
+            }
+        attrs = render_html_attrs(serialized)
+        if self.document.children_counts[self.index]:
+            inner_html = nodelist_to_html(
+                self.children, include=include, exclude=exclude, allowed_attrs=allowed_attrs
+            )
+            return f'<{tagname}{attrs}>{inner_html}</{tagname}>'
+        return f'<{tagname}{attrs} />'
+
+    def to_plaintext(
+        self,
+        delimiter: str = ' ',
+        include: Set[str] = None,
+        exclude: Set[str] = None,
+        **kwargs: Any,
+    ) -> str:
+        node_type = self.node_type
+        if node_type is TextNode:
+            return self.content
+        if node_type is InvalidNode:
+            return ''
+        return delimiter.join(self.get_text_chunks(include=include, exclude=exclude))
+
+    def get_text_chunks(self, include: Set[str] = None, exclude: Set[str] = None) -> Iterator[str]:
+        for subnode in self.children:
+            if exclude and subnode.kind in exclude or include and subnode.kind not in include:
+                continue
+            if isinstance(subnode, Node) or isinstance(subnode, CompactNode) and subnode.is_element:
+                yield from subnode.get_text_chunks()
+            else:
+                yield subnode.to_plaintext()
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(kind={self.kind!r}, index={self.index})'
+
+
+def is_compactable(node_type: type) -> bool:
+    compactable = _COMPACTABLE_TYPES.get(node_type)
+    if compactable is None:
+        compactable = issubclass(node_type, Node) and all(
+            getattr(node_type, method) is getattr(Node, method) for method in RENDERING_METHODS
+        )
+        _COMPACTABLE_TYPES[node_type] = compactable
+    return compactable
+
+
+def _table_id(index: Dict[Any, int], table: List[Any], value: Any) -> int:
+    value_id = index.get(value)
+    if value_id is None:
+        value_id = index[value] = len(table)
+        table.append(value)
+    return value_id
+
+
+def _attrs_id(index: Dict[Hashable, int], table: List[Dict[str, Any]], attrs: Dict) -> int:
+    if not attrs:
+        return NO_ATTRS
+    # Equal attrs sets are stored once
+    try:
+        key = hashable_value(attrs)
+    except TypeError:
+        key = object()
+    attrs_id = index.get(key)
+    if attrs_id is None:
+        attrs_id = index[key] = len(table)
+        table.append(attrs)
+    return attrs_id
@@ -0,0 +1,138 @@
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .helpers import hashable_value
+from .nodes import TEXT_NODE_KIND
+
+OP_INSERT = 'insert'
+OP_DELETE = 'delete'
+OP_REPLACE = 'replace'
+OP_UPDATE = 'update'
+
+SerializedNode = Dict[str, Any]
+NodePath = Tuple[int, ...]
+
+
+class PatchOperation(NamedTuple):
+    op: str
+    # Indexes of the node and its ancestors in the tree, as it is when operation is applied
+    path: NodePath
+    node: Optional[SerializedNode] = None
+    attrs: Optional[Dict[str, Any]] = None
+    removed: Tuple[str, ...] = ()
+
+
+Patch = List[PatchOperation]
+
+
+def diff_nodelists(old: Sequence[SerializedNode], new: Sequence[SerializedNode]) -> Patch:
+    """
+    Compute operations turning old serialized nodes into new ones. Equal subtrees are found
+    by structural hashes, which are computed bottom-up once per node. Operations go backwards,
+    so these may be applied one by one with paths of not yet changed nodes staying valid
+    """
+    differ = _Differ()
+    differ.diff_nodelists(old, new, ())
+    return differ.patch
+
+
+class _Differ:
+    patch: Patch
+
+    def __init__(self) -> None:
+        self.patch = []
+        self._hashes: Dict[int, int] = {}
+
+    def hash(self, node: SerializedNode) -> int:
+        node_hash = self._hashes.get(id(node))
+        if node_hash is None:
+            attrs = {name: value for name, value in node.items() if name != 'children'}
+            children = tuple(map(self.hash, node.get('children', ())))
+            node_hash = self._hashes[id(node)] = hash((_hashable_attrs(attrs), children))
+        return node_hash
+
+    def diff_nodelists(
+        self, old: Sequence[SerializedNode], new: Sequence[SerializedNode], path: NodePath
+    ) -> None:
+        matcher = SequenceMatcher(
+            a=list(map(self.hash, old)), b=list(map(self.hash, new)), autojunk=False
+        )
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == 'equal':
+                continue
+            paired = min(i2 - i1, j2 - j1)
+            for i in range(i2 - 1, i1 + paired - 1, -1):
+                self.patch.append(PatchOperation(OP_DELETE, path + (i,)))
+            for k in range(paired, j2 - j1):
+                self.patch.append(PatchOperation(OP_INSERT, path + (i1 + k,), node=new[j1 + k]))
+            for k in range(paired - 1, -1, -1):
+                self.diff_nodes(old[i1 + k], new[j1 + k], path + (i1 + k,))
+
+    def diff_nodes(self, old: SerializedNode, new: SerializedNode, path: NodePath) -> None:
+        if old.get('kind') != new.get('kind') or old.get('kind') == TEXT_NODE_KIND:
+            self.patch.append(PatchOperation(OP_REPLACE, path, node=new))
+            return
+        self.diff_nodelists(old.get('children', ()), new.get('children', ()), path)
+        old_attrs = {name: value for name, value in old.items() if name != 'children'}
+        new_attrs = {name: value for name, value in new.items() if name != 'children'}
+        updated = {
+            name: value
+            for name, value in new_attrs.items()
+            if name not in old_attrs or _hashable_attrs(old_attrs[name]) != _hashable_attrs(value)
+        }
+        removed = tuple(name for name in old_attrs if name not in new_attrs)
+        if updated or removed:
+            self.patch.append(PatchOperation(OP_UPDATE, path, attrs=updated, removed=removed))
+
+
+def _hashable_attrs(value: Any) -> Any:
+    try:
+        return hashable_value(value)
+    except TypeError:
+        return repr(value)
+
+
+def apply_patch(nodes: Iterable[SerializedNode], patch: Iterable[PatchOperation]) -> Tuple:
+    """Apply patch to serialized nodes, source nodes are left intact"""
+    root: List[Any] = list(nodes)
+    copied: Set[int] = set()
+    for operation in patch:
+        *parent_path, index = operation.path
+        siblings = root
+        for i in parent_path:
+            siblings = _copied_node(siblings, i, copied)['children']
+        if operation.op == OP_INSERT:
+            siblings.insert(index, operation.node)
+        elif operation.op == OP_DELETE:
+            del siblings[index]
+        elif operation.op == OP_REPLACE:
+            siblings[index] = operation.node
+        elif operation.op == OP_UPDATE:
+            node = _copied_node(siblings, index, copied)
+            children = node.pop('children')
+            for name in operation.removed:
+                node.pop(name, None)
+            node.update(operation.attrs or {})
+            # Children go last, as these are serialized
+            node['children'] = children
+        else:
+            raise ValueError(f'Unknown patch operation: {operation.op}')
+    return tuple(_freeze_copied(root, copied))
+
+
+def _copied_node(siblings: List[Any], index: int, copied: Set[int]) -> Dict[str, Any]:
+    # Nodes on changed paths are copied once, their children are kept as mutable lists
+    node = siblings[index]
+    if id(node) not in copied:
+        node = siblings[index] = {**node, 'children': list(node.get('children', ()))}
+        copied.add(id(node))
+    return node  # type: ignore
+
+
+def _freeze_copied(nodes: List[Any], copied: Set[int]) -> Iterable[SerializedNode]:
+    for node in nodes:
+        if id(node) in copied:
+            children = node.pop('children')
+            if children:
+                node['children'] = tuple(_freeze_copied(children, copied))
+        yield node
@@ -0,0 +1,176 @@
+from re import compile as re_compile
+from typing import Iterable, Iterator, List, Optional, Set
+
+from .helpers import KNOWN_CONTAINER_KINDS
+from .nodes import (
+    INVALID_NODE_KIND,
+    TEXT_NODE_KIND,
+    AllowedAttrs,
+    AnyNode,
+    Node,
+    TextNode,
+    normalize_plaintext,
+)
+
+HTML_ENTITY = re_compile(r'&(?:#\d+|#[xX][\da-fA-F]+|\w+);')
+
+
+def nodelist_excerpt_plaintext(
+    nodelist: Iterable[AnyNode],
+    max_chars: int,
+    delimiter: str = '\n\n',
+    include: Set[str] = None,
+    exclude: Set[str] = None,
+) -> str:
+    """
+    Start of nodes plaintext of at most given length, which is the same as plaintext
+    of all the nodes truncated. Nodes are traversed until there is enough text only
+    """
+    assert max_chars >= 0, 'Invalid excerpt length'
+    include = include | {TEXT_NODE_KIND} if include else set()
+    exclude = exclude or set()
+    chunks: List[str] = []
+    size = 0
+    # Whitespace is normalized once there may be enough text, which only makes it shorter
+    next_check = max_chars
+    plaintext = ''
+    for chunk in _iter_text_chunks(nodelist, delimiter, include, exclude):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > next_check:
+            plaintext = normalize_plaintext(''.join(chunks), delimiter)
+            if len(plaintext) > max_chars:
+                break
+            next_check = size + max_chars - len(plaintext)
+    else:
+        plaintext = normalize_plaintext(''.join(chunks), delimiter)
+    return plaintext[:max_chars].rstrip()
+
+
+def _iter_text_chunks(
+    nodelist: Iterable[AnyNode], delimiter: str, include: Set[str], exclude: Set[str]
+) -> Iterator[str]:
+    # Chunks are the same as joined by nodelist_to_plaintext
+    for i, node in enumerate(nodelist):
+        if i:
+            yield delimiter
+        node_delimiter = delimiter if node.kind in KNOWN_CONTAINER_KINDS else ' '
+        if not isinstance(node, Node) or type(node).to_plaintext is not Node.to_plaintext:
+            yield node.to_plaintext(delimiter=node_delimiter, include=include, exclude=exclude)
+            continue
+        for j, chunk in enumerate(node.get_text_chunks(include=include, exclude=exclude)):
+            if j:
+                yield node_delimiter
+            yield chunk
+
+
+def nodelist_excerpt_html(
+    nodelist: Iterable[AnyNode],
+    max_chars: int = None,
+    max_blocks: int = None,
+    include: Set[str] = None,
+    exclude: Set[str] = None,
+    exclude_invalid: bool = True,
+    allowed_attrs: AllowedAttrs = None,
+) -> str:
+    """
+    HTML of first top-level nodes (blocks) and (or) of nodes with text of at most given length.
+    Text is truncated within the last node, tags opened by then are closed
+    """
+    assert max_chars is not None or max_blocks is not None, 'Excerpt size is not set'
+    include = include | {TEXT_NODE_KIND} if include else set()
+    exclude = exclude or set()
+    excerpt = _HtmlExcerpt(max_chars, include, exclude, allowed_attrs)
+    if exclude_invalid:
+        exclude = exclude | {INVALID_NODE_KIND}
+    blocks = 0
+    for node in nodelist:
+        if not excerpt.is_rendered(node, exclude):
+            continue
+        if max_blocks is not None and blocks >= max_blocks or excerpt.is_full:
+            break
+        excerpt.write_node(node, exclude)
+        # Whitespace between blocks is kept, but it is not a block
+        if node.kind != TEXT_NODE_KIND or node.to_plaintext().strip():
+            blocks += 1
+    return ''.join(excerpt.parts)
+
+
+class _HtmlExcerpt:
+    parts: List[str]
+    chars_left: Optional[int]
+
+    def __init__(
+        self,
+        max_chars: Optional[int],
+        include: Set[str],
+        exclude: Set[str],
+        allowed_attrs: Optional[AllowedAttrs],
+    ) -> None:
+        self.parts = []
+        self.chars_left = max_chars
+        self.include = include
+        # Nested nodes are rendered without invalid ones, as in nodelist_to_html
+        self.nested_exclude = exclude | {INVALID_NODE_KIND}
+        self.allowed_attrs = allowed_attrs
+
+    @property
+    def is_full(self) -> bool:
+        return self.chars_left is not None and self.chars_left <= 0
+
+    def is_rendered(self, node: AnyNode, exclude: Set[str]) -> bool:
+        include = self.include
+        return not (include and node.kind not in include or exclude and node.kind in exclude)
+
+    def write_node(self, node: AnyNode, exclude: Set[str]) -> None:
+        if isinstance(node, TextNode):
+            self.write_text(node.content)
+        elif isinstance(node, Node) and _is_html_traversable(node):
+            tagname = node.kind
+            if not tagname:
+                return
+            attrs = node.get_html_attrs(self.allowed_attrs)
+            if not node.children:
+                self.parts.append(f'<{tagname}{attrs} />')
+                return
+            self.parts.append(f'<{tagname}{attrs}>')
+            for child in node.children:
+                if not self.is_rendered(child, self.nested_exclude):
+                    continue
+                if self.is_full:
+                    break
+                self.write_node(child, self.nested_exclude)
+            self.parts.append(f'</{tagname}>')
+        else:
+            # Nodes with own rendering are written as a whole
+            self.parts.append(
+                node.to_html(
+                    include=self.include, exclude=exclude, allowed_attrs=self.allowed_attrs
+                )
+            )
+            if self.chars_left is not None:
+                self.chars_left -= len(node.to_plaintext())
+
+    def write_text(self, content: str) -> None:
+        if self.chars_left is not None:
+            if len(content) > self.chars_left:
+                content = truncate_html_text(content, self.chars_left)
+                self.chars_left = 0
+            else:
+                self.chars_left -= len(content)
+        self.parts.append(content)
+
+
+def truncate_html_text(content: str, max_chars: int) -> str:
+    # Entities are not cut in the middle
+    truncated = content[:max_chars]
+    entity_start = truncated.rfind('&')
+    if entity_start >= 0 and ';' not in truncated[entity_start:]:
+        if HTML_ENTITY.match(content, entity_start):
+            return truncated[:entity_start]
+    return truncated
+
+
+def _is_html_traversable(node: Node) -> bool:
+    node_type = type(node)
+    return node_type.to_html is Node.to_html and node_type.get_inner_html is Node.get_inner_html
@@ -3,7 +3,7 @@ from inspect import getmodule, stack
 from json import dumps as json_dumps
 from re import UNICODE, compile as re_compile
 from types import ModuleType
-from typing import Any
+from typing import Any, Hashable
 
 from pydantic import ConstrainedStr
 from pydantic.validators import strict_str_validator
@@ -63,3 +63,13 @@ def jsonify_node_value(value: Any) -> str:
     jsonified = json_dumps(value, ensure_ascii=False)
     jsonified = escape(jsonified.replace('\n', '\\n'))
     return jsonified
+
+
+def hashable_value(value: Any) -> Hashable:
+    # Value type is a part of the key, as True == 1 but these are rendered differently
+    if isinstance(value, dict):
+        return dict, tuple((key, hashable_value(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(map(hashable_value, value))
+    hash(value)
+    return type(value), value
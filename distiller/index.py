@@ -0,0 +1,89 @@
+from collections import defaultdict
+from heapq import merge
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type
+
+from .nodes import AnyNode
+
+
+class NodesIndex:
+    """
+    Nodes of a tree in document order, indexed by kinds and types, with links to parents
+    and siblings. Shared nodes (see Interner) are linked to their first occurrence
+    """
+
+    order: List[AnyNode]
+    by_kind: Dict[str, List[AnyNode]]
+    by_type: Dict[type, List[AnyNode]]
+
+    def __init__(self, nodes: Iterable[AnyNode]):
+        self.order = []
+        self.by_kind = defaultdict(list)
+        self.by_type = defaultdict(list)
+        self._positions: Dict[int, int] = {}
+        self._links: Dict[int, Tuple[Optional[AnyNode], Sequence[AnyNode], int]] = {}
+        self._index_nodelist(nodes, None)
+
+    def _index_nodelist(self, nodes: Iterable[AnyNode], parent: Optional[AnyNode]) -> None:
+        nodelist = nodes if isinstance(nodes, Sequence) else tuple(nodes)
+        for i, node in enumerate(nodelist):
+            self._positions.setdefault(id(node), len(self.order))
+            self._links.setdefault(id(node), (parent, nodelist, i))
+            self.order.append(node)
+            self.by_kind[node.kind].append(node)
+            self.by_type[getattr(node, 'node_type', type(node))].append(node)
+            children = getattr(node, 'children', None)
+            if children:
+                if not isinstance(children, Sequence):
+                    # One-shot iterators are materialized, so the tree is still walkable
+                    children = node.children = tuple(children)
+                self._index_nodelist(children, node)
+
+    def find_all(self, kind: str) -> List[AnyNode]:
+        return list(self.by_kind.get(kind, ()))
+
+    def find_first(self, kind: str) -> Optional[AnyNode]:
+        nodes = self.by_kind.get(kind)
+        return nodes[0] if nodes else None
+
+    def iter_by_type(self, node_type: Type[Any]) -> Iterator[AnyNode]:
+        # Nodes of subclasses are merged in document order
+        nodelists = [nodes for type_, nodes in self.by_type.items() if issubclass(type_, node_type)]
+        if len(nodelists) == 1:
+            return iter(nodelists[0])
+        return merge(*nodelists, key=self.position)
+
+    def position(self, node: AnyNode) -> int:
+        try:
+            return self._positions[id(node)]
+        except KeyError:
+            raise LookupError('Node is not indexed') from None
+
+    def parent(self, node: AnyNode) -> Optional[AnyNode]:
+        return self._link(node)[0]
+
+    def ancestors(self, node: AnyNode) -> List[AnyNode]:
+        # From the root to the node parent
+        ancestors = []
+        parent = self.parent(node)
+        while parent is not None:
+            ancestors.append(parent)
+            parent = self.parent(parent)
+        ancestors.reverse()
+        return ancestors
+
+    def siblings(self, node: AnyNode) -> Sequence[AnyNode]:
+        return self._link(node)[1]
+
+    def next_sibling(self, node: AnyNode) -> Optional[AnyNode]:
+        _, siblings, i = self._link(node)
+        return siblings[i + 1] if i + 1 < len(siblings) else None
+
+    def previous_sibling(self, node: AnyNode) -> Optional[AnyNode]:
+        _, siblings, i = self._link(node)
+        return siblings[i - 1] if i > 0 else None
+
+    def _link(self, node: AnyNode) -> Tuple[Optional[AnyNode], Sequence[AnyNode], int]:
+        try:
+            return self._links[id(node)]
+        except KeyError:
+            raise LookupError('Node is not indexed') from None
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, MutableSequence, Optional, Set
+
+from .helpers import hashable_value
+
+DEFAULT_MAX_VALUE_LENGTH = 64
+DEFAULT_MAX_TABLE_SIZE = 2 ** 16
+
+
+class Interner:
+    """
+    Tables of repeated kinds, attributes names and values and (optionally) subtrees,
+    which may be shared by any number of documents to keep them deduplicated in memory.
+    Tables keep up to max_table_size least recently used entries each, unbounded if None
+    """
+
+    max_value_length: int
+    share_subtrees: bool
+    max_table_size: Optional[int]
+    strings: 'OrderedDict[str, str]'
+    subtrees: 'OrderedDict[Hashable, Any]'
+
+    def __init__(
+        self,
+        max_value_length: int = DEFAULT_MAX_VALUE_LENGTH,
+        share_subtrees: bool = False,
+        max_table_size: Optional[int] = DEFAULT_MAX_TABLE_SIZE,
+    ):
+        assert max_table_size is None or max_table_size > 0, 'Invalid max table size'
+        self.max_value_length = max_value_length
+        self.share_subtrees = share_subtrees
+        self.max_table_size = max_table_size
+        self.strings = OrderedDict()
+        self.subtrees = OrderedDict()
+        self._shared_ids: Set[int] = set()
+
+    # Tables are local to a process, so interners are pickled as empty ones with same settings
+    def __reduce__(self) -> Any:
+        return self.__class__, (self.max_value_length, self.share_subtrees, self.max_table_size)
+
+    def string(self, value: str) -> str:
+        interned = self.strings.get(value)
+        if interned is not None:
+            self.strings.move_to_end(value)
+            return interned
+        self.strings[value] = value
+        if self.max_table_size is not None and len(self.strings) > self.max_table_size:
+            self.strings.popitem(last=False)
+        return value
+
+    def value(self, value: Any) -> Any:
+        # Long values (e.g. texts or URLs) are rarely repeated, so these are not retained
+        if isinstance(value, str):
+            return self.string(value) if len(value) <= self.max_value_length else value
+        if isinstance(value, list):
+            return list(map(self.value, value))
+        if isinstance(value, dict):
+            return self.attrs(value)
+        return value
+
+    def attrs(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        return {self.string(name): self.value(value) for name, value in attrs.items()}
+
+    def share(self, node: Any) -> Any:
+        """
+        Return the very same node object for all equal subtrees. Node children must be shared
+        already, so subtrees are compared by their children identities. Nodes with post-init
+        methods are never shared, as these are mutated on finalization. Shared nodes keep
+        context data of their first occurrence, but no parent, as these have many of them
+        (see NodesIndex for parents within a document)
+        """
+        if not self.share_subtrees or getattr(node, 'post_init_method', None) is not None:
+            return node
+        children = getattr(node, 'children', None) or ()
+        if not all(id(child) in self._shared_ids for child in children):
+            return node
+        values = {name: value for name, value in node.__dict__.items() if name != 'children'}
+        try:
+            key = (type(node), hashable_value(values), tuple(map(id, children)))
+        except TypeError:
+            return node
+        shared = self.subtrees.get(key)
+        if shared is not None:
+            self.subtrees.move_to_end(key)
+            return shared
+        # Parents of the first occurrence would be kept in memory along with its document
+        context = getattr(node, 'context', None)
+        if context is not None and context.parent is not None:
+            node.bind_context(context.data)
+        self.subtrees[key] = node
+        self._shared_ids.add(id(node))
+        if self.max_table_size is not None and len(self.subtrees) > self.max_table_size:
+            _, evicted = self.subtrees.popitem(last=False)
+            self._shared_ids.discard(id(evicted))
+        return node
+
+    def share_nodelist(self, nodelist: MutableSequence[Any]) -> None:
+        # Subtrees are shared bottom-up, references are replaced in place
+        for i, node in enumerate(nodelist):
+            children: Optional[MutableSequence] = getattr(node, 'children', None)
+            if children:
+                self.share_nodelist(children)
+            nodelist[i] = self.share(node)
+
+    def clear(self) -> None:
+        self.strings.clear()
+        self.subtrees.clear()
+        self._shared_ids.clear()
@@ -1,23 +1,90 @@
+from collections import defaultdict, deque
+from hashlib import blake2b
+from importlib import import_module
+from itertools import repeat
 from types import ModuleType
-from typing import Any, Callable, Dict, Iterable, Tuple, Type, Union
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 from ..base import BaseDistiller, DistillationResult, DistilledObject
+from ..binary import FilePath
+from ..codegen import compile_node_codecs
 from ..helpers import glue_multi_newlines
-from ..nodes import Node
-from .mapper import MapperConfig, NodeTypesMapper
-from .parser import MarkupParser
+from ..interning import Interner
+from ..nodes import AnyNode, Node, NodeType, freeze_context
+from ..stats import STAGE_POSTPROCESS, STAGE_PREPROCESS, DistillationStats, StatsHook, measure
+from .mapper import MapperConfig, NodeTypesMapper, load_precompiled_mapper, read_precompiled_mapper
+from .parser import (
+    DOCUMENT_TAGS,
+    WHITESPACE_KEEP,
+    WHITESPACE_POLICIES,
+    BlockStart,
+    MarkupParser,
+    MarkupParserError,
+    MarkupParserErrors,
+)
 from .preprocessor import compile_custom_tokens_patterns, tagify_custom_tokens
+from .splitter import MARKUP_TOKENS, join_blocks, split_blocks
 
 Preprocessor = Callable[[str], str]
 Postprocessor = Callable[[Node], None]
+PostprocessorTarget = Union[str, NodeType]
+PostprocessorsConfig = Union[
+    Iterable[Postprocessor],
+    Mapping[PostprocessorTarget, Union[Postprocessor, Iterable[Postprocessor]]],
+]
 CustomTagConfig = Union[Tuple[str, str, str], str]
 DEFAULT_PREPROCESSORS = (glue_multi_newlines,)
+# Minimal size of markup chunks distilled in parallel, smaller ones aren't worth the transfer
+DEFAULT_PARALLEL_CHUNK_SIZE = 64 * 1024
+
+
+class DistilledBlock(NamedTuple):
+    key: bytes
+    nodes: Tuple[AnyNode, ...]
+    errors: Tuple[MarkupParserError, ...]
+    errors_total: int
+
+
+class SourceBlocks(NamedTuple):
+    context: Dict[str, Any]
+    blocks: Tuple[DistilledBlock, ...]
 
 
 class MarkupDistiller(BaseDistiller):
+    """
+    Distiller may be called from any number of threads at once: its configuration and mapper
+    are not changed once created, and every call has own parser, result state and stats.
+    Postprocessors, stats hooks and post-init methods of node types are called from these
+    threads too, and interner (if any) is shared by all the calls
+    """
+
+    config: Dict[str, Any]
     types_mapper: NodeTypesMapper
     preprocessors: Tuple[Preprocessor, ...]
     postprocessors: Tuple[Postprocessor, ...]
+    targeted_postprocessors: Dict[str, Tuple[Postprocessor, ...]]
+    collect_stats: bool
+    stats_hook: Optional[StatsHook]
+    max_errors: Optional[int]
+    error_context_limit: Optional[int]
+    deduplicate_errors: bool
+    unwrap_excluded: bool
+    whitespace: str
+    keep_invalid_nodes: bool
+    keep_source_blocks: bool
 
     def __init__(
         self,
@@ -27,24 +94,61 @@ class MarkupDistiller(BaseDistiller):
         include: Iterable[str] = None,
         exclude: Iterable[str] = None,
         preprocessors: Iterable[Preprocessor] = None,
-        postprocessors: Iterable[Postprocessor] = None,
+        postprocessors: PostprocessorsConfig = None,
         tagify: CustomTagConfig = None,
+        collect_stats: bool = False,
+        stats_hook: StatsHook = None,
+        max_errors: int = None,
+        error_context_limit: int = None,
+        deduplicate_errors: bool = False,
+        unwrap_excluded: bool = False,
+        whitespace: str = WHITESPACE_KEEP,
+        interner: Interner = None,
+        precompiled: FilePath = None,
+        keep_invalid_nodes: bool = False,
+        keep_source_blocks: bool = False,
     ):
+        # Distillers are pickled as configuration, which they are created with
+        self.config = {
+            name: value for name, value in locals().items() if name not in ('self', '__class__')
+        }
+        self.config['rules'] = dict(rules or {})
+        # Precompiled mapper is read before node types are loaded, so their codecs are reused
+        precompiled_mapper = (
+            read_precompiled_mapper(precompiled) if precompiled is not None else None
+        )
         super().__init__(
-            types_module=types_module, return_type=return_type, include=include, exclude=exclude
+            types_module=types_module,
+            return_type=return_type,
+            include=include,
+            exclude=exclude,
+            interner=interner,
         )
-        types_mapper = NodeTypesMapper.create(predefined_types=self.registry, rules=rules)
-        for ruleset in types_mapper.tag_rules.values():
-            for (_, cls) in ruleset:
-                self.registry.add(cls)
-        for (_, cls) in types_mapper.relations_rules:
-            self.registry.add(cls)
+        if precompiled is not None:
+            types_mapper = load_precompiled_mapper(
+                precompiled, self.registry, rules, precompiled=precompiled_mapper
+            )
+        else:
+            types_mapper = NodeTypesMapper.create(predefined_types=self.registry, rules=rules)
+        self.registry.update(types_mapper.rules_node_types())
+        compile_node_codecs(self.registry)
         self.types_mapper = types_mapper
         self.preprocessors = tuple(preprocessors or ())
         if tagify:
             self.configure_custom_tags_parsing(tagify)
         self.preprocessors = DEFAULT_PREPROCESSORS + self.preprocessors
-        self.postprocessors = tuple(postprocessors or ())
+        self.configure_postprocessors(postprocessors)
+        self.collect_stats = collect_stats or stats_hook is not None
+        self.stats_hook = stats_hook
+        self.max_errors = max_errors
+        self.error_context_limit = error_context_limit
+        self.deduplicate_errors = deduplicate_errors
+        self.unwrap_excluded = unwrap_excluded
+        assert whitespace in WHITESPACE_POLICIES, 'Invalid whitespace policy'
+        self.whitespace = whitespace
+        self.keep_invalid_nodes = keep_invalid_nodes
+        # Results keep keys of their top-level blocks, so these are reused on redistillation
+        self.keep_source_blocks = keep_source_blocks
 
     def __call__(
         self,
@@ -52,21 +156,177 @@ class MarkupDistiller(BaseDistiller):
         context: Dict[str, Any] = None,
         raise_validation_error: bool = False,
     ) -> DistillationResult:
+        stats = DistillationStats(hook=self.stats_hook) if self.collect_stats else None
         obj = self.return_type()
-        markup = self.preprocess(source) if source else ''
-        parser_instance = MarkupParser(
+        obj._stats = stats
+        with measure(stats, STAGE_PREPROCESS):
+            markup = self.preprocess(source) if source else ''
+        context_ = {**self.context, **(context or {})}
+        parser_instance = self.parse(
+            markup, obj, context=context_, raise_validation_error=raise_validation_error
+        )
+        obj._state.parser = parser_instance
+        obj.nodes = parser_instance.nodes
+        if self.keep_source_blocks:
+            obj._source_blocks = _split_source_blocks(markup, context_, parser_instance)
+        if stats is not None:
+            stats.report()
+        return obj, parser_instance.errors
+
+    def parse(
+        self,
+        markup: str,
+        obj: DistilledObject,
+        context: Dict[str, Any],
+        raise_validation_error: bool = False,
+        postprocessing: bool = True,
+    ) -> MarkupParser:
+        return MarkupParser(
             markup,
             mapper=self.types_mapper,
-            context={**self.context, **(context or {})},
+            context=context,
             include=self.include,
             exclude=self.exclude,
             raise_validation_error=raise_validation_error,
-            nodetasks=obj._State.tasks,
+            nodetasks=obj._state.tasks,
             postprocessors=self.postprocessors,
+            targeted_postprocessors=self.targeted_postprocessors,
+            stats=obj._stats,
+            max_errors=self.max_errors,
+            error_context_limit=self.error_context_limit,
+            deduplicate_errors=self.deduplicate_errors,
+            unwrap_excluded=self.unwrap_excluded,
+            whitespace=self.whitespace,
+            interner=self.interner,
+            keep_invalid_nodes=self.keep_invalid_nodes,
+            postprocessing=postprocessing,
+            record_blocks=self.keep_source_blocks,
         )
-        obj._State.parser = parser_instance
-        obj.nodes = parser_instance.nodes
-        return obj, parser_instance.errors
+
+    def redistill(
+        self,
+        previous: DistilledObject,
+        source: str,
+        context: Dict[str, Any] = None,
+        raise_validation_error: bool = False,
+    ) -> DistillationResult:
+        """
+        Distill edited source, reusing nodes (already finalized ones as well) of top-level
+        blocks, which are not changed since the previous result. Only post-init tasks
+        of new nodes are collected. Source is distilled as a whole, if it can't be split
+        into blocks safely, or if mapper rules depend on siblings, which may cross blocks
+        """
+        stats = DistillationStats(hook=self.stats_hook) if self.collect_stats else None
+        with measure(stats, STAGE_PREPROCESS):
+            markup = self.preprocess(source) if source else ''
+        blocks = None if self.types_mapper.sibling_rules else split_blocks(markup)
+        if blocks is None:
+            return self(source, context=context, raise_validation_error=raise_validation_error)
+
+        obj = self.return_type()
+        obj._stats = stats
+        context_ = {**self.context, **(context or {})}
+        reusable: Dict[bytes, Deque[DistilledBlock]] = defaultdict(deque)
+        previous_blocks: Optional[SourceBlocks] = previous._source_blocks
+        if previous_blocks is not None and previous_blocks.context == context_:
+            for block in previous_blocks.blocks:
+                reusable[block.key].append(block)
+
+        distilled_blocks = []
+        errors = MarkupParserErrors()
+        for block_markup in blocks:
+            key = _block_key(block_markup)
+            candidates = reusable.get(key)
+            if candidates:
+                block = candidates.popleft()
+            else:
+                parser_instance = self.parse(
+                    block_markup, obj, context_, raise_validation_error=raise_validation_error
+                )
+                block_errors = parser_instance.builder.errors
+                block = DistilledBlock(
+                    key, tuple(parser_instance.nodes), tuple(block_errors), block_errors.total
+                )
+            distilled_blocks.append(block)
+            errors.extend(block.errors)
+            errors.total += block.errors_total
+        if self.max_errors is not None:
+            del errors[self.max_errors :]
+
+        obj.nodes = tuple(node for block in distilled_blocks for node in block.nodes)
+        obj._source_blocks = SourceBlocks(context_, tuple(distilled_blocks))
+        if stats is not None:
+            stats.report()
+        return obj, errors
+
+    def __reduce__(self) -> Any:
+        config = dict(self.config)
+        types_module = config.pop('types_module')
+        # Stats hooks are bound to the process, as in DistillationStats, stats are still collected
+        config['stats_hook'] = None
+        config['collect_stats'] = self.collect_stats
+        module_name = types_module.__name__ if types_module is not None else None
+        return _create_distiller, (self.__class__, module_name, config), {'context': self.context}
+
+    def distill_parallel(
+        self,
+        source: str,
+        context: Dict[str, Any] = None,
+        raise_validation_error: bool = False,
+        workers: int = None,
+        chunk_size: int = DEFAULT_PARALLEL_CHUNK_SIZE,
+    ) -> DistillationResult:
+        """
+        Distill large source in worker processes, splitting it into chunks of top-level blocks.
+        Nodes are bound to the context, postprocessed and their post-init tasks are collected
+        once these are back, so neither context nor postprocessors results are passed between
+        processes. Source is distilled as a whole in the current process, if it can't be split
+        or is too small, or if mapper rules depend on siblings. Distiller is passed to workers
+        once, it must be picklable (except for stats hook), unless workers are forked
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        stats = DistillationStats(hook=self.stats_hook) if self.collect_stats else None
+        with measure(stats, STAGE_PREPROCESS):
+            markup = self.preprocess(source) if source else ''
+        blocks = None if self.types_mapper.sibling_rules else split_blocks(markup)
+        chunks = list(join_blocks(blocks, chunk_size)) if blocks else []
+        if len(chunks) < 2:
+            return self(source, context=context, raise_validation_error=raise_validation_error)
+
+        obj = self.return_type()
+        obj._stats = stats
+        context_ = {**self.context, **(context or {})}
+        nodes: List[AnyNode] = []
+        errors = MarkupParserErrors()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_chunks_worker, initargs=(self,)
+        ) as pool:
+            results = pool.map(_distill_chunk, chunks, repeat(raise_validation_error))
+            for chunk_nodes, chunk_errors, errors_total, chunk_stats in results:
+                nodes.extend(chunk_nodes)
+                errors.extend(chunk_errors)
+                errors.total += errors_total
+                if stats is not None and chunk_stats is not None:
+                    _merge_chunk_stats(stats, chunk_stats)
+        if self.max_errors is not None:
+            del errors[self.max_errors :]
+
+        obj.nodes = tuple(nodes)
+        context_data = freeze_context(context_)
+        for node in obj.walk():
+            if isinstance(node, Node):
+                node.bind_context(context_data, parent=node.context.parent)
+        with measure(stats, STAGE_POSTPROCESS):
+            self.postprocess_nodes(obj.walk())
+        # Equal subtrees are shared once postprocessors are done with them
+        if self.interner is not None:
+            self.interner.share_nodelist(nodes)
+            obj.nodes = tuple(nodes)
+        obj.collect_tasks()
+        if stats is not None:
+            stats.report()
+        return obj, errors
 
     def configure_custom_tags_parsing(self, config_: CustomTagConfig) -> None:
         config = config_ if isinstance(config_, tuple) else tuple(char for char in config_)
@@ -79,9 +339,146 @@ class MarkupDistiller(BaseDistiller):
 
         self.preprocessors = (tagify,) + self.preprocessors
 
+    def configure_postprocessors(self, config: PostprocessorsConfig = None) -> None:
+        # Postprocessors may be targeted to node kinds or types, "*" target means any node.
+        # Nodes of other types may have the same kind (e.g. tags named as types of rules),
+        # so type-targeted postprocessors skip these
+        config_map = config if isinstance(config, Mapping) else {'*': tuple(config or ())}
+        targeted: Dict[str, List[Postprocessor]] = defaultdict(list)
+
+        # Node types may declare own postprocessing hooks, these go first
+        for node_type in self.registry:
+            hook = getattr(node_type, 'postprocess', None)
+            if callable(hook):
+                targeted[node_type.get_node_kind_value()].append(_for_type(node_type, hook))
+
+        postprocessors: Tuple[Postprocessor, ...] = ()
+        for target, postprocessors_ in config_map.items():
+            if callable(postprocessors_):
+                postprocessors_ = (postprocessors_,)
+            if target == '*':
+                postprocessors += tuple(postprocessors_)
+                continue
+            if isinstance(target, str):
+                targeted[target].extend(postprocessors_)
+                continue
+            targeted[target.get_node_kind_value()].extend(
+                _for_type(target, postprocess) for postprocess in postprocessors_
+            )
+
+        self.postprocessors = postprocessors
+        self.targeted_postprocessors = {
+            kind: tuple(kind_postprocessors) for kind, kind_postprocessors in targeted.items()
+        }
+
+    def postprocess_nodes(self, nodes: Iterable[AnyNode]) -> None:
+        # Same as on parsing: untargeted postprocessors go first, then targeted ones by kinds
+        kinds_index: Dict[str, List[Node]] = defaultdict(list)
+        for node in nodes:
+            if not isinstance(node, Node):
+                continue
+            for postprocess in self.postprocessors:
+                postprocess(node)
+            if node.kind in self.targeted_postprocessors:
+                kinds_index[node.kind].append(node)
+        for kind, kind_nodes in kinds_index.items():
+            for postprocess in self.targeted_postprocessors[kind]:
+                for node in kind_nodes:
+                    postprocess(node)
+
     def preprocess(self, markup: str) -> str:
         markup = markup.strip()
         for preprocessor_fn in self.preprocessors:
             markup = preprocessor_fn(markup)
         # TODO: escape square brackets with non-latin symbols inside
         return markup
+
+
+def _for_type(node_type: NodeType, postprocess: Postprocessor) -> Postprocessor:
+    def postprocess_type(node: Node) -> None:
+        if isinstance(node, node_type):
+            postprocess(node)
+
+    return postprocess_type
+
+
+def _block_key(markup: str) -> bytes:
+    return blake2b(markup.encode(), digest_size=16).digest()
+
+
+def _split_source_blocks(
+    markup: str, context: Dict[str, Any], parser_instance: MarkupParser
+) -> Optional[SourceBlocks]:
+    # Blocks must match top-level elements, which differ if parser restructured the markup
+    block_starts = parser_instance.builder.block_starts
+    blocks = split_blocks(markup)
+    if block_starts is None or blocks is None:
+        return None
+    first = MARKUP_TOKENS.match(blocks[0]) if blocks else None
+    # Leading text (if any) goes before the first element
+    bounds = [BlockStart('', 0, 0, 0)] if blocks and (not first or not first[2]) else []
+    if len(blocks) != len(bounds) + len(block_starts):
+        return None
+    for block, start in zip(blocks[len(bounds) :], block_starts):
+        match = MARKUP_TOKENS.match(block)
+        if not match or not match[2] or match[2].lower() != start.tagname:
+            return None
+        bounds.append(start)
+    if bounds and bounds[0].nodes:
+        return None
+    nodes = tuple(parser_instance.nodes)
+    errors = parser_instance.builder.errors
+    bounds.append(BlockStart('', len(nodes), len(errors), errors.total))
+    return SourceBlocks(
+        context,
+        tuple(
+            DistilledBlock(
+                _block_key(block),
+                nodes[start.nodes : end.nodes],
+                tuple(errors[start.errors : end.errors]),
+                end.errors_total - start.errors_total,
+            )
+            for block, start, end in zip(blocks, bounds, bounds[1:])
+        ),
+    )
+
+
+def _create_distiller(
+    cls: Type[MarkupDistiller], types_module_name: Optional[str], config: Dict[str, Any]
+) -> MarkupDistiller:
+    types_module = import_module(types_module_name) if types_module_name else None
+    return cls(types_module=types_module, **config)
+
+
+_chunks_worker: Dict[str, MarkupDistiller] = {}
+
+
+def _init_chunks_worker(distiller: MarkupDistiller) -> None:
+    _chunks_worker['distiller'] = distiller
+
+
+def _distill_chunk(
+    markup: str, raise_validation_error: bool
+) -> Tuple[List[AnyNode], List[MarkupParserError], int, Optional[DistillationStats]]:
+    distiller = _chunks_worker['distiller']
+    obj = distiller.return_type()
+    # Hooks are called in the parent process only
+    obj._stats = DistillationStats() if distiller.collect_stats else None
+    # Nodes are bound to the context and postprocessed in the parent process
+    parser_instance = distiller.parse(markup, obj, {}, raise_validation_error, postprocessing=False)
+    errors = parser_instance.builder.errors
+    return list(parser_instance.nodes), list(errors), errors.total, obj._stats
+
+
+def _merge_chunk_stats(stats: DistillationStats, chunk_stats: DistillationStats) -> None:
+    # Timings are summed up over workers, tasks are counted once nodes are collected
+    for stage, elapsed in chunk_stats.timings.items():
+        stats.timings[stage] = stats.timings.get(stage, 0.0) + elapsed
+    # Every chunk is parsed as a document, while there is a single one
+    for kind, count in chunk_stats.nodes.items():
+        if kind in DOCUMENT_TAGS:
+            stats.nodes[kind] = max(stats.nodes[kind], count)
+        else:
+            stats.nodes[kind] += count
+    stats.invalid_nodes += chunk_stats.invalid_nodes
+    stats.errors += chunk_stats.errors
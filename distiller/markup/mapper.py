@@ -1,45 +1,102 @@
 from collections import defaultdict
-from typing import Dict, Iterable, Mapping, NamedTuple, Set, Tuple
+from contextlib import suppress
+from importlib.util import MAGIC_NUMBER
+from os import remove, replace
+from os.path import basename, dirname
+from pickle import HIGHEST_PROTOCOL, PickleError, dump as pickle_dump, load as pickle_load
+from tempfile import mkstemp
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from bs4.element import Tag
-from soupsieve import SoupSieve, compile as sv_compile
+from soupsieve import SoupSieve, __version__ as soupsieve_version, compile as sv_compile
+from soupsieve.css_types import SelectorNull
 
+from ..binary import FilePath
+from ..codegen import compile_node_codecs, dump_compiled_codecs, load_compiled_codecs
 from ..nodes import Node, NodeType
 
+ANY_TAG = '*'
+# Precompiled mappers of other format versions are compiled again, as well as these saved
+# with other soupsieve or Python versions (codecs code is marshalled, see codegen)
+PRECOMPILED_MAPPER_VERSION = 3
+PRECOMPILED_RUNTIME = (PRECOMPILED_MAPPER_VERSION, soupsieve_version, MAGIC_NUMBER)
 
+
+class TagNameRule:
+    # Predefined types are matched by tag name, which is the rules key, so there is nothing to check
+    __slots__ = ()
+
+    def match(self, tag: Tag) -> bool:
+        return True
+
+    def __reduce__(self) -> str:
+        return 'TAG_NAME_RULE'
+
+
+TAG_NAME_RULE = TagNameRule()
+
+
+# Mappers are shared by concurrent distillation calls, so these are immutable once created
 class NodeTypesMapper(NamedTuple):
-    tag_rules: 'MapperRules' = {}
-    relations_rules: Set['MapperRule'] = set()
+    tag_rules: 'MapperRules' = MappingProxyType({})
+    relations_rules: FrozenSet['RelationRule'] = frozenset()
     default_node_type: NodeType = Node
+    # Tag names which rules inspect besides matched tag itself (ancestors, siblings etc.)
+    context_tags: FrozenSet[str] = frozenset()
+    # Whether any rule depends on siblings of matched tag or its ancestors
+    sibling_rules: bool = False
 
     @classmethod
     def create(
         cls, predefined_types: Iterable[NodeType] = None, rules: 'MapperConfig' = None
     ) -> 'NodeTypesMapper':
         predefined_types = predefined_types or ()
-        rules = rules or {}
+        # Rules are copied, as the default node type is popped from these
+        rules = dict(rules or {})
         default_node_type = rules.pop('*', Node)
-        tag_rules = defaultdict(list)
+        tag_rules: Dict[str, List[MapperRule]] = defaultdict(list)
         relations_rules = set()
+        context_tags: Set[str] = set()
+        sibling_rules = False
 
         for node_type in predefined_types:
             node_kind = node_type.get_node_kind_value()
-            rule = sv_compile(pattern=node_kind)
-            tag_rules[node_kind].append((rule, node_type))
+            tag_rules[node_kind].append((TAG_NAME_RULE, node_type))
 
         for pattern, node_type in rules.items():
             rule = sv_compile(pattern)
             compiled_mapper_rule = (rule, node_type)
+            collect_context_tags(rule.selectors, context_tags)
+            sibling_rules = sibling_rules or has_sibling_dependencies(rule.selectors)
             for selector in rule.selectors:
+                # Null selectors (e.g. of empty :is()) match nothing
+                if isinstance(selector, SelectorNull):
+                    continue
                 if selector.relation:
                     relations_rules.add(compiled_mapper_rule)
                 else:
-                    tag_rules[selector.tag.name].append(compiled_mapper_rule)
+                    tagname = selector.tag.name if selector.tag else ANY_TAG
+                    tag_rules[tagname].append(compiled_mapper_rule)
 
         return cls(
-            tag_rules=tag_rules,  # type: ignore
-            relations_rules=relations_rules,
+            tag_rules={name: tuple(ruleset) for name, ruleset in tag_rules.items()},
+            relations_rules=frozenset(relations_rules),
             default_node_type=default_node_type,
+            context_tags=frozenset(context_tags),
+            sibling_rules=sibling_rules,
         )
 
     def find_tag_node_type(self, tag: Tag) -> NodeType:
@@ -50,8 +107,130 @@ class NodeTypesMapper(NamedTuple):
                 matched_node_type = node_type
         return matched_node_type or self.default_node_type
 
+    def find_tag_kinds(self, tagname: str) -> Set[str]:
+        # All node kinds tag with given name may be mapped to, regardless of its attrs
+        kinds = {tagname}
+        rules = self.tag_rules.get(tagname) or self.tag_rules.get(ANY_TAG)
+        for _, node_type in rules or ():
+            if node_type is not self.default_node_type:
+                kinds.add(node_type.get_node_kind_value())
+        for rule, node_type in self.relations_rules:
+            for selector in rule.selectors:
+                if not selector.tag or selector.tag.name in {tagname, ANY_TAG}:  # type: ignore
+                    kinds.add(node_type.get_node_kind_value())
+        return kinds
+
+    def is_context_tag(self, tagname: str) -> bool:
+        return tagname in self.context_tags or ANY_TAG in self.context_tags
+
+    def rules_node_types(self) -> Set[NodeType]:
+        node_types = {node_type for _, node_type in self.relations_rules}
+        for ruleset in self.tag_rules.values():
+            node_types.update(node_type for _, node_type in ruleset)
+        return node_types
+
+
+class PrecompiledMapper(NamedTuple):
+    key: Tuple
+    mapper: NodeTypesMapper
+    # Marshalled code of node codecs, see codegen
+    codecs: bytes
+
+
+def read_precompiled_mapper(path: FilePath) -> Optional[PrecompiledMapper]:
+    """
+    Read mapper precompiled to the file. Codecs code saved with it is loaded at once,
+    so node types of any distiller skip compilation of codecs, which are known by their source
+    """
+    try:
+        with open(path, 'rb') as file:
+            precompiled = pickle_load(file)
+        if precompiled.key[: len(PRECOMPILED_RUNTIME)] != PRECOMPILED_RUNTIME:
+            return None
+        load_compiled_codecs(precompiled.codecs)
+        return precompiled  # type: ignore
+    except (OSError, EOFError, PickleError, AttributeError, ImportError, ValueError, TypeError):
+        return None
+
+
+def load_precompiled_mapper(
+    path: FilePath,
+    predefined_types: Iterable[NodeType] = None,
+    rules: 'MapperConfig' = None,
+    precompiled: PrecompiledMapper = None,
+) -> NodeTypesMapper:
+    """
+    Return mapper precompiled for the same types and rules (see read_precompiled_mapper),
+    or create it and save to the file with node codecs, so other processes skip compilation
+    of rules selectors and codecs.
+    Node types are pickled by reference, so types defined in local scopes are not saved
+    """
+    predefined_types = tuple(predefined_types or ())
+    rules = dict(rules or {})
+    key = precompiled_mapper_key(predefined_types, rules)
+    if precompiled is not None and precompiled.key == key:
+        return precompiled.mapper
+
+    mapper = NodeTypesMapper.create(predefined_types=predefined_types, rules=rules)
+    compile_node_codecs(mapper.rules_node_types())
+    # File is replaced at once, so concurrently starting processes never read it partially,
+    # temporary files are unique across these
+    tmp_path = None
+    try:
+        directory = dirname(path) or None
+        fd, tmp_path = mkstemp(prefix=f'{basename(path)}.', suffix='.tmp', dir=directory)
+        with open(fd, 'wb') as file:
+            precompiled = PrecompiledMapper(key, mapper, dump_compiled_codecs())
+            pickle_dump(precompiled, file, protocol=HIGHEST_PROTOCOL)
+        replace(tmp_path, path)
+    except (OSError, PickleError, AttributeError, TypeError):
+        if tmp_path is not None:
+            with suppress(OSError):
+                remove(tmp_path)
+    return mapper
+
+
+def precompiled_mapper_key(predefined_types: Iterable[NodeType], rules: 'MapperConfig') -> Tuple:
+    def type_path(node_type: NodeType) -> str:
+        return f'{node_type.__module__}.{node_type.__qualname__}'
+
+    return (
+        *PRECOMPILED_RUNTIME,
+        tuple(sorted(map(type_path, predefined_types))),
+        tuple(sorted((pattern, type_path(node_type)) for pattern, node_type in rules.items())),
+    )
+
+
+def collect_context_tags(selectors: Any, tags: Set[str], subject: bool = True) -> None:
+    for selector in selectors:
+        if not hasattr(selector, 'tag'):
+            continue
+        if not subject:
+            tags.add(selector.tag.name if selector.tag else ANY_TAG)
+        # Structural pseudo-classes depend on siblings or contents of any kind
+        if selector.nth or selector.flags or selector.contains:
+            tags.add(ANY_TAG)
+        collect_context_tags(selector.relation, tags, subject=False)
+        for nested in selector.selectors:
+            collect_context_tags(nested, tags, subject=subject)
+
+
+def has_sibling_dependencies(selectors: Any) -> bool:
+    # Sibling combinators and structural pseudo-classes (nth-child, first-child, empty etc.)
+    for selector in selectors:
+        if not hasattr(selector, 'tag'):
+            continue
+        if selector.nth or selector.flags or (selector.rel_type or '').endswith(('+', '~')):
+            return True
+        if has_sibling_dependencies(selector.relation):
+            return True
+        if any(has_sibling_dependencies(nested) for nested in selector.selectors):
+            return True
+    return False
+
 
 CSSPattern = str
 MapperConfig = Dict[CSSPattern, NodeType]
-MapperRule = Tuple[SoupSieve, NodeType]
+RelationRule = Tuple[SoupSieve, NodeType]
+MapperRule = Tuple[Union[SoupSieve, TagNameRule], NodeType]
 MapperRules = Mapping[str, Iterable[MapperRule]]
@@ -1,11 +1,16 @@
-from collections import deque
+from collections import defaultdict, deque
+from html import escape
 from typing import (
     Any,
     Callable,
     Deque,
+    Dict,
+    Hashable,
     Iterable,
     List,
+    Mapping,
     MutableSequence,
+    NamedTuple,
     Optional,
     Sequence,
     Set,
@@ -19,19 +24,107 @@ from bs4.element import NavigableString, Tag
 from lxml.etree import HTMLParser
 from pydantic import ValidationError
 
-from ..nodes import AnyNode, InvalidNode, Node, NodeType, TextNode
+from ..interning import Interner
+from ..nodes import AnyNode, InvalidNode, Node, NodeType, TextNode, freeze_context
+from ..stats import STAGE_PARSE, STAGE_POSTPROCESS, STAGE_RELATIONS, DistillationStats, measure
 from .mapper import NodeTypesMapper
 
 ParsedNode = Union[Node, InvalidNode, None]
+DOCUMENT_TAGS = {'html', 'body'}
+# Whitespace next to these elements is not rendered, unlike whitespace between inline ones
+BLOCK_LEVEL_TAGS = DOCUMENT_TAGS | {
+    'address',
+    'article',
+    'aside',
+    'blockquote',
+    'dd',
+    'div',
+    'dl',
+    'dt',
+    'figcaption',
+    'figure',
+    'footer',
+    'h1',
+    'h2',
+    'h3',
+    'h4',
+    'h5',
+    'h6',
+    'header',
+    'hr',
+    'li',
+    'main',
+    'nav',
+    'ol',
+    'p',
+    'pre',
+    'section',
+    'table',
+    'tbody',
+    'td',
+    'tfoot',
+    'th',
+    'thead',
+    'tr',
+    'ul',
+}
+# Depth of lxml events for top-level elements of markup: html > body > element
+BLOCK_START_DEPTH = 3
+# Whitespace-only text nodes policies
+WHITESPACE_KEEP = 'keep'
+WHITESPACE_INTERN = 'intern'
+WHITESPACE_DROP = 'drop'
+WHITESPACE_POLICIES = {WHITESPACE_KEEP, WHITESPACE_INTERN, WHITESPACE_DROP}
 
 
 class MarkupParserError(ValueError):
     reason: ValidationError
-    context: str
+    kind: str
+    count: int
+    context_limit: Optional[int]
 
-    def __init__(self, reason: ValidationError, context: str = ''):
+    def __init__(
+        self,
+        reason: ValidationError,
+        context: Union[str, Tag] = '',
+        context_limit: int = None,
+        kind: str = '',
+    ):
         self.reason = reason
-        self.context = context
+        self.kind = kind
+        self.count = 1
+        self.context_limit = context_limit
+        self._context = context
+
+    # Tag context is rendered once parsing is done, so errors don't keep the soup alive
+    def render_context(self) -> None:
+        if isinstance(self._context, Tag):
+            self._context = render_tag_context(self._context, limit=self.context_limit)
+        elif self.context_limit is not None:
+            self._context = self._context[: self.context_limit]
+
+    @property
+    def context(self) -> str:
+        self.render_context()
+        return self._context
+
+    # Errors are pickled with rendered context
+    def __reduce__(self) -> Any:
+        state = {'count': self.count}
+        return self.__class__, (self.reason, self.context, None, self.kind), state
+
+
+class MarkupParserErrors(List[MarkupParserError]):
+    # Number of all errors occurred, including ones not collected due to budget or deduplication
+    total: int = 0
+
+
+class BlockStart(NamedTuple):
+    # Top-level element and numbers of top-level nodes and errors, which precede it
+    tagname: str
+    nodes: int
+    errors: int
+    errors_total: int
 
 
 class MarkupParser:
@@ -46,12 +139,23 @@ class MarkupParser:
         markup: str,
         mapper: NodeTypesMapper = None,
         postprocessors: Iterable[Callable] = None,
+        targeted_postprocessors: Mapping[str, Sequence[Callable]] = None,
         context: dict = None,
         include: Set[str] = None,
         exclude: Set[str] = None,
         raise_validation_error: bool = False,
         builder_cls: Type['TreeBuilder'] = None,
         nodetasks: MutableSequence = None,
+        stats: DistillationStats = None,
+        max_errors: int = None,
+        error_context_limit: int = None,
+        deduplicate_errors: bool = False,
+        unwrap_excluded: bool = False,
+        whitespace: str = WHITESPACE_KEEP,
+        interner: Interner = None,
+        keep_invalid_nodes: bool = False,
+        postprocessing: bool = True,
+        record_blocks: bool = False,
     ):
         self.nodestack = deque()
         self.builder = (builder_cls or TreeBuilder)(
@@ -62,40 +166,83 @@ class MarkupParser:
             raise_validation_error=raise_validation_error,
             nodetasks=nodetasks,
             nodestack=self.nodestack,
+            stats=stats,
+            max_errors=max_errors,
+            error_context_limit=error_context_limit,
+            deduplicate_errors=deduplicate_errors,
+            indexed_kinds=set(targeted_postprocessors or ()),
+            unwrap_excluded=unwrap_excluded,
+            whitespace=whitespace,
+            interner=interner,
+            keep_invalid_nodes=keep_invalid_nodes,
+            record_blocks=record_blocks,
         )
-        self.soup = BeautifulSoup(
-            markup=markup,
-            builder=self.builder,
-            element_classes=_ELEMENT_CLASSES,
-        )
+        with measure(stats, STAGE_PARSE):
+            self.soup = BeautifulSoup(
+                markup=markup,
+                builder=self.builder,
+                element_classes=_ELEMENT_CLASSES,
+            )
         body: TagNode = self.soup.body
         if not body:
+            self.builder.render_errors_context()
             return
 
         # To map relation rules between elements, we need to have the whole soup built
-        for relation, node_type in mapper.relations_rules if mapper else ():
-            for tag in relation.select(body):
-                self.builder.recreate_tag_node(tag, node_type)
+        errors_total = self.builder.errors.total
+        with measure(stats, STAGE_RELATIONS):
+            for relation, node_type in mapper.relations_rules if mapper else ():
+                for tag in relation.select(body):
+                    self.builder.recreate_tag_node(tag, node_type)
+        # Errors of relations rules can't be attributed to top-level blocks
+        if self.builder.errors.total != errors_total:
+            self.builder.block_starts = None
+        self.builder.render_errors_context()
 
         self.nodes = body.node.children if isinstance(body.node, Node) else ()
         self.errors = self.builder.errors
 
-        # Apply postprocessors
-        if postprocessors:
-            for node in self.nodestack:
-                for postprocess in postprocessors:
-                    postprocess(node)
+        # Postprocessing (and subtree sharing, which follows it) may be left to the caller
+        if not postprocessing:
+            return
+
+        # Apply postprocessors: untargeted ones to every node,
+        # targeted ones to nodes of their kinds only
+        if postprocessors or targeted_postprocessors:
+            with measure(stats, STAGE_POSTPROCESS):
+                for node in self.nodestack if postprocessors else ():
+                    for postprocess in postprocessors:  # type: ignore
+                        postprocess(node)
+                for kind, nodes in self.builder.kinds_index.items():
+                    for postprocess in targeted_postprocessors[kind]:  # type: ignore
+                        for node in nodes:
+                            postprocess(node)
+
+        # Equal subtrees are shared once postprocessors are done with them
+        if interner is not None and interner.share_subtrees and isinstance(self.nodes, deque):
+            interner.share_nodelist(self.nodes)
 
 
 class TreeBuilder(LXMLTreeBuilder):
     mapper: NodeTypesMapper
-    context: dict
+    context: Mapping[str, Any]
     disallowed_nodes: Set[str]
     allowed_nodes: Set[str]
-    errors: List[MarkupParserError]
+    unwrap_excluded: bool
+    whitespace: str
+    errors: MarkupParserErrors
     raise_validation_error: bool
+    max_errors: Optional[int]
+    error_context_limit: Optional[int]
+    deduplicate_errors: bool
     nodetasks: Optional[MutableSequence]
     nodestack: MutableSequence
+    indexed_kinds: Set[str]
+    kinds_index: Dict[str, List[Node]]
+    stats: Optional[DistillationStats]
+    interner: Optional[Interner]
+    keep_invalid_nodes: bool
+    block_starts: Optional[List[BlockStart]]
 
     def __init__(
         self,
@@ -107,24 +254,118 @@ class TreeBuilder(LXMLTreeBuilder):
         raise_validation_error: bool = False,
         nodetasks: MutableSequence = None,
         nodestack: MutableSequence = None,
+        stats: DistillationStats = None,
+        max_errors: int = None,
+        error_context_limit: int = None,
+        deduplicate_errors: bool = False,
+        indexed_kinds: Set[str] = None,
+        unwrap_excluded: bool = False,
+        whitespace: str = WHITESPACE_KEEP,
+        interner: Interner = None,
+        keep_invalid_nodes: bool = False,
+        record_blocks: bool = False,
         **kwargs: Any,
     ):
         super().__init__(*args, **kwargs)
         self.mapper = mapper or NodeTypesMapper()
-        self.context = context or {}
+        self.context = freeze_context(context)
         self.disallowed_nodes = exclude or set()
         if include:
-            self.allowed_nodes = include - self.disallowed_nodes | {'html', 'body'}
+            self.allowed_nodes = include - self.disallowed_nodes | DOCUMENT_TAGS
         else:
             self.allowed_nodes = set()
+        self.unwrap_excluded = unwrap_excluded
+        self._pruned_tags: Dict[str, bool] = {}
+        self._pruning_stack: List[bool] = []
+        self._dropped_depth = 0
+        self.whitespace = whitespace
+        self._whitespace_nodes: Dict[str, TextNode] = {}
         self.raise_validation_error = raise_validation_error
-        self.errors = []
+        self.errors = MarkupParserErrors()
+        self.max_errors = max_errors
+        self.error_context_limit = error_context_limit
+        self.deduplicate_errors = deduplicate_errors
+        self._errors_index: Dict[Hashable, MarkupParserError] = {}
         self.nodetasks = nodetasks
         self.nodestack = nodestack if nodestack is not None else deque()
+        self.indexed_kinds = indexed_kinds or set()
+        self.kinds_index = defaultdict(list)
+        self.stats = stats
+        self.interner = interner
+        self.keep_invalid_nodes = keep_invalid_nodes
+        self.block_starts = [] if record_blocks else None
+        self._events_depth = 0
 
     def parser_for(self, *args: Any, **kwargs: Any) -> HTMLParser:
         return HTMLParser(target=self, strip_cdata=False, recover=True, remove_comments=True)
 
+    # Excluded elements are skipped right at lxml events level, so no soup elements
+    # and nodes are created for them (and their contents, unless these are unwrapped)
+    def start(self, name: str, attrs: Dict[str, str], nsmap: Dict[str, str] = {}) -> None:
+        self._events_depth += 1
+        if self._dropped_depth:
+            self._dropped_depth += 1
+            return
+        pruned = self.is_tag_pruned(name)
+        if pruned:
+            # Text around pruned elements goes to separate strings, as if these were in the soup,
+            # whitespace of unwrapped contents is preserved the same way too
+            self.soup.endData()
+            if self.unwrap_excluded and name in self.preserve_whitespace_tags:
+                self.soup.preserve_whitespace_tag_stack.append(name)
+        if self._events_depth == BLOCK_START_DEPTH and self.block_starts is not None:
+            self.block_starts.append(self.create_block_start(name))
+        if self.unwrap_excluded:
+            self._pruning_stack.append(pruned)
+        elif pruned:
+            self._dropped_depth = 1
+        if not pruned:
+            super().start(name, attrs, nsmap)
+
+    def end(self, name: str) -> None:
+        self._events_depth -= 1
+        if self._dropped_depth:
+            self._dropped_depth -= 1
+        elif not self.unwrap_excluded or not self._pruning_stack.pop():
+            super().end(name)
+        else:
+            self.soup.endData()
+            if name in self.preserve_whitespace_tags:
+                self.soup.preserve_whitespace_tag_stack.pop()
+
+    def data(self, content: str) -> None:
+        if not self._dropped_depth:
+            super().data(content)
+
+    # Boundaries of top-level elements let the result be split into blocks, see redistill
+    def create_block_start(self, tagname: str) -> BlockStart:
+        # Pending text goes to the previous block, as soup would flush it at the start anyway
+        self.soup.endData()
+        parent = self.soup.currentTag
+        body_node = getattr(parent, 'node', None) if parent.name == 'body' else None
+        nodes = body_node.children if isinstance(body_node, Node) else ()
+        return BlockStart(tagname, len(nodes), len(self.errors), self.errors.total)
+
+    def is_tag_pruned(self, tagname: str) -> bool:
+        if not self.disallowed_nodes and not self.allowed_nodes:
+            return False
+        pruned = self._pruned_tags.get(tagname)
+        if pruned is None:
+            # Tag can be pruned only if it is excluded whatever node type it is mapped to,
+            # and no mapper rule depends on its presence
+            pruned = (
+                tagname not in DOCUMENT_TAGS
+                and not self.mapper.is_context_tag(tagname)
+                and all(map(self.is_kind_excluded, self.mapper.find_tag_kinds(tagname)))
+            )
+            self._pruned_tags[tagname] = pruned
+        return pruned
+
+    def is_kind_excluded(self, node_kind: str) -> bool:
+        return node_kind in self.disallowed_nodes or bool(
+            self.allowed_nodes and node_kind not in self.allowed_nodes
+        )
+
     def create_node_from_tag(self, tag: 'TagNode', node_type: NodeType = None) -> ParsedNode:
         # Use tag name as node kind value by default,
         # find declared schema class, skip processing if node kind disallowed
@@ -132,15 +373,14 @@ class TreeBuilder(LXMLTreeBuilder):
         node_type = node_type or self.mapper.find_tag_node_type(tag)
         if node_type != self.mapper.default_node_type:
             node_kind = node_type.get_node_kind_value()
-        if (
-            node_kind in self.disallowed_nodes
-            or self.allowed_nodes
-            and node_kind not in self.allowed_nodes
-        ):
+        if self.is_kind_excluded(node_kind):
             return None
 
         # Get & transform tag attributes
         node_attrs = node_type.prepare_attrs(tag.attrs)
+        if self.interner is not None:
+            node_kind = self.interner.string(node_kind)
+            node_attrs = self.interner.attrs(node_attrs)
 
         # Create node from class, collect/raise error
         try:
@@ -148,12 +388,23 @@ class TreeBuilder(LXMLTreeBuilder):
         except ValidationError as exc:
             if self.raise_validation_error:
                 raise exc
-            self.errors.append(MarkupParserError(reason=exc, context=str(tag)))
+            self.collect_error(exc, tag, node_kind)
+            if self.stats is not None:
+                self.stats.errors += 1
+                self.stats.invalid_nodes += 1
             return InvalidNode(tagname=node_kind, **node_attrs)
 
-        # Pass outer context
-        parent_node = tag.parent_node if isinstance(tag.parent_node, Node) else None
-        node.update_context(parent=parent_node, **self.context)
+        if self.stats is not None:
+            self.stats.nodes[node_kind] += 1
+        # Kind value is recreated by validator
+        if self.interner is not None:
+            node.kind = self.interner.string(node.kind)  # type: ignore
+
+        # Pass outer context, which is shared by all the nodes
+        parent_node = tag.parent_node
+        if not isinstance(parent_node, Node):
+            parent_node = None
+        node.bind_context(self.context, parent=parent_node)
 
         # node.children must be set as instance attribute, otherwise Pydantic uses iterators
         node.children = deque()
@@ -161,11 +412,57 @@ class TreeBuilder(LXMLTreeBuilder):
         # Add node post-init task to queue
         self.node_post_init(node)
 
-        # Add node to stack for further postprocessing
+        # Add node to stack & kind index for further postprocessing
         self.nodestack.append(node)
+        if node_kind in self.indexed_kinds:
+            self.kinds_index[node_kind].append(node)
 
         return node
 
+    def collect_error(self, exc: ValidationError, tag: 'TagNode', node_kind: str) -> None:
+        self.errors.total += 1
+        if self.deduplicate_errors:
+            error_key = (node_kind, tuple((err['loc'], err['type']) for err in exc.errors()))
+            collected_error = self._errors_index.get(error_key)
+            if collected_error is not None:
+                collected_error.count += 1
+                return
+        if self.max_errors is not None and len(self.errors) >= self.max_errors:
+            return
+        # Traceback of the reason refers to parser frames, and so to the whole soup
+        error = MarkupParserError(
+            reason=exc.with_traceback(None),
+            context=tag,
+            context_limit=self.error_context_limit,
+            kind=node_kind,
+        )
+        if self.deduplicate_errors:
+            self._errors_index[error_key] = error
+        self.errors.append(error)
+
+    def render_errors_context(self) -> None:
+        for error in self.errors:
+            error.render_context()
+
+    def create_text_node(self, string: 'StringNode') -> Optional[TextNode]:
+        if self.whitespace == WHITESPACE_KEEP or string.strip(self.soup.ASCII_SPACES):
+            return string.node
+        # Newlines after blocks (or at the start of these) are meaningless unless whitespace
+        # is preserved (<pre> etc.), other whitespace-only strings separate inline nodes,
+        # so these are shared only
+        if (
+            self.whitespace == WHITESPACE_DROP
+            and '\n' in string
+            and not self.soup.preserve_whitespace_tag_stack
+            and getattr(string.previous_sibling or string.parent, 'name', None) in BLOCK_LEVEL_TAGS
+        ):
+            return None
+        content = str(string)
+        text_node = self._whitespace_nodes.get(content)
+        if text_node is None:
+            text_node = self._whitespace_nodes[content] = TextNode.create(content)
+        return text_node
+
     def recreate_tag_node(self, tag: 'TagNode', updated_node_type: NodeType) -> None:
         updated_node = self.create_node_from_tag(tag, updated_node_type)
         if not isinstance(updated_node, Node):
@@ -177,15 +474,22 @@ class TreeBuilder(LXMLTreeBuilder):
             return
 
         updated_node.children = tag.node.children  # type: ignore
+        for child in updated_node.children:
+            if isinstance(child, Node):
+                child.bind_context(child.context.data, parent=updated_node)
         current_node_id = id(tag.node)
         tag.node = updated_node
         # Top-level tag -> no references update
-        if not tag.parent:
+        parent_contents = getattr(tag.parent, 'contents', None)
+        if not isinstance(parent_contents, TagContents):
+            return
+        if not isinstance(parent_contents.ref, Node):
             return
 
-        for i, sibling in enumerate(tag.parent.node.children):
+        siblings = parent_contents.ref.children
+        for i, sibling in enumerate(siblings):
             if id(sibling) == current_node_id:
-                tag.parent.node.children[i] = tag.node
+                siblings[i] = tag.node
                 break
 
     def node_post_init(self, node: Node) -> None:
@@ -194,19 +498,32 @@ class TreeBuilder(LXMLTreeBuilder):
         task = node.post_init_method
         if task:
             self.nodetasks.append(task)
+            if self.stats is not None:
+                self.stats.tasks += 1
 
 
 class TagContents(deque):
     ref: ParsedNode
+    builder: Optional[TreeBuilder]
 
-    def __init__(self, ref: ParsedNode):
+    def __init__(self, ref: ParsedNode, builder: TreeBuilder = None):
         super().__init__()
         self.ref = ref
+        self.builder = builder
 
     def append(self, el: Union['TagNode', 'StringNode']) -> None:
-        child_node = getattr(el, 'node', None)
-        if isinstance(child_node, (Node, TextNode)) and isinstance(self.ref, Node):
-            self.ref.children.append(child_node)
+        if isinstance(self.ref, Node):
+            child_node: Union[ParsedNode, TextNode]
+            if isinstance(el, StringNode) and self.builder is not None:
+                child_node = self.builder.create_text_node(el)
+            else:
+                child_node = getattr(el, 'node', None)
+            # Invalid nodes are left out, unless these are asked to be kept in place
+            keep_invalid = self.builder is not None and self.builder.keep_invalid_nodes
+            if isinstance(child_node, (Node, TextNode)) or (
+                keep_invalid and isinstance(child_node, InvalidNode)
+            ):
+                self.ref.children.append(child_node)
         super().append(el)
 
 
@@ -226,21 +543,62 @@ class TagNode(Tag):
         node = builder.create_node_from_tag(self)
         if node:
             self.node = node
-            self.contents = TagContents(ref=self.node)
+            self.contents = TagContents(ref=self.node, builder=builder)
+        elif builder.unwrap_excluded:
+            # Excluded tag contents are passed to the closest parent node
+            parent_contents = getattr(self.parent, 'contents', None)
+            if isinstance(parent_contents, TagContents):
+                self.contents = TagContents(ref=parent_contents.ref, builder=builder)
 
     @property
     def parent_node(self) -> ParsedNode:
-        parent_tag: TagNode = self.parent
-        return parent_tag.node if parent_tag and parent_tag.name != 'body' else None
+        parent_tag = self.parent
+        while parent_tag is not None and parent_tag.name != 'body':
+            parent_node: ParsedNode = getattr(parent_tag, 'node', None)
+            if parent_node is not None:
+                return parent_node
+            parent_tag = parent_tag.parent
+        return None
 
 
 class StringNode(NavigableString):
-    node: Optional[TextNode]
+    _node: Optional[TextNode] = None
+
+    # Text node is created only once string is attached to parent node
+    @property
+    def node(self) -> TextNode:
+        if self._node is None:
+            self._node = TextNode.create(str(self))
+        return self._node
+
+
+def render_tag_context(tag: Tag, limit: int = None) -> str:
+    if limit is None:
+        return str(tag)
+    chunks: List[str] = []
+    size = 0
+
+    # Subtree is rendered until the limit is reached, the rest of it is never serialized
+    def render(el: Union[Tag, NavigableString]) -> bool:
+        nonlocal size
+        if isinstance(el, Tag):
+            attrs = ''.join(
+                f' {name}="{escape(" ".join(value) if isinstance(value, list) else value)}"'
+                for name, value in el.attrs.items()
+            )
+            chunks.append(f'<{el.name}{attrs}>')
+            size += len(chunks[-1])
+            for child in el.children:
+                if size >= limit or not render(child):
+                    return False
+            chunks.append(f'</{el.name}>')
+        else:
+            chunks.append(el.output_ready())
+        size += len(chunks[-1])
+        return size < limit
 
-    def __new__(cls, value: str):  # type: ignore
-        string = super().__new__(cls, value)
-        string.node = TextNode.create(value)
-        return string
+    render(tag)
+    return ''.join(chunks)[:limit]
 
 
 # TODO: Stylesheet type is handled as Tag, resolve it
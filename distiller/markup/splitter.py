@@ -0,0 +1,88 @@
+from re import DOTALL, IGNORECASE, compile as re_compile
+from typing import Iterable, Iterator, List, Optional
+
+VOID_TAGS = frozenset(
+    (
+        'area',
+        'base',
+        'br',
+        'col',
+        'embed',
+        'hr',
+        'img',
+        'input',
+        'link',
+        'meta',
+        'param',
+        'source',
+        'track',
+        'wbr',
+    )
+)
+RAW_TEXT_TAGS = frozenset(('script', 'style', 'textarea', 'title'))
+# Tags which make parser restructure the document, so it can't be split
+DOCUMENT_STRUCTURE_TAGS = frozenset(('html', 'head', 'body', 'frameset'))
+# Top-level elements, which parser moves to the head if these start a block parsed apart
+HEAD_TAGS = frozenset(('base', 'link', 'meta', 'script', 'style', 'title'))
+MARKUP_TOKENS = re_compile(
+    r'<!--.*?-->|<!.*?>|<(/?)([a-zA-Z][\w:-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>', DOTALL
+)
+
+
+def split_blocks(markup: str) -> Optional[List[str]]:
+    """
+    Split markup at top-level elements boundaries, text following an element goes with it.
+    None is returned, if markup is not well-formed enough to be split safely,
+    e.g. there are unclosed or misnested tags
+    """
+    blocks: List[str] = []
+    stack: List[str] = []
+    block_start = 0
+    pos = 0
+    while True:
+        match = MARKUP_TOKENS.search(markup, pos)
+        if match is None:
+            break
+        pos = match.end()
+        is_end, tagname, attrs = match.groups()
+        if tagname is None:
+            continue
+        tagname = tagname.lower()
+        if tagname in DOCUMENT_STRUCTURE_TAGS:
+            return None
+        if is_end:
+            if not stack or stack.pop() != tagname:
+                return None
+            continue
+        if not stack and tagname in HEAD_TAGS:
+            return None
+        # Top-level element starts a new block
+        if not stack and match.start() > block_start:
+            blocks.append(markup[block_start : match.start()])
+            block_start = match.start()
+        if tagname in RAW_TEXT_TAGS:
+            closing = re_compile(rf'</{tagname}\s*>', IGNORECASE).search(markup, pos)
+            if closing is None:
+                return None
+            pos = closing.end()
+        elif tagname not in VOID_TAGS and not attrs.rstrip().endswith('/'):
+            stack.append(tagname)
+    if stack:
+        return None
+    if block_start < len(markup):
+        blocks.append(markup[block_start:])
+    return blocks
+
+
+def join_blocks(blocks: Iterable[str], size: int) -> Iterator[str]:
+    # Consecutive blocks are joined into chunks of at least the given size, except the last one
+    chunk: List[str] = []
+    chunk_size = 0
+    for block in blocks:
+        chunk.append(block)
+        chunk_size += len(block)
+        if chunk_size >= size:
+            yield ''.join(chunk)
+            chunk, chunk_size = [], 0
+    if chunk:
+        yield ''.join(chunk)
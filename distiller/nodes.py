@@ -1,35 +1,53 @@
+from collections import ChainMap
+from copy import deepcopy
 from inspect import getmembers, isclass
 from io import StringIO
+from itertools import islice
 from re import sub as re_sub
-from types import ModuleType
+from types import MappingProxyType, ModuleType
 from typing import (
+    TYPE_CHECKING,
     Any,
     Callable,
     Dict,
     Iterable,
     Iterator,
+    List,
     Mapping,
     MutableSequence,
     NamedTuple,
     Optional,
+    Sequence,
     Set,
     Type,
     Union,
 )
 
 from pydantic import BaseModel, Extra, Field, NoneStr, PrivateAttr, validator
+from pydantic.fields import Undefined
 
+from .codegen import NODE_CODECS, get_node_codec
 from .helpers import KNOWN_CONTAINER_KINDS, NodeKind, jsonify_node_value, normalize_whitespace
 
+if TYPE_CHECKING:  # pragma: no cover
+    from .interning import Interner
+
 RESERVED_NODE_ATTRS_NAMES = {'kind', 'children'}
 DEFAULT_NODE_SCHEMA_TITLE = 'Distilled node'
 TEXT_NODE_KIND = NodeKind('text')
 INVALID_NODE_KIND = NodeKind('invalid-node')
+EMPTY_CONTEXT_DATA: Mapping[str, Any] = MappingProxyType({})
+# Deserialization modes: subnodes are iterated once only, cached on first access
+# or built into tuples right away
+DESERIALIZE_LAZY = 'lazy'
+DESERIALIZE_CACHED = 'cached'
+DESERIALIZE_MATERIALIZED = 'materialized'
+DESERIALIZE_MODES = {DESERIALIZE_LAZY, DESERIALIZE_CACHED, DESERIALIZE_MATERIALIZED}
 
 
 class NodeContext(NamedTuple):
     parent: Optional['Node'] = None
-    data: Dict[str, Any] = {}
+    data: Mapping[str, Any] = EMPTY_CONTEXT_DATA
 
 
 class State(BaseModel):
@@ -40,6 +58,9 @@ class BaseNode(BaseModel):
     kind: NodeKind
 
     def serialize(self, **kwargs: Any) -> Any:
+        codec = get_node_codec(self, kwargs)
+        if codec is not None:
+            return codec.serialize(self.__dict__, kwargs.get('include'), kwargs.get('exclude'))
         return self.dict(**kwargs)
 
     def to_html(self, **kwargs: Any) -> str:
@@ -48,6 +69,57 @@ class BaseNode(BaseModel):
     def to_plaintext(self, **kwargs: Any) -> str:
         raise NotImplementedError  # pragma: no cover
 
+    # Nodes are pickled as compact tuples, fields set is omitted unless it differs from fields
+    def __getstate__(self) -> Any:
+        fields_set = self.__fields_set__
+        return (
+            self.__dict__,
+            None if fields_set == self.__dict__.keys() else fields_set,
+            self._private_state(),
+        )
+
+    def __setstate__(self, state: Any) -> None:
+        values, fields_set, private_values = state
+        object.__setattr__(self, '__dict__', values)
+        object.__setattr__(
+            self, '__fields_set__', set(values) if fields_set is None else fields_set
+        )
+        for name, value in (private_values or {}).items():
+            object.__setattr__(self, name, value)
+
+    def _private_state(self) -> Optional[Dict[str, Any]]:
+        private_values = {}
+        for name in self.__private_attributes__:
+            value = getattr(self, name, Undefined)
+            if value is not Undefined:
+                private_values[name] = value
+        return private_values or None
+
+    # Copies keep private values, unlike pickled nodes
+    def __copy__(self) -> Any:
+        return self._create_copy(dict(self.__dict__), None)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Any:
+        copied = self.__class__.__new__(self.__class__)
+        # Nested values may refer to the copy, e.g. as a parent
+        memo[id(self)] = copied
+        return self._create_copy(deepcopy(self.__dict__, memo), memo, copied)
+
+    def _create_copy(
+        self, values: Dict[str, Any], memo: Optional[Dict[int, Any]], copied: Any = None
+    ) -> Any:
+        copied = copied if copied is not None else self.__class__.__new__(self.__class__)
+        object.__setattr__(copied, '__dict__', values)
+        object.__setattr__(copied, '__fields_set__', set(self.__fields_set__))
+        for name in self.__private_attributes__:
+            value = getattr(self, name, Undefined)
+            if value is not Undefined:
+                object.__setattr__(copied, name, self._copy_private_value(name, value, memo))
+        return copied
+
+    def _copy_private_value(self, name: str, value: Any, memo: Optional[Dict[int, Any]]) -> Any:
+        return value if memo is None else deepcopy(value, memo)
+
 
 class Node(BaseNode):
     kind: NodeKind = Field(default=None, title='Distilled node kind')
@@ -59,7 +131,7 @@ class Node(BaseNode):
     # otherwise class name is used
     @validator('kind', pre=True, always=True)
     def set_node_kind(cls, value: NoneStr) -> NodeKind:
-        if value is not None and cls is Node:  # type: ignore
+        if value is not None and cls is Node:
             return NodeKind(value)
         return cls.get_node_kind_value()
 
@@ -70,7 +142,12 @@ class Node(BaseNode):
     def serialize(self, **kwargs: Any) -> Dict[str, Any]:
         exclude = kwargs.get('exclude') or set()
         kwargs.update(exclude=exclude.union({'children'}))
-        serialized: dict = self.dict(**kwargs)
+        codec = get_node_codec(self, kwargs)
+        serialized: dict
+        if codec is not None:
+            serialized = codec.serialize(self.__dict__, kwargs.get('include'), kwargs['exclude'])
+        else:
+            serialized = self.dict(**kwargs)
         if self.children:
             children = serialize_nodelist(self.children, **kwargs)
             serialized.update(children=tuple(children))
@@ -83,26 +160,10 @@ class Node(BaseNode):
         allowed_attrs: 'AllowedAttrs' = None,
         **kwargs: Any,
     ) -> str:
-        self_allowed_attrs = None
-        if allowed_attrs is not None:
-            self_allowed_attrs = set(allowed_attrs.get(self.kind, ()))
-        serialized = self.dict(exclude={'children'}, include=self_allowed_attrs)
         tagname = self.kind
         if not tagname:
             return ''
-        attrs_map = {}
-        positional_attrs = []
-        for attr_name, attr_value in serialized.items():
-            if isinstance(attr_value, bool):
-                if attr_value is True:
-                    positional_attrs.append(attr_name)
-            elif isinstance(attr_value, (str, int)):
-                attrs_map[attr_name] = attr_value
-            else:
-                attrs_map[attr_name] = jsonify_node_value(attr_value)
-        attrs = ''.join(f' {attr}="{value}"' for attr, value in attrs_map.items())
-        if positional_attrs:
-            attrs = f'{attrs} {" ".join(positional_attrs)}'
+        attrs = self.get_html_attrs(allowed_attrs)
         if self.children:
             inner_html = self.get_inner_html(
                 include=include, exclude=exclude, allowed_attrs=allowed_attrs
@@ -110,6 +171,16 @@ class Node(BaseNode):
             return f'<{tagname}{attrs}>{inner_html}</{tagname}>'
         return f'<{tagname}{attrs} />'
 
+    def get_html_attrs(self, allowed_attrs: 'AllowedAttrs' = None) -> str:
+        self_allowed_attrs = None
+        if allowed_attrs is not None:
+            self_allowed_attrs = set(allowed_attrs.get(self.kind, ()))
+        codec = NODE_CODECS.get(self.__class__)
+        if codec is not None:
+            return codec.render_attrs(self.__dict__, self_allowed_attrs)
+        serialized = self.dict(exclude={'children'}, include=self_allowed_attrs)
+        return render_html_attrs(serialized)
+
     def get_inner_html(
         self,
         include: Set[str] = None,
@@ -172,13 +243,44 @@ class Node(BaseNode):
         return self._state.context
 
     def update_context(self, parent: 'Node' = None, **kwargs: Any) -> NodeContext:
-        ctx = NodeContext(
-            parent=parent or self._state.context.parent,
-            data={**self._state.context.data, **kwargs},
-        )
+        data = self._state.context.data
+        if kwargs:
+            # Node own values are layered over the current data instead of copying it
+            maps = data.maps if isinstance(data, ChainMap) else [data]
+            data = ChainMap(kwargs, *maps)
+        return self.bind_context(data, parent=parent or self._state.context.parent)
+
+    def bind_context(self, data: Mapping[str, Any], parent: 'Node' = None) -> NodeContext:
+        ctx = NodeContext(parent=parent, data=data)
         self._state.context = ctx
         return ctx
 
+    # Context data is shared by all the nodes and may be unpicklable, so it's not pickled,
+    # unpickled nodes are expected to be bound to context data again. Parents are linked back
+    # once children are unpickled, nodes pickled apart from their parents are top-level ones
+    def _private_state(self) -> Optional[Dict[str, Any]]:
+        private_values = super()._private_state() or {}
+        private_values.pop('_state', None)
+        return private_values or None
+
+    # Copies share context data, parents of deep copies are copied too if they're copied along
+    def _copy_private_value(self, name: str, value: Any, memo: Optional[Dict[int, Any]]) -> Any:
+        if name != '_state':
+            return super()._copy_private_value(name, value, memo)
+        parent, data = value.context
+        if memo is not None:
+            parent = memo.get(id(parent), parent)
+        state = State()
+        state.context = NodeContext(parent=parent, data=data)
+        return state
+
+    def __setstate__(self, state: Any) -> None:
+        super().__setstate__(state)
+        object.__setattr__(self, '_state', State())
+        for child in self.children or ():
+            if isinstance(child, Node):
+                child.bind_context(EMPTY_CONTEXT_DATA, parent=self)
+
     class Config:
         @staticmethod
         def _modify_node_schema(schema: Dict[str, Any], model: 'NodeType') -> None:
@@ -253,6 +355,23 @@ def text(content: str = '') -> TextNode:
     return TextNode(content=content)
 
 
+def render_html_attrs(serialized: Mapping[str, Any]) -> str:
+    attrs_map = {}
+    positional_attrs = []
+    for attr_name, attr_value in serialized.items():
+        if isinstance(attr_value, bool):
+            if attr_value is True:
+                positional_attrs.append(attr_name)
+        elif isinstance(attr_value, (str, int)):
+            attrs_map[attr_name] = attr_value
+        else:
+            attrs_map[attr_name] = jsonify_node_value(attr_value)
+    attrs = ''.join(f' {attr}="{value}"' for attr, value in attrs_map.items())
+    if positional_attrs:
+        attrs = f'{attrs} {" ".join(positional_attrs)}'
+    return attrs
+
+
 def nodelist_to_html(
     nodelist: Iterable[AnyNode],
     include: Set[str] = None,
@@ -289,7 +408,10 @@ def nodelist_to_plaintext(
         ),
         nodelist,
     )
-    plaintext = delimiter.join(chunks)
+    return normalize_plaintext(delimiter.join(chunks), delimiter)
+
+
+def normalize_plaintext(plaintext: str, delimiter: str) -> str:
     plaintext = re_sub(rf'{delimiter}+', delimiter, plaintext)
     return normalize_whitespace(plaintext)
 
@@ -304,34 +426,114 @@ def serialize_nodelist(nodelist: Iterable[AnyNode], **kwargs: Any) -> Iterator[D
 def deserialize_nodelist(
     nodelist: Iterable[Dict[str, Any]],
     types_index: Dict[str, NodeType] = None,
-    context: Dict[str, Any] = None,
+    context: Mapping[str, Any] = None,
+    parent: Node = None,
+    interner: 'Interner' = None,
+    mode: str = DESERIALIZE_LAZY,
 ) -> Iterator[AnyNode]:
     types_index = types_index or {}
-    context = context or {}
+    # All nodes share the very same context data
+    context = freeze_context(context)
     for node_dict in nodelist:
         node_dict = node_dict.copy()
         node_kind = node_dict.pop('kind', None)
         if not node_kind:
             continue
+        if interner is not None:
+            node_kind = interner.string(node_kind)
+        node_obj: AnyNode
         if node_kind == TEXT_NODE_KIND:
             content = node_dict.get('content', '').strip('\n')
-            if content:
-                yield TextNode.construct(content=content)
+            if not content:
+                continue
+            node_obj = TextNode.construct(content=content)
         elif node_kind == INVALID_NODE_KIND:
             tagname = node_dict.pop('tagname', None)
-            if tagname:
-                yield InvalidNode.construct(**node_dict, tagname=tagname)  # type: ignore
+            if not tagname:
+                continue
+            node_obj = InvalidNode.construct(**node_dict, tagname=tagname)
         else:
             node_type = types_index.get(node_kind, Node)
-            node_parent = context.pop('parent', None)
             node_children = node_dict.pop('children', [])
-            node_obj = node_type.construct(**node_dict, kind=node_kind)  # type: ignore
-            node_obj.update_context(parent=node_parent, **context)
+            if interner is not None:
+                node_dict = interner.attrs(node_dict)
+            node_obj = node_type.construct(**node_dict, kind=node_kind)
+            node_obj.bind_context(context, parent=parent)
             if node_children:
-                node_obj.children = deserialize_nodelist(  # type: ignore
-                    node_children, context={'parent': node_obj, **context}, types_index=types_index
+                children = deserialize_nodelist(
+                    node_children,
+                    types_index=types_index,
+                    context=context,
+                    parent=node_obj,
+                    interner=interner,
+                    mode=mode,
                 )
-            yield node_obj
+                # Subtrees are compared by children, so these can't be deserialized lazily
+                if mode == DESERIALIZE_MATERIALIZED or interner and interner.share_subtrees:
+                    node_obj.children = tuple(children)  # type: ignore
+                elif mode == DESERIALIZE_CACHED:
+                    node_obj.children = LazyNodeList(children)  # type: ignore
+                else:
+                    node_obj.children = children  # type: ignore
+        yield interner.share(node_obj) if interner is not None else node_obj
+
+
+class LazyNodeList(Sequence[AnyNode]):
+    """Nodes sequence, which materializes nodes on first access and caches them"""
+
+    def __init__(self, nodes: Iterable[AnyNode]):
+        self._source = iter(nodes)
+        self._materialized: List[AnyNode] = []
+
+    def __iter__(self) -> Iterator[AnyNode]:
+        # Other iterators may materialize nodes meanwhile, so these are checked on every step
+        materialized = self._materialized
+        source = self._source
+        i = 0
+        while True:
+            if i == len(materialized):
+                node = next(source, None)
+                if node is None:
+                    return
+                materialized.append(node)
+            yield materialized[i]
+            i += 1
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice) or index < 0:
+            self._materialize()
+        else:
+            self._materialize(index + 1 - len(self._materialized))
+        return self._materialized[index]
+
+    def __len__(self) -> int:
+        self._materialize()
+        return len(self._materialized)
+
+    def __bool__(self) -> bool:
+        return bool(self._materialized) or self._materialize_next()
+
+    def __reduce__(self) -> Any:
+        return tuple, (tuple(self),)
+
+    def _materialize(self, limit: int = None) -> bool:
+        size = len(self._materialized)
+        nodes = self._source if limit is None else islice(self._source, max(limit, 0))
+        self._materialized.extend(nodes)
+        return len(self._materialized) > size
+
+    def _materialize_next(self) -> bool:
+        node = next(self._source, None)
+        if node is None:
+            return False
+        self._materialized.append(node)
+        return True
+
+
+def freeze_context(context: Optional[Mapping[str, Any]]) -> Mapping[str, Any]:
+    if isinstance(context, MappingProxyType):
+        return context
+    return MappingProxyType(dict(context)) if context else EMPTY_CONTEXT_DATA
 
 
 def load_nodes_types_from_module(module: Optional[ModuleType]) -> Iterator[NodeType]:
@@ -0,0 +1,221 @@
+from functools import lru_cache
+from heapq import merge
+from re import VERBOSE, compile as re_compile
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .compact import CompactNode
+from .index import NodesIndex
+from .nodes import TEXT_NODE_KIND, AnyNode
+
+COMBINATOR_DESCENDANT = ' '
+COMBINATOR_CHILD = '>'
+SELECTOR_TOKENS = re_compile(
+    r'''
+    (?P<space>\s*(?P<combinator>[>,])\s*|\s+)
+    |(?P<any>\*)
+    |(?P<kind>[a-zA-Z][\w-]*)
+    |\.(?P<class>-?[a-zA-Z_][\w-]*)
+    |\#(?P<id>[\w-]+)
+    |\[\s*(?P<attr>[\w-]+)\s*
+        (?:(?P<op>[~^$*|]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<value>[\w-]+))\s*)?
+    \]
+    ''',
+    flags=VERBOSE,
+)
+
+NodeMatcher = Callable[[Any], bool]
+# Compound selectors with combinators to the next ones, from subject to the leftmost one
+ComplexSelector = Tuple[Optional[str], NodeMatcher, Tuple[Tuple[str, NodeMatcher], ...]]
+
+
+class SelectorSyntaxError(ValueError):
+    pass
+
+
+class CompiledSelector:
+    """
+    Selector over distilled nodes trees, which supports kinds, any kind, classes, ids,
+    attributes and descendant/child combinators. Kinds are matched as node kinds
+    """
+
+    pattern: str
+    selectors: Tuple[ComplexSelector, ...]
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.selectors = tuple(parse_selectors(pattern))
+
+    def match(self, node: AnyNode, ancestors: Sequence[AnyNode] = ()) -> bool:
+        # Ancestors go from the root to the node parent
+        for _, subject, relations in self.selectors:
+            if subject(node) and _match_relations(relations, 0, ancestors, len(ancestors)):
+                return True
+        return False
+
+    def select(self, nodes: Iterable[AnyNode]) -> Iterator[AnyNode]:
+        yield from self._select(nodes, [])
+
+    def _select(self, nodes: Iterable[AnyNode], ancestors: List[AnyNode]) -> Iterator[AnyNode]:
+        for node in nodes:
+            if self.match(node, ancestors):
+                yield node
+            children = getattr(node, 'children', None)
+            if children:
+                ancestors.append(node)
+                yield from self._select(children, ancestors)
+                ancestors.pop()
+
+    def select_indexed(self, index: NodesIndex) -> Iterator[AnyNode]:
+        # Only nodes of subject kinds are tested, if all the subjects have these
+        kinds = {kind for kind, _, _ in self.selectors}
+        if None in kinds:
+            candidates: Iterable[AnyNode] = index.order
+        else:
+            candidates = merge(
+                *(index.find_all(kind) for kind in kinds if kind), key=index.position
+            )
+        for node in candidates:
+            if self.match(node, index.ancestors(node)):
+                yield node
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.pattern!r})'
+
+
+@lru_cache(maxsize=256)
+def compile_selector(pattern: str) -> CompiledSelector:
+    return CompiledSelector(pattern)
+
+
+def parse_selectors(pattern: str) -> Iterator[ComplexSelector]:
+    compounds: List[Tuple[Optional[str], NodeMatcher]] = []
+    combinators: List[str] = []
+    predicates: List[NodeMatcher] = []
+    kind: Optional[str] = None
+    pending_combinator: Optional[str] = None
+    pos = 0
+    pattern = pattern.strip()
+
+    def close_compound() -> None:
+        nonlocal kind, predicates
+        if not predicates:
+            raise SelectorSyntaxError(f'Invalid selector: {pattern!r}')
+        compounds.append((kind, _all_of(predicates)))
+        kind, predicates = None, []
+
+    def close_complex() -> ComplexSelector:
+        close_compound()
+        (subject_kind, subject), *rest = reversed(compounds)
+        relations = tuple(zip(reversed(combinators), (matcher for _, matcher in rest)))
+        compounds.clear()
+        combinators.clear()
+        return subject_kind, subject, relations
+
+    while pos < len(pattern):
+        match = SELECTOR_TOKENS.match(pattern, pos)
+        if not match:
+            raise SelectorSyntaxError(f'Unsupported selector syntax at {pos}: {pattern!r}')
+        pos = match.end()
+        if match.group('space'):
+            combinator = match.group('combinator')
+            if combinator and pending_combinator not in (None, COMBINATOR_DESCENDANT):
+                raise SelectorSyntaxError(f'Invalid selector: {pattern!r}')
+            pending_combinator = combinator or pending_combinator or COMBINATOR_DESCENDANT
+            continue
+        if pending_combinator == ',':
+            yield close_complex()
+        elif pending_combinator:
+            close_compound()
+            combinators.append(pending_combinator)
+        pending_combinator = None
+        if match.group('any'):
+            if predicates:
+                raise SelectorSyntaxError(f'Invalid selector: {pattern!r}')
+            predicates.append(_is_element)
+        elif match.group('kind'):
+            if predicates:
+                raise SelectorSyntaxError(f'Invalid selector: {pattern!r}')
+            kind = match.group('kind').lower()
+            predicates.append(_kind_matcher(kind))
+        elif match.group('class'):
+            predicates.append(_attr_matcher('class', '~=', match.group('class')))
+        elif match.group('id'):
+            predicates.append(_attr_matcher('id', '=', match.group('id')))
+        else:
+            value = next((v for v in match.group('dq', 'sq', 'value') if v is not None), None)
+            predicates.append(_attr_matcher(match.group('attr'), match.group('op'), value))
+    if pending_combinator:
+        raise SelectorSyntaxError(f'Invalid selector: {pattern!r}')
+    yield close_complex()
+
+
+def _match_relations(
+    relations: Tuple[Tuple[str, NodeMatcher], ...],
+    i: int,
+    ancestors: Sequence[AnyNode],
+    end: int,
+) -> bool:
+    if i == len(relations):
+        return True
+    combinator, matcher = relations[i]
+    if combinator == COMBINATOR_CHILD:
+        return (
+            end > 0
+            and matcher(ancestors[end - 1])
+            and _match_relations(relations, i + 1, ancestors, end - 1)
+        )
+    for j in range(end - 1, -1, -1):
+        if matcher(ancestors[j]) and _match_relations(relations, i + 1, ancestors, j):
+            return True
+    return False
+
+
+def _all_of(predicates: List[NodeMatcher]) -> NodeMatcher:
+    if len(predicates) == 1:
+        return predicates[0]
+    predicates_ = tuple(predicates)
+    return lambda node: all(predicate(node) for predicate in predicates_)
+
+
+def _is_element(node: Any) -> bool:
+    kind: str = node.kind
+    return kind != TEXT_NODE_KIND
+
+
+def _kind_matcher(kind: str) -> NodeMatcher:
+    return lambda node: node.kind == kind
+
+
+def _attr_matcher(name: str, op: Optional[str], expected: Optional[str]) -> NodeMatcher:
+    def get_value(node: Any) -> Optional[str]:
+        if name in ('kind', 'children') or not _is_element(node):
+            return None
+        values = node.attrs if isinstance(node, CompactNode) else node.__dict__
+        value = values.get(name)
+        if value is None or value is False:
+            return None
+        # Values are matched as these are rendered in HTML attributes
+        if value is True:
+            return ''
+        if isinstance(value, (list, tuple)):
+            return ' '.join(map(str, value))
+        return str(value)
+
+    if op is None:
+        return lambda node: get_value(node) is not None
+    assert expected is not None
+    checks = {
+        '=': lambda value: value == expected,
+        '~=': lambda value: expected in value.split(),
+        '^=': lambda value: bool(expected) and value.startswith(expected),
+        '$=': lambda value: bool(expected) and value.endswith(expected),
+        '*=': lambda value: bool(expected) and expected in value,
+        '|=': lambda value: value == expected or value.startswith(f'{expected}-'),
+    }
+    check = checks[op]
+
+    def matcher(node: Any) -> bool:
+        value = get_value(node)
+        return value is not None and check(value)
+
+    return matcher
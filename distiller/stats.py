@@ -0,0 +1,75 @@
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Callable, ContextManager, Dict, Iterator, Optional
+
+STAGE_PREPROCESS = 'preprocess'
+STAGE_PARSE = 'parse'
+STAGE_RELATIONS = 'relations'
+STAGE_POSTPROCESS = 'postprocess'
+STAGE_FINALIZE = 'finalize'
+
+
+class DistillationStats:
+    timings: Dict[str, float]
+    nodes: Counter
+    invalid_nodes: int
+    errors: int
+    tasks: int
+    finalized: bool
+    hook: Optional['StatsHook']
+
+    def __init__(self, hook: 'StatsHook' = None):
+        self.timings = {}
+        self.nodes = Counter()
+        self.invalid_nodes = 0
+        self.errors = 0
+        self.tasks = 0
+        self.finalized = False
+        self.hook = hook
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + perf_counter() - started
+
+    # Hooks are bound to the process, where stats are collected, so these are not pickled
+    def __getstate__(self) -> Dict[str, Any]:
+        return {**self.__dict__, 'hook': None}
+
+    def report(self) -> None:
+        # Hook is called once the document is distilled and once more after finalization
+        if self.hook is not None:
+            self.hook(self)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'timings': dict(self.timings),
+            'nodes': dict(self.nodes),
+            'invalid_nodes': self.invalid_nodes,
+            'errors': self.errors,
+            'tasks': self.tasks,
+            'finalized': self.finalized,
+        }
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.as_dict()})'
+
+
+def measure(stats: Optional[DistillationStats], stage: str) -> ContextManager:
+    return stats.measure(stage) if stats is not None else _NOT_MEASURED
+
+
+class _NotMeasured:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NOT_MEASURED = _NotMeasured()
+StatsHook = Callable[[DistillationStats], None]
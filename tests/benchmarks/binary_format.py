@@ -0,0 +1,86 @@
+from argparse import ArgumentParser
+from itertools import islice
+from json import dumps as json_dumps, loads as json_loads
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, List
+
+from distiller import MarkupDistiller
+from distiller.nodes import DESERIALIZE_CACHED, nodelist_to_html
+
+from .corpus import CorpusGenerator
+
+# Binary documents are smaller and their nodes are decoded on access, so partial reads are
+# faster. Full reads are on par with JSON, though encoding is slower, as binary codec is pure
+# Python, while JSON one is written in C
+argparser = ArgumentParser(description='Binary format vs JSON: size and decoding speed')
+argparser.add_argument('--documents', type=int, default=20)
+argparser.add_argument('--blocks', type=int, default=100)
+argparser.add_argument('--seed', type=int, default=0)
+argparser.add_argument('--repeat', type=int, default=5)
+argparser.add_argument('--first', type=int, default=5, help='Number of nodes read partially')
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        best = min(best, perf_counter() - started)
+    return best
+
+
+def bench() -> None:
+    args = argparser.parse_args()
+    corpus = CorpusGenerator(seed=args.seed).corpus(args.documents, blocks=args.blocks)
+    distill = MarkupDistiller()
+    distilled = [distill(markup)[0] for markup in corpus]
+
+    with TemporaryDirectory() as tmp:
+        json_paths: List[Path] = []
+        binary_paths: List[Path] = []
+        for i, obj in enumerate(distilled):
+            json_paths.append(Path(tmp, f'{i}.json'))
+            json_paths[-1].write_text(json_dumps(obj.serialize(), ensure_ascii=False))
+            binary_paths.append(Path(tmp, f'{i}.bin'))
+            binary_paths[-1].write_bytes(obj.to_binary())
+
+        # Nodes are rendered, so nested nodes are deserialized as well. These are cached
+        # in both cases, as nodes read from binary documents are
+        def read_json(limit: int = None) -> None:
+            for path in json_paths:
+                nodes = json_loads(path.read_text())['nodes']
+                deserialized = distill.deserialize(nodes, mode=DESERIALIZE_CACHED)
+                nodelist_to_html(islice(deserialized.nodes, limit))
+
+        def read_binary(limit: int = None) -> None:
+            for path in binary_paths:
+                with distill.read_binary(path) as deserialized:
+                    nodelist_to_html(islice(deserialized.nodes, limit))
+
+        json_size = sum(path.stat().st_size for path in json_paths)
+        binary_size = sum(path.stat().st_size for path in binary_paths)
+        results = {
+            'encode': (
+                timed(lambda: [json_dumps(obj.serialize()) for obj in distilled], args.repeat),
+                timed(lambda: [obj.to_binary() for obj in distilled], args.repeat),
+            ),
+            'read all': (timed(read_json, args.repeat), timed(read_binary, args.repeat)),
+            f'read first {args.first}': (
+                timed(lambda: read_json(args.first), args.repeat),
+                timed(lambda: read_binary(args.first), args.repeat),
+            ),
+        }
+
+    print(f'Documents: {len(corpus)}')
+    print(f'Size: JSON {json_size:,} B, binary {binary_size:,} B ({json_size / binary_size:.1f}x)')
+    for name, (json_time, binary_time) in results.items():
+        print(
+            f'{name:<16} JSON {json_time * 1000:>8.2f} ms, binary {binary_time * 1000:>8.2f} ms '
+            f'({json_time / binary_time:.2f}x)'
+        )
+
+
+if __name__ == '__main__':
+    bench()
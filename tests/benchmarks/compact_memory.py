@@ -0,0 +1,61 @@
+import gc
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Any, Callable, Tuple
+
+from distiller import MarkupDistiller
+
+from .corpus import CorpusGenerator
+
+argparser = ArgumentParser(description='Retained memory of distilled vs frozen documents')
+argparser.add_argument('--documents', type=int, default=20)
+argparser.add_argument('--blocks', type=int, default=100)
+argparser.add_argument('--seed', type=int, default=0)
+
+
+def retained(build: Callable[[], Any]) -> Tuple[int, Any]:
+    gc.collect()
+    before, _ = tracemalloc.get_traced_memory()
+    result = build()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    return after - before, result
+
+
+def bench() -> None:
+    args = argparser.parse_args()
+    corpus = CorpusGenerator(seed=args.seed).corpus(args.documents, blocks=args.blocks)
+    distill = MarkupDistiller()
+
+    def distill_all() -> list:
+        results = [distill(markup)[0] for markup in corpus]
+        # Drop references to parsed soups
+        for obj in results:
+            obj._state.parser = None
+        return results
+
+    tracemalloc.start()
+    nodes_size, distilled = retained(distill_all)
+    nodes_count = sum(count_nodes(obj.nodes) for obj in distilled)
+
+    def freeze_all() -> list:
+        for obj in distilled:
+            obj.freeze()
+        return distilled
+
+    frozen_size, _ = retained(freeze_all)
+    frozen_size += nodes_size
+    tracemalloc.stop()
+
+    print(f'Documents: {len(corpus)}, nodes: {nodes_count}')
+    print(f'Nodes retained:  {nodes_size:>12,} B ({nodes_size / nodes_count:.0f} B/node)')
+    print(f'Frozen retained: {frozen_size:>12,} B ({frozen_size / nodes_count:.0f} B/node)')
+    print(f'Reduction: {nodes_size / max(frozen_size, 1):.1f}x')
+
+
+def count_nodes(nodes: Any) -> int:
+    return sum(1 + count_nodes(getattr(node, 'children', ())) for node in nodes)
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,154 @@
+from random import Random
+from typing import Any, Callable, Dict, List, Optional
+
+from faker import Faker
+
+from distiller import MarkupDistiller, Node
+from distiller.nodes import NodeType
+
+BlockFactory = Callable[['CorpusGenerator', int], str]
+# Shortcodes are tagified with this config, see MarkupDistiller(tagify=...)
+SHORTCODES_TAGIFY = '[/]'
+
+
+class Callout(Node):
+    tone: str = 'info'
+
+
+class Embed(Node):
+    src: str
+    provider: Optional[str] = None
+
+
+class Gallery(Node):
+    size: int = 0
+
+    def post_init(self) -> None:
+        self.size = len([child for child in self.children if child.kind == 'img'])
+
+
+class Lead(Node):
+    ...
+
+
+class SectionText(Node):
+    ...
+
+
+CUSTOM_TYPES: List[NodeType] = [Callout, Embed, Gallery]
+# Rules depending on ancestors only, these don't prevent markup from being split into blocks
+RELATION_RULES: Dict[str, NodeType] = {'div.section > p': SectionText}
+SIBLING_RULES: Dict[str, NodeType] = {'h2 + p': Lead}
+
+
+class CorpusGenerator:
+    fake: Faker
+    random: Random
+    depth: int
+    shortcodes: float
+    custom_types: float
+
+    def __init__(
+        self, seed: int = 0, depth: int = 2, shortcodes: float = 0.0, custom_types: float = 0.0
+    ):
+        # Shortcodes density is a share of paragraphs having one, custom types density
+        # is a share of blocks being custom nodes, see CUSTOM_TYPES
+        self.fake = Faker()
+        self.fake.seed_instance(seed)
+        self.random = Random(seed)
+        self.depth = depth
+        self.shortcodes = shortcodes
+        self.custom_types = custom_types
+
+    def document(self, blocks: int = 50) -> str:
+        return '\n'.join(self.block(self.depth) for _ in range(blocks))
+
+    def corpus(self, documents: int = 10, blocks: int = 50) -> List[str]:
+        return [self.document(blocks) for _ in range(documents)]
+
+    def block(self, depth: int) -> str:
+        if self.custom_types and self.random.random() < self.custom_types:
+            return self.random.choice(CUSTOM_BLOCK_FACTORIES)(self, depth)
+        factories = BLOCK_FACTORIES if depth > 0 else BLOCK_FACTORIES[:-1]
+        return self.random.choice(factories)(self, depth)
+
+    def inline(self) -> str:
+        words = self.fake.words(self.random.randint(4, 16))
+        for i in range(0, len(words), 5):
+            tagname = self.random.choice(('b', 'i', 'a'))
+            attrs = f' href="{self.fake.uri()}"' if tagname == 'a' else ''
+            words[i] = f'<{tagname}{attrs}>{words[i]}</{tagname}>'
+        return ' '.join(words)
+
+    def paragraph(self, depth: int) -> str:
+        shortcode = ''
+        if self.shortcodes and self.random.random() < self.shortcodes:
+            shortcode = self.shortcode()
+        return f'<p class="text">{self.inline()}. {shortcode}{self.inline()}.</p>'
+
+    def shortcode(self) -> str:
+        if self.random.random() < 0.5:
+            return f'[footnote id="{self.fake.word()}"]{self.fake.sentence()}[/footnote] '
+        return f'[icon name="{self.fake.word()}"] '
+
+    def heading(self, depth: int) -> str:
+        return f'<h2>{self.fake.sentence()}</h2>'
+
+    def listing(self, depth: int) -> str:
+        items = ''.join(f'<li>{self.inline()}</li>' for _ in range(self.random.randint(2, 6)))
+        return f'<ul>\n{items}\n</ul>'
+
+    def image(self, depth: int) -> str:
+        return f'<img src="{self.fake.image_url()}" alt="{self.fake.word()}" />'
+
+    def table(self, depth: int) -> str:
+        cells = ''.join(f'<td>{self.fake.word()}</td>' for _ in range(3))
+        rows = ''.join(f'<tr>{cells}</tr>' for _ in range(self.random.randint(2, 5)))
+        return f'<table><tbody>{rows}</tbody></table>'
+
+    def section(self, depth: int) -> str:
+        inner = '\n  '.join(self.block(depth - 1) for _ in range(self.random.randint(2, 4)))
+        return f'<div class="section">\n  {inner}\n</div>'
+
+    def callout(self, depth: int) -> str:
+        tone = self.random.choice(('info', 'warning'))
+        return f'<callout tone="{tone}">{self.paragraph(depth)}</callout>'
+
+    def embed(self, depth: int) -> str:
+        return f'<embed src="{self.fake.uri()}" provider="{self.fake.domain_word()}" />'
+
+    def gallery(self, depth: int) -> str:
+        images = ''.join(self.image(depth) for _ in range(self.random.randint(2, 5)))
+        return f'<gallery>{images}</gallery>'
+
+
+# Section goes last, so it can be skipped once the max depth is reached
+BLOCK_FACTORIES: List[BlockFactory] = [
+    CorpusGenerator.paragraph,
+    CorpusGenerator.paragraph,
+    CorpusGenerator.paragraph,
+    CorpusGenerator.heading,
+    CorpusGenerator.listing,
+    CorpusGenerator.image,
+    CorpusGenerator.table,
+    CorpusGenerator.section,
+]
+CUSTOM_BLOCK_FACTORIES: List[BlockFactory] = [
+    CorpusGenerator.callout,
+    CorpusGenerator.embed,
+    CorpusGenerator.gallery,
+]
+
+
+def create_distiller(
+    custom_types: bool = False, relations: bool = False, siblings: bool = False, **kwargs: Any
+) -> MarkupDistiller:
+    # Custom types are mapped by rules, so the corpus module isn't scanned for node types
+    rules: Dict[str, NodeType] = {}
+    if custom_types:
+        rules.update((node_type.get_node_kind_value(), node_type) for node_type in CUSTOM_TYPES)
+    if relations:
+        rules.update(RELATION_RULES)
+    if siblings:
+        rules.update(SIBLING_RULES)
+    return MarkupDistiller(rules=rules, tagify=SHORTCODES_TAGIFY, **kwargs)
@@ -0,0 +1,126 @@
+import gc
+import tracemalloc
+from argparse import ArgumentParser
+from collections import Counter
+from linecache import getline
+from typing import Any, Callable, Dict, List, Tuple
+
+from distiller.base import DistilledObject
+from distiller.nodes import DESERIALIZE_MATERIALIZED
+
+from .compact_memory import count_nodes
+from .corpus import CorpusGenerator, create_distiller
+
+argparser = ArgumentParser(description='Peak and retained memory of distillation stages')
+argparser.add_argument('--documents', type=int, default=20)
+argparser.add_argument('--blocks', type=int, default=100)
+argparser.add_argument('--shortcodes', type=float, default=0.2, help='Share of paragraphs')
+argparser.add_argument('--custom-types', type=float, default=0.1, help='Share of blocks')
+argparser.add_argument('--seed', type=int, default=0)
+argparser.add_argument(
+    '--profile',
+    type=int,
+    default=0,
+    metavar='N',
+    help='Show N top allocation sites and retained objects types per stage, '
+    'profiling adds own allocations to measurements',
+)
+argparser.add_argument('--frames', type=int, default=8, help='Traceback depth of allocations')
+
+Measurement = Tuple[int, int, Any]
+
+
+def measured(build: Callable[[], Any], profile: int = 0, label: str = '') -> Measurement:
+    # Retained memory is what is still allocated once the stage is done and garbage is collected
+    gc.collect()
+    types_before = Counter(map(type, gc.get_objects())) if profile else Counter()
+    snapshot_before = tracemalloc.take_snapshot() if profile else None
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    result = build()
+    _, peak = tracemalloc.get_traced_memory()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    if profile and snapshot_before is not None:
+        print(f'{label}:')
+        print_allocation_sites(tracemalloc.take_snapshot(), snapshot_before, profile)
+        types_after = Counter(map(type, gc.get_objects()))
+        print_retained_types(types_after - types_before, profile)
+    return peak - before, after - before, result
+
+
+def print_allocation_sites(
+    snapshot: tracemalloc.Snapshot, snapshot_before: tracemalloc.Snapshot, limit: int
+) -> None:
+    # Sites are named by the innermost frame inside the distiller package, if there is one
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    sites: Dict[str, int] = Counter()
+    for stat in snapshot.compare_to(snapshot_before, 'traceback'):
+        if stat.size_diff <= 0:
+            continue
+        frame = next(
+            (frame for frame in reversed(stat.traceback) if '/distiller/' in frame.filename),
+            stat.traceback[-1],
+        )
+        source = getline(frame.filename, frame.lineno).strip()
+        sites[f'{shorten(frame.filename)}:{frame.lineno} {source}'] += stat.size_diff
+    print('  Top allocation sites (retained):')
+    for site, size in Counter(sites).most_common(limit):
+        print(f'  {size:>12,} B  {site}')
+
+
+def print_retained_types(types: Counter, limit: int) -> None:
+    print('  Top retained objects types:')
+    for type_, count in types.most_common(limit):
+        print(f'  {count:>12,}    {type_.__module__}.{type_.__qualname__}')
+
+
+def shorten(filename: str) -> str:
+    for marker in ('/distiller/', '/site-packages/', '/lib/python'):
+        if marker in filename:
+            return filename[filename.index(marker) + 1 :]
+    return filename
+
+
+def bench() -> None:
+    args = argparser.parse_args()
+    generator = CorpusGenerator(
+        seed=args.seed, shortcodes=args.shortcodes, custom_types=args.custom_types
+    )
+    corpus = generator.corpus(args.documents, blocks=args.blocks)
+    distill = create_distiller(custom_types=args.custom_types > 0)
+    serialized = [distill(markup)[0].serialize()['nodes'] for markup in corpus]
+
+    tracemalloc.start(args.frames)
+    stages: Dict[str, Measurement] = {}
+    stages['distill'] = measured(
+        lambda: [distill(markup)[0] for markup in corpus], args.profile, 'distill'
+    )
+    distilled: List[DistilledObject] = stages['distill'][2]
+    nodes_count = sum(count_nodes(obj.nodes) for obj in distilled)
+    # Parsed soups are kept by distilled objects state until these are finalized
+    parser_size = -measured(lambda: [setattr(obj._state, 'parser', None) for obj in distilled])[1]
+    tasks_count = sum(len(obj._state.tasks) for obj in distilled)
+
+    stages['deserialize'] = measured(
+        lambda: [distill.deserialize(nodes, mode=DESERIALIZE_MATERIALIZED) for nodes in serialized],
+        args.profile,
+        'deserialize',
+    )
+    stages['finalize'] = measured(
+        lambda: [obj.finalize() for obj in distilled], args.profile, 'finalize'
+    )
+    tracemalloc.stop()
+
+    print(f'Documents: {len(corpus)}, nodes: {nodes_count}, pending tasks: {tasks_count}')
+    for name, (peak, retained, _) in stages.items():
+        print(
+            f'{name:<12} peak {peak:>12,} B ({peak // len(corpus):>10,} B/doc), '
+            f'retained {retained:>12,} B ({retained // len(corpus):>10,} B/doc, '
+            f'{retained / nodes_count:>6.0f} B/node)'
+        )
+    print(f'Parsers retained by distilled objects state: {parser_size:,} B')
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,50 @@
+from argparse import ArgumentParser
+from os import cpu_count
+from time import perf_counter
+from typing import Callable
+
+from distiller import MarkupDistiller
+
+from .corpus import CorpusGenerator
+
+argparser = ArgumentParser(description='Parallel vs sequential distillation of single documents')
+argparser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000, 20000])
+argparser.add_argument('--workers', type=int, default=None)
+argparser.add_argument('--chunk-size', type=int, default=64 * 1024)
+argparser.add_argument('--seed', type=int, default=0)
+argparser.add_argument('--repeat', type=int, default=3)
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        best = min(best, perf_counter() - started)
+    return best
+
+
+def bench() -> None:
+    args = argparser.parse_args()
+    generator = CorpusGenerator(seed=args.seed)
+    distill = MarkupDistiller()
+
+    print(f'CPUs: {cpu_count()}, workers: {args.workers or "default"}')
+    for blocks in args.sizes:
+        markup = generator.document(blocks)
+        sequential = timed(lambda: distill(markup), args.repeat)
+        parallel = timed(
+            lambda: distill.distill_parallel(
+                markup, workers=args.workers, chunk_size=args.chunk_size
+            ),
+            args.repeat,
+        )
+        print(
+            f'{blocks:>6} blocks ({len(markup) / 1024:>8.1f} KiB) '
+            f'sequential {sequential * 1000:>9.2f} ms, parallel {parallel * 1000:>9.2f} ms '
+            f'({sequential / parallel:.2f}x)'
+        )
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,85 @@
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from subprocess import check_output
+from sys import executable
+from tempfile import TemporaryDirectory
+from typing import List
+
+argparser = ArgumentParser(description='Import and distiller construction time in new processes')
+argparser.add_argument('--types', type=int, default=50, help='Number of node types')
+argparser.add_argument('--rules', type=int, default=20, help='Number of mapper rules')
+argparser.add_argument('--repeat', type=int, default=10)
+
+TYPES_MODULE = '''
+from distiller import Node
+
+{types}
+
+RULES = {{{rules}}}
+'''
+TIMED = '''
+from time import perf_counter
+{setup}
+started = perf_counter()
+{stmt}
+elapsed = perf_counter() - started
+print(elapsed)
+'''
+CONSTRUCT_SETUP = 'from distiller import MarkupDistiller\nimport bench_types'
+# Setup and timed statement of every case
+CASES = {
+    'import distiller': ('', 'import distiller'),
+    'import and deserialize': (
+        '',
+        'from distiller.base import BaseDistiller\n'
+        'BaseDistiller().deserialize([dict(kind="p", children=[])])',
+    ),
+    'import MarkupDistiller': ('', 'from distiller import MarkupDistiller'),
+    'construct': (
+        CONSTRUCT_SETUP,
+        'MarkupDistiller(types_module=bench_types, rules=bench_types.RULES)',
+    ),
+    'construct precompiled': (
+        CONSTRUCT_SETUP,
+        'MarkupDistiller(types_module=bench_types, rules=bench_types.RULES, precompiled={path!r})',
+    ),
+}
+
+
+def run(setup: str, stmt: str, pythonpath: str) -> float:
+    root = Path(__file__).parents[2]
+    output = check_output(
+        [executable, '-c', TIMED.format(setup=setup, stmt=stmt)],
+        cwd=root,
+        env={'PYTHONPATH': f'{root}:{pythonpath}'},
+        text=True,
+    )
+    return float(output)
+
+
+def bench() -> None:
+    args = argparser.parse_args()
+    types = '\n'.join(
+        f'class Type{i}(Node):\n    value: int = {i}\n    label: str = ""\n'
+        for i in range(args.types)
+    )
+    rules = ', '.join(
+        f"'div.block-{i} > p, section#s{i} p': Type{i % max(args.types, 1)}"
+        for i in range(args.rules)
+    )
+    with TemporaryDirectory() as tmp:
+        Path(tmp, 'bench_types.py').write_text(TYPES_MODULE.format(types=types, rules=rules))
+        precompiled = Path(tmp, 'mapper.pickle')
+        # Precompiled mapper is saved by the first run
+        setup, stmt = CASES['construct precompiled']
+        run(setup, stmt.format(path=str(precompiled)), tmp)
+        print(f'Types: {args.types}, rules: {args.rules}, median of {args.repeat} processes')
+        for name, (setup, stmt) in CASES.items():
+            stmt = stmt.format(path=str(precompiled))
+            times: List[float] = [run(setup, stmt, tmp) for _ in range(args.repeat)]
+            print(f'{name:<24} {median(times) * 1000:>8.2f} ms')
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,43 @@
+from argparse import ArgumentParser
+from os import cpu_count
+from sys import version
+from time import perf_counter
+from typing import Callable
+
+from .corpus import CorpusGenerator, create_distiller
+
+argparser = ArgumentParser(description='Throughput of one distiller shared by threads')
+argparser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+argparser.add_argument('--documents', type=int, default=40)
+argparser.add_argument('--blocks', type=int, default=50)
+argparser.add_argument('--seed', type=int, default=0)
+argparser.add_argument('--repeat', type=int, default=3)
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        best = min(best, perf_counter() - started)
+    return best
+
+
+def bench() -> None:
+    args = argparser.parse_args()
+    corpus = CorpusGenerator(seed=args.seed).corpus(args.documents, blocks=args.blocks)
+    distill = create_distiller()
+
+    print(f'Python {version.split()[0]}, CPUs: {cpu_count()}, documents: {len(corpus)}')
+    baseline = None
+    for threads in args.threads:
+        elapsed = timed(lambda: distill.distill_many_threaded(corpus, workers=threads), args.repeat)
+        baseline = baseline or elapsed
+        print(
+            f'{threads:>3} threads {elapsed * 1000:>9.2f} ms '
+            f'{len(corpus) / elapsed:>8.1f} docs/s ({baseline / elapsed:.2f}x)'
+        )
+
+
+if __name__ == '__main__':
+    bench()
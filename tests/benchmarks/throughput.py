@@ -0,0 +1,119 @@
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from json import dumps as json_dumps, loads as json_loads
+from pathlib import Path
+from platform import platform, python_version
+from time import perf_counter
+from typing import Any, Callable, Dict
+
+from distiller.nodes import DESERIALIZE_MATERIALIZED, nodelist_to_html, nodelist_to_plaintext
+
+from .compact_memory import count_nodes
+from .corpus import CorpusGenerator, create_distiller
+
+argparser = ArgumentParser(description='Throughput of every distillation stage')
+argparser.add_argument('--documents', type=int, default=20)
+argparser.add_argument('--blocks', type=int, default=100)
+argparser.add_argument('--depth', type=int, default=2)
+argparser.add_argument('--shortcodes', type=float, default=0.2, help='Share of paragraphs')
+argparser.add_argument('--custom-types', type=float, default=0.1, help='Share of blocks')
+argparser.add_argument('--relations', action='store_true', help='Map nodes by ancestors')
+argparser.add_argument('--siblings', action='store_true', help='Map nodes by siblings')
+argparser.add_argument('--seed', type=int, default=0)
+argparser.add_argument('--repeat', type=int, default=5)
+argparser.add_argument('--output', type=Path, help='Write results to JSON file')
+argparser.add_argument('--baseline', type=Path, help='Compare with results of a previous run')
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        best = min(best, perf_counter() - started)
+    return best
+
+
+def bench() -> None:
+    args = argparser.parse_args()
+    generator = CorpusGenerator(
+        seed=args.seed,
+        depth=args.depth,
+        shortcodes=args.shortcodes,
+        custom_types=args.custom_types,
+    )
+    corpus = generator.corpus(args.documents, blocks=args.blocks)
+    distill = create_distiller(
+        custom_types=args.custom_types > 0, relations=args.relations, siblings=args.siblings
+    )
+    tagify = distill.preprocessors[0]
+    tagified = [tagify(markup) for markup in corpus]
+    distilled = [distill(markup)[0] for markup in corpus]
+    for obj in distilled:
+        obj._state.parser = None
+    serialized = [obj.serialize()['nodes'] for obj in distilled]
+    nodes_count = sum(count_nodes(obj.nodes) for obj in distilled)
+
+    def finalize_time() -> float:
+        # Post-init tasks run once, so fresh results are finalized every time
+        objects = [distill(markup)[0] for markup in corpus]
+        return timed(lambda: [obj.finalize() for obj in objects], repeat=1)
+
+    stages: Dict[str, Callable[[], object]] = {
+        'tagify': lambda: [tagify(markup) for markup in corpus],
+        'parse': lambda: [distill(markup) for markup in corpus],
+        'to_html': lambda: [nodelist_to_html(obj.nodes) for obj in distilled],
+        'to_plaintext': lambda: [nodelist_to_plaintext(obj.nodes) for obj in distilled],
+        'serialize': lambda: [obj.serialize() for obj in distilled],
+        'deserialize': lambda: [
+            distill.deserialize(nodes, mode=DESERIALIZE_MATERIALIZED) for nodes in serialized
+        ],
+    }
+    results: Dict[str, Dict[str, float]] = {}
+    for name, fn in stages.items():
+        results[name] = stage_results(timed(fn, args.repeat), len(corpus), nodes_count)
+    finalize_seconds = min(finalize_time() for _ in range(args.repeat))
+    results['finalize'] = stage_results(finalize_seconds, len(corpus), nodes_count)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': python_version(),
+        'platform': platform(),
+        'config': {
+            name: str(value) if isinstance(value, Path) else value
+            for name, value in vars(args).items()
+        },
+        'corpus': {
+            'documents': len(corpus),
+            'nodes': nodes_count,
+            'bytes': sum(len(markup.encode()) for markup in tagified),
+        },
+        'results': results,
+    }
+    baseline = json_loads(args.baseline.read_text())['results'] if args.baseline else {}
+
+    print(f'Documents: {len(corpus)}, nodes: {nodes_count}')
+    for name, stage in results.items():
+        line = (
+            f'{name:<14} {stage["seconds"] * 1000:>9.2f} ms '
+            f'{stage["documents_per_second"]:>10,.1f} docs/s '
+            f'{stage["nodes_per_second"]:>12,.0f} nodes/s'
+        )
+        if name in baseline:
+            line += f' ({baseline[name]["seconds"] / stage["seconds"]:.2f}x vs baseline)'
+        print(line)
+    if args.output:
+        args.output.write_text(json_dumps(report, indent=2))
+        print(f'Results are written to {args.output}')
+
+
+def stage_results(seconds: float, documents: int, nodes: int) -> Dict[str, Any]:
+    return {
+        'seconds': seconds,
+        'documents_per_second': documents / seconds,
+        'nodes_per_second': nodes / seconds,
+    }
+
+
+if __name__ == '__main__':
+    bench()
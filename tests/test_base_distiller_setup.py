@@ -1,17 +1,24 @@
-from sys import modules
+from pathlib import Path
+from subprocess import check_output
+from sys import executable, modules
 from typing import Iterator
 
+from pytest import mark
+
 from distiller.base import BaseDistiller, DistilledObject
 from distiller.helpers import current_module
 from distiller.nodes import (
+    DESERIALIZE_CACHED,
+    DESERIALIZE_MATERIALIZED,
     INVALID_NODE_KIND,
     InvalidNode,
+    LazyNodeList,
     Node,
     TextNode,
     load_nodes_types_from_module,
 )
 
-from .helpers import node_dict
+from .helpers import node_dict, text_dict
 
 
 class Foo(Node):
@@ -61,3 +68,45 @@ def test_incomplete_deserialized_items():
     data = [node_dict('', foo='bar'), node_dict(INVALID_NODE_KIND)]
     redistilled = distill.deserialize(data)
     assert len(list(redistilled.nodes)) == 0
+
+
+def test_deserialized_nodes_context():
+    data = [node_dict('foo', node_dict('bar'), node_dict('bar'), node_dict('p'))]
+    context = {'pax': 42}
+    (parent,) = distill.deserialize(data, context=context, finalize_nodes=True).nodes
+    children = list(parent.children)
+    assert parent.context.parent is None
+    assert all(child.context.parent is parent for child in children)
+    assert all(child.context.data is parent.context.data for child in children)
+    assert parent.context.data == context
+
+
+@mark.parametrize('mode', [DESERIALIZE_CACHED, DESERIALIZE_MATERIALIZED])
+def test_deserialized_nodes_reusable(mode):
+    data = [node_dict('foo', node_dict('bar', text_dict('some')), text_dict('text'))]
+    redistilled = distill.deserialize(data, mode=mode)
+    plaintext = redistilled.to_plaintext()
+    assert plaintext == 'some text'
+    assert redistilled.to_plaintext() == plaintext
+    assert redistilled.to_html() == redistilled.to_html()
+    (foo,) = redistilled.nodes
+    (bar, _) = foo.children
+    sequence_type = LazyNodeList if mode == DESERIALIZE_CACHED else tuple
+    assert isinstance(foo.children, sequence_type)
+    assert isinstance(bar.children, sequence_type)
+    assert bar.context.parent is foo
+
+
+def test_features_imported_lazily():
+    features = {
+        f'distiller.{name}'
+        for name in ('binary', 'chunks', 'columns', 'diff', 'excerpts', 'index', 'selectors')
+    }
+    code = (
+        'import sys\n'
+        'from distiller.base import BaseDistiller\n'
+        'BaseDistiller().deserialize([dict(kind="p", children=[])])\n'
+        f'print(*sorted(set(sys.modules) & {features!r}))'
+    )
+    output = check_output([executable, '-c', code], cwd=Path(__file__).parents[1], text=True)
+    assert output.split() == []
@@ -129,3 +129,14 @@ def test_base_nodes_serialization(fake: Faker):
         paragraph_dict,
     )
     assert distilled.serialize()['nodes'] == serialized
+
+
+def test_node_context_layers():
+    shared = {'foo': 'bar'}
+    lead = Lead()
+    lead.bind_context(shared)
+    lead.update_context(pax=42)
+    lead.update_context(foo='baz')
+    assert lead.context.data['pax'] == 42
+    assert lead.context.data['foo'] == 'baz'
+    assert shared == {'foo': 'bar'}
@@ -0,0 +1,108 @@
+from typing import List, Optional
+
+from pytest import raises
+
+from distiller import MarkupDistiller, Node
+from distiller.base import DistilledObject
+from distiller.binary import BinaryDocument, BinaryDocumentError, encode_document
+from distiller.helpers import current_module
+from distiller.nodes import node, text
+
+
+class Figure(Node):
+    width: int = 0
+    ratio: float = 1.5
+    caption: Optional[str] = None
+    tags: List[str] = []
+
+
+class Article(DistilledObject):
+    title: str = ''
+
+
+MARKUP = (
+    '<h2>Title</h2><p>Some <b>bold</b> text</p>'
+    '<figure width="640" caption="Wide"><img src="/img.png" /></figure><p>Other</p>'
+)
+
+
+def test_binary_round_trip():
+    distill = MarkupDistiller(types_module=current_module(), return_type=Article)
+    distilled, _ = distill(MARKUP)
+    distilled.title = 'Article'
+    serialized = distilled.serialize()
+    restored = distill.read_binary(distilled.to_binary())
+    assert isinstance(restored, Article)
+    assert restored.title == 'Article'
+    assert restored.serialize() == serialized
+    assert isinstance(restored.nodes[2], Figure)
+
+
+def test_binary_values_round_trip():
+    serialized = {
+        'nodes': (
+            node('x', text('a'), num=-12, big=2**70, flag=False, none=None).dict(),
+            {'kind': 'y', 'nested': {'list': [1, (2.5, 'z')], 'empty': ()}, 'children': ()},
+            {'content': 'no kind'},
+        ),
+        'meta': {'1': True},
+    }
+    document = BinaryDocument(encode_document(serialized))
+    assert {**document.meta, 'nodes': tuple(document.roots())} == serialized
+
+
+def test_binary_lazy_file_reading(tmp_path):
+    distill = MarkupDistiller(types_module=current_module())
+    distilled, _ = distill(MARKUP)
+    path = tmp_path / 'article.bin'
+    path.write_bytes(distilled.to_binary())
+
+    restored = distill.read_binary(path)
+    assert restored.nodes[0].kind == 'h2'
+    assert len(restored.nodes._materialized) == 1
+    assert restored.to_html() == distilled.to_html()
+    # Nodes are cached once materialized
+    assert restored.to_plaintext() == distilled.to_plaintext()
+    assert restored.to_html() == distilled.to_html()
+
+    paragraphs = distill.read_binary(path, kinds={'p'})
+    assert paragraphs.to_plaintext() == 'Some bold text\n\nOther'
+
+    with BinaryDocument.open(path) as document:
+        assert len(document) == 4
+        assert document.root_kind(2) == 'figure'
+
+
+def test_binary_file_closed(tmp_path):
+    distill = MarkupDistiller(types_module=current_module())
+    distilled, _ = distill(MARKUP)
+    path = tmp_path / 'article.bin'
+    path.write_bytes(distilled.to_binary())
+
+    with distill.read_binary(path) as restored:
+        buffer = restored._binary_document.buffer
+        assert restored.nodes[0].kind == 'h2'
+    assert buffer.closed
+    # Nodes are decoded on freezing, so files aren't needed anymore
+    frozen = distill.read_binary(path)
+    buffer = frozen._binary_document.buffer
+    frozen.freeze()
+    assert buffer.closed
+    assert frozen.to_html() == distilled.to_html()
+
+
+def test_binary_empty_strings_decoded_once():
+    nodes = [{'kind': 'p', 'title': ''}] * 2
+    document = BinaryDocument(encode_document({'nodes': nodes}))
+    decoded = []
+    string = document.string
+    document.string = lambda string_id: decoded.append(string_id) or string(string_id)
+    assert list(document.roots()) == nodes
+    assert sorted(decoded) == sorted(set(decoded))
+
+
+def test_binary_invalid_document():
+    with raises(BinaryDocumentError):
+        BinaryDocument(b'{"nodes": []}' * 10)
+    with raises(BinaryDocumentError):
+        encode_document({'nodes': ({'kind': 'x', 'value': object()},)})
@@ -0,0 +1,63 @@
+from pytest import mark, raises
+
+from distiller import MarkupDistiller
+from distiller.chunks import DocumentChunk
+
+MARKUP = (
+    '<h2>Title</h2>\n'
+    '<p>First paragraph with <b>bold</b> text</p>\n'
+    '<ul><li>One</li><li>Two <i>items</i></li></ul>\n'
+    '<div><p>Nested paragraph</p><p>Another one</p></div>\n'
+    '<p>Veryveryverylongword and some more words</p>'
+)
+distill = MarkupDistiller()
+distilled, _ = distill(MARKUP)
+
+
+def test_chunks():
+    assert list(distilled.iter_chunks(40)) == [
+        DocumentChunk('Title\n\nFirst paragraph with bold text', ((0,), (2,))),
+        DocumentChunk('One\n\nTwo items\n\nNested paragraph', ((4, 0), (4, 1), (6, 0))),
+        DocumentChunk('Another one', ((6, 1),)),
+        DocumentChunk('Veryveryverylongword and some more words', ((8,),)),
+    ]
+    # Nodes longer than chunks are split, boundary kinds nodes are kept as a whole
+    assert list(distilled.iter_chunks(30, boundary_kinds=(), exclude={'h2', 'p', 'div'})) == [
+        DocumentChunk('One\n\nTwo \n\nitems', ((4,),)),
+    ]
+    assert [chunk.plaintext for chunk in distilled.iter_chunks(12, include={'p'})][-4:] == [
+        'Veryveryvery',
+        'longword and',
+        'some more',
+        'words',
+    ]
+
+
+def test_chunks_overlap():
+    chunks = list(distilled.iter_chunks(30, overlap=12, with_html=True))
+    assert [chunk.paths for chunk in chunks] == [
+        ((0,),),
+        ((2,),),
+        ((4, 0), (4, 1)),
+        ((4, 1), (6, 0)),
+        ((6, 1),),
+        ((8,),),
+        ((8,),),
+    ]
+    assert chunks[2] == DocumentChunk(
+        'One\n\nTwo items',
+        ((4, 0), (4, 1)),
+        '<li kind="li">One</li><li kind="li">Two <i kind="i">items</i></li>',
+    )
+    # Overlap is made of whole nodes only
+    assert chunks[3].plaintext == 'Two items\n\nNested paragraph'
+    assert all(len(chunk.plaintext) <= 30 for chunk in chunks)
+    with raises(AssertionError):
+        list(distilled.iter_chunks(30, overlap=30))
+
+
+@mark.parametrize('max_chars', [25, 100, 1000])
+def test_chunks_text(max_chars):
+    plaintext = distilled.to_plaintext()
+    chunks = distilled.iter_chunks(max_chars)
+    assert ' '.join(chunk.plaintext for chunk in chunks).split() == plaintext.split()
@@ -0,0 +1,93 @@
+from json import dumps as json_dumps, loads as json_loads
+
+from pytest import raises
+
+from distiller import Node
+from distiller.cli import main
+
+
+class Strict(Node):
+    required: int
+
+
+class Custom(Node):
+    ...
+
+
+RULES = {'p.custom': Custom}
+
+
+def read_lines(path):
+    return [json_loads(line) for line in path.read_text().splitlines()]
+
+
+def test_files_distillation(tmp_path, capsys):
+    (tmp_path / 'docs').mkdir()
+    (tmp_path / 'docs' / 'a.html').write_text('<p class="custom">A</p><strict />')
+    (tmp_path / 'docs' / 'b.htm').write_text('<p>[tip]B[/tip]</p>')
+    (tmp_path / 'docs' / 'skipped.txt').write_text('<p>C</p>')
+    output = tmp_path / 'output.jsonl'
+    exit_code = main(
+        [
+            str(tmp_path / 'docs'),
+            '--types=tests.test_cli',
+            '--rules=tests.test_cli:RULES',
+            '--tagify=[/]',
+            f'--output={output}',
+        ]
+    )
+    assert exit_code == 0
+    first, second = read_lines(output)
+    assert first['source'].endswith('a.html')
+    assert first['nodes'][0]['kind'] == 'custom'
+    assert first['errors'][0]['kind'] == 'strict'
+    assert second['nodes'][0]['children'][0]['kind'] == 'tip'
+    assert 'Distilled 2 documents' in capsys.readouterr().err
+
+
+def test_jsonl_distillation_in_workers(tmp_path):
+    source = tmp_path / 'dump.jsonl'
+    records = [{'id': i, 'html': f'<p>{i}</p>'} for i in range(20)] + ['<b>Plain</b>']
+    source.write_text('\n'.join(map(json_dumps, records)))
+    output = tmp_path / 'output.jsonl'
+    exit_code = main(
+        [
+            str(tmp_path / '*.jsonl'),
+            '-w2',
+            '--max-pending=3',
+            '--format=plaintext',
+            '-o',
+            str(output),
+        ]
+    )
+    assert exit_code == 0
+    # Output goes in the order of inputs
+    assert read_lines(output) == [
+        *({'source': str(i), 'plaintext': str(i)} for i in range(20)),
+        {'source': f'{source}:21', 'plaintext': 'Plain'},
+    ]
+
+
+def test_invalid_records_failed_alone(tmp_path, capsys):
+    (tmp_path / 'dump.jsonl').write_bytes(
+        b'{"id": 1, "html": "<p>\xc3\xa9</p>"}\n[1]\n{broken\n"\xff"\n"<p>Last</p>"\n'
+    )
+    (tmp_path / 'latin.html').write_bytes(b'<p>\xe9</p>')
+    output = tmp_path / 'output.jsonl'
+    exit_code = main([str(tmp_path), '--format=plaintext', f'--output={output}'])
+    assert exit_code == 1
+    first, not_object, broken, not_utf8, last, latin = read_lines(output)
+    assert first == {'source': '1', 'plaintext': 'é'}
+    assert not_object['failure'].startswith('TypeError')
+    assert broken['failure'].startswith('JSONDecodeError')
+    assert not_utf8['failure'].startswith('UnicodeDecodeError')
+    assert last == {'source': f'{tmp_path / "dump.jsonl"}:5', 'plaintext': 'Last'}
+    assert latin['source'].endswith('latin.html') and 'failure' in latin
+    err = capsys.readouterr().err
+    assert 'Distilled 6 documents' in err and 'failed documents: 4' in err
+
+
+def test_invalid_workers_number(capsys):
+    with raises(SystemExit):
+        main(['-w0'])
+    assert 'number of workers must be positive' in capsys.readouterr().err
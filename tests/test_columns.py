@@ -0,0 +1,61 @@
+from pytest import importorskip, raises
+
+from distiller import MarkupDistiller, Node
+from distiller.columns import NodeColumns
+from distiller.helpers import current_module
+
+
+class Embed(Node):
+    type: str = ''
+
+
+distill = MarkupDistiller(types_module=current_module())
+DOCUMENTS = [
+    distill('<p>First <b>bold</b></p>\n<embed type="video" />')[0],
+    distill('<div><p>Nested</p><embed type="tweet" /></div>')[0],
+]
+
+
+def test_columns_export():
+    columns = DOCUMENTS[0].to_columns(attrs=('type',), document_id=42)
+    assert columns.kinds == ['p', 'text', 'b', 'embed']
+    assert list(columns.kind_ids) == [0, 1, 2, 1, 3]
+    assert list(columns.depths) == [0, 1, 1, 2, 0]
+    assert list(columns.parents) == [-1, 0, 0, 2, -1]
+    assert list(columns.document_ids) == [42] * 5
+    assert list(columns.text_lengths) == [10, 6, 4, 4, 0]
+    assert columns.attrs == {'type': [None, None, None, None, 'video']}
+
+    # Frozen documents are exported the same way
+    frozen = distill('<p>First <b>bold</b></p>\n<embed type="video" />')[0]
+    frozen.freeze()
+    assert frozen.to_columns(attrs=('type',), document_id=42).columns() == columns.columns()
+
+    with raises(AssertionError):
+        NodeColumns(attrs=('depth',))
+
+
+def test_batch_columns_export():
+    columns = NodeColumns.from_documents(DOCUMENTS, attrs=('type',), kinds=('embed',))
+    assert len(columns) == 9
+    assert columns.kind_id('embed') == 0 and columns.kind_id('blink') is None
+    assert list(columns.document_ids) == [0] * 5 + [1] * 4
+    # Parents are rows of the whole table
+    assert list(columns.parents)[5:] == [-1, 5, 6, 5]
+    embed_id = columns.kind_id('embed')
+    embeds = [i for i, kind_id in enumerate(columns.kind_ids) if kind_id == embed_id]
+    assert [columns.attrs['type'][i] for i in embeds] == ['video', 'tweet']
+
+    columns = NodeColumns.from_documents(
+        (document.nodes for document in DOCUMENTS), document_ids=(10, 20)
+    )
+    assert set(columns.document_ids) == {10, 20}
+
+
+def test_numpy_columns():
+    numpy = importorskip('numpy')
+    columns = NodeColumns.from_documents(DOCUMENTS, attrs=('type',)).to_numpy()
+    embeds = columns['type'] != None  # noqa: E711
+    assert columns['document_id'][embeds].tolist() == [0, 1]
+    roots = numpy.bincount(columns['document_id'], weights=columns['depth'] == 0)
+    assert roots.tolist() == [2, 1]
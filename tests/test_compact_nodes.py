@@ -0,0 +1,67 @@
+from pytest import mark
+
+from distiller import MarkupDistiller, Node
+from distiller.compact import CompactDocument, CompactNode
+from distiller.helpers import current_module
+from distiller.nodes import TextNode
+
+
+class Strict(Node):
+    val: str
+
+
+class Flagged(Node):
+    enabled: bool = False
+    items: list = ['such', 'wow']
+
+
+class Custom(Node):
+    def to_html(self, **kwargs) -> str:
+        return '<custom-rendered />'
+
+
+MARKUP = (
+    '<div class="wrapper"><p class="lead">Some <b>bold</b> text</p>'
+    '<ul><li>One</li><li>Two <flagged enabled /></li></ul></div>'
+    '<p class="lead">Other <a href="/">link</a></p><strict /><custom><p>Inner</p></custom>'
+)
+
+
+@mark.parametrize(
+    'options',
+    [
+        {},
+        {'exclude': {'b'}},
+        {'include': {'p', 'a'}},
+        {'allowed_attrs': {'p': {'class'}, 'a': {'href'}}},
+    ],
+    ids=['default', 'exclude', 'include', 'allowed_attrs'],
+)
+def test_frozen_rendering(options):
+    distilled, _ = MarkupDistiller(types_module=current_module())(MARKUP)
+    html = distilled.to_html(**options)
+    plaintext_options = {k: v for k, v in options.items() if k != 'allowed_attrs'}
+    plaintext = distilled.to_plaintext(**plaintext_options)
+    serialized = distilled.serialize()
+    distilled.freeze()
+    assert all(isinstance(node, (CompactNode, Custom)) for node in distilled.nodes)
+    assert distilled.to_html(**options) == html
+    assert distilled.to_plaintext(**plaintext_options) == plaintext
+    assert distilled.serialize() == serialized
+
+
+def test_compact_nodes_access():
+    distilled, _ = MarkupDistiller(types_module=current_module())(MARKUP)
+    document = CompactDocument.from_nodes(distilled.nodes)
+    wrapper, paragraph, *_ = document.nodes
+    assert wrapper.kind == 'div'
+    assert wrapper.attrs['class'] == ['wrapper']
+    assert paragraph.children[0].node_type is TextNode
+    assert paragraph.children[0].content == 'Other '
+    assert paragraph.children[1].href == '/'
+    assert paragraph.children[1].parent.index == paragraph.index
+    flagged = wrapper.children[1].children[1].children[1]
+    assert flagged.node_type is Flagged
+    assert flagged.enabled is True
+    # Equal attrs sets are stored once
+    assert len(document.attrs_table) < len(document)
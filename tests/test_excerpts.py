@@ -0,0 +1,70 @@
+from pytest import mark, raises
+
+from distiller import MarkupDistiller, Node
+from distiller.excerpts import truncate_html_text
+from distiller.helpers import current_module
+from distiller.nodes import node, text
+
+
+class Quote(Node):
+    author: str = ''
+
+    def to_html(self, **kwargs) -> str:
+        return f'<blockquote>{self.to_plaintext()}</blockquote>'
+
+
+MARKUP = (
+    '<h2>Title</h2>\n'
+    '<p>First <b>bold</b> and <a href="/link">link</a></p>\n'
+    '<ul><li>One</li><li>Two</li></ul>\n'
+    '<quote author="Someone">Quoted text</quote>\n'
+    '<p>Fish &amp; chips</p>'
+)
+distill = MarkupDistiller(types_module=current_module())
+distilled, _ = distill(MARKUP)
+
+
+@mark.parametrize('max_chars', [0, 5, 12, 30, 45, 1000])
+@mark.parametrize('options', [{}, {'exclude': {'b'}}, {'include': {'p', 'h2'}}])
+def test_plaintext_excerpts(max_chars, options):
+    plaintext = distilled.to_plaintext(**options)
+    excerpt = distilled.excerpt_plaintext(max_chars, **options)
+    assert excerpt == plaintext[:max_chars].rstrip()
+
+
+def test_plaintext_excerpt_stops_traversal():
+    def nodes():
+        yield node('p', text('Lorem ipsum dolor sit amet'))
+        raise AssertionError('Nodes past the excerpt are traversed')
+
+    assert distill.deserialize(()).construct(nodes=nodes()).excerpt_plaintext(11) == 'Lorem ipsum'
+
+
+def test_html_excerpts():
+    assert distilled.excerpt_html(max_chars=10**6) == distilled.to_html()
+    assert distilled.excerpt_html(max_blocks=3) == (
+        '<h2 kind="h2">Title</h2>\n'
+        '<p kind="p">First <b kind="b">bold</b> and '
+        '<a kind="a" href="/link">link</a></p>\n'
+        '<ul kind="ul"><li kind="li">One</li><li kind="li">Two</li></ul>'
+    )
+    # Open tags are closed, no nodes are written once text is long enough
+    assert distilled.excerpt_html(max_chars=12, max_blocks=1) == '<h2 kind="h2">Title</h2>'
+    assert distilled.excerpt_html(max_chars=13, allowed_attrs={'a': ['href']}) == (
+        '<h2>Title</h2>\n<p>First <b>b</b></p>'
+    )
+    assert distilled.excerpt_html(max_chars=17, include={'p'}, allowed_attrs={}) == (
+        '\n<p>First  and </p>\n\n\n<p>Fi</p>'
+    )
+    # Nodes with own HTML are written as a whole
+    assert distilled.excerpt_html(max_chars=19, exclude={'p', 'ul'}, allowed_attrs={}) == (
+        '<h2>Title</h2>\n\n\n<blockquote>Quoted text</blockquote>'
+    )
+    with raises(AssertionError):
+        distilled.excerpt_html()
+
+
+def test_html_text_truncation():
+    assert truncate_html_text('Fish &amp; chips', 6) == 'Fish '
+    assert truncate_html_text('Fish &amp; chips', 10) == 'Fish &amp;'
+    assert truncate_html_text('Fish & chips', 6) == 'Fish &'
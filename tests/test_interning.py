@@ -0,0 +1,77 @@
+from distiller import MarkupDistiller, Node
+from distiller.helpers import current_module
+from distiller.interning import Interner
+
+
+class Mutable(Node):
+    def post_init(self):
+        ...
+
+
+FOOTNOTE = '<p class="note">Note <sup>1</sup></p>'
+MARKUP = f'{FOOTNOTE}{FOOTNOTE}<div>{FOOTNOTE}</div><p><mutable /></p><p><mutable /></p>'
+
+
+def test_interned_values():
+    interner = Interner(max_value_length=8)
+    distill = MarkupDistiller(types_module=current_module(), interner=interner)
+    distilled, _ = distill('<a rel="nofollow" href="/long/link/">A</a><a rel="nofollow">B</a>')
+    first, second = distilled.nodes
+    assert first.rel[0] is second.rel[0]
+    assert first.kind is second.kind
+    assert first.href not in interner.strings
+    assert interner.value({'items': ['short', 'long enough']}) == {
+        'items': ['short', 'long enough']
+    }
+
+
+def test_shared_subtrees():
+    distill = MarkupDistiller(types_module=current_module(), interner=Interner(share_subtrees=True))
+    distilled, _ = distill(MARKUP)
+    first, second, wrapper, with_mutable, other_with_mutable = distilled.nodes
+    assert first is second is wrapper.children[0]
+    # Nodes with post-init tasks and their parents are never shared
+    assert with_mutable is not other_with_mutable
+    assert with_mutable.children[0] is not other_with_mutable.children[0]
+    assert (
+        distilled.to_html() == MarkupDistiller(types_module=current_module())(MARKUP)[0].to_html()
+    )
+
+
+def test_shared_subtrees_across_documents():
+    serialized = MarkupDistiller()(MARKUP)[0].serialize()['nodes']
+    distill = MarkupDistiller(interner=Interner(share_subtrees=True))
+    first = tuple(distill.deserialize(serialized).nodes)
+    second = tuple(distill.deserialize(serialized).nodes)
+    assert first[0] is first[1] is second[0]
+    assert first[2].children[0] is second[2].children[0]
+    plain = MarkupDistiller().deserialize(serialized, finalize_nodes=True)
+    assert distill.deserialize(serialized).to_html() == plain.to_html()
+
+
+def test_bounded_tables():
+    interner = Interner(share_subtrees=True, max_table_size=4)
+    for value in ('a', 'b', 'c', 'd', 'a', 'e'):
+        interner.string(value)
+    # Least recently used entries are evicted
+    assert list(interner.strings) == ['c', 'd', 'a', 'e']
+    distill = MarkupDistiller(interner=interner)
+    for i in range(10):
+        distill(f'<p title="t{i}">Note {i}</p>')
+    assert len(interner.strings) == len(interner.subtrees) == 4
+    # Subtrees fitting the table are still shared
+    first, _ = distill('<p><b>x</b></p>')
+    second, _ = distill('<p><b>x</b></p>')
+    assert first.nodes[0] is second.nodes[0]
+    assert distill(MARKUP)[0].to_html() == MarkupDistiller()(MARKUP)[0].to_html()
+
+
+def test_shared_subtrees_parents_detached():
+    distill = MarkupDistiller(interner=Interner(share_subtrees=True))
+    first, _ = distill(f'<div>{FOOTNOTE}</div>')
+    second, _ = distill(f'<section>{FOOTNOTE}</section>')
+    shared = first.nodes[0].children[0]
+    assert shared is second.nodes[0].children[0]
+    # Shared nodes have many parents, these are found within documents
+    assert shared.context.parent is None
+    assert second.index.parent(shared) is second.nodes[0]
@@ -1,10 +1,17 @@
+from gc import collect
+from pathlib import Path
+from subprocess import check_output
+from sys import executable
+from weakref import ref
+
 from pytest import mark, raises
 
-from distiller import DistillerError, MarkupDistiller, Node
+from distiller import DistillerError, MarkupDistiller, Node, codegen
 from distiller.helpers import current_module
-from distiller.nodes import INVALID_NODE_KIND
+from distiller.markup.parser import MarkupParser, TreeBuilder
+from distiller.nodes import INVALID_NODE_KIND, nodelist_to_plaintext, serialize_nodelist
 
-from .helpers import node_dict
+from .helpers import node_dict, text_dict
 
 
 class Custom(Node):
@@ -96,9 +103,20 @@ def test_tagified_parsing(markup, expected):
 
 
 def test_invalid_nodes_parsing_no_raise():
-    result, errors = MarkupDistiller(types_module=current_module())('<strict>')
+    distill = MarkupDistiller(types_module=current_module(), keep_invalid_nodes=True)
+    result, errors = distill('<strict>')
     assert result.serialize()['nodes'] == (node_dict(INVALID_NODE_KIND, tagname='strict'),)
     assert len(errors) > 0
+    result, _ = distill('<p>a <strict /></p>')
+    assert result.serialize()['nodes'] == (
+        node_dict('p', text_dict('a '), node_dict(INVALID_NODE_KIND, tagname='strict')),
+    )
+
+
+def test_invalid_nodes_left_out():
+    result, errors = MarkupDistiller(types_module=current_module())('<p>a <strict /></p><strict>')
+    assert result.serialize()['nodes'] == (node_dict('p', text_dict('a ')),)
+    assert len(errors) == 2
 
 
 def test_invalid_nodes_parsing_raise():
@@ -136,3 +154,234 @@ def test_predefined_rules():
 def test_mapping_css_rules(markup, rules, expected):
     result, _ = MarkupDistiller(rules=rules)(markup)
     assert list(result.serialize()['nodes']) == expected
+
+
+def test_invalid_nodes_error_context():
+    markup = '<strict><p>Some <b>long</b> content</p></strict>'
+    _, errors = MarkupDistiller(types_module=current_module())(markup)
+    assert errors[0].context == markup
+    assert errors[0].kind == 'strict'
+    _, errors = MarkupDistiller(types_module=current_module(), error_context_limit=12)(markup)
+    assert errors[0].context == markup[:12]
+
+
+def test_invalid_nodes_error_context_releases_soup():
+    markup = '<p>Text</p><strict><p>Nested</p></strict>'
+    result, errors = MarkupDistiller(types_module=current_module(), error_context_limit=21)(markup)
+    soup = ref(result._state.parser.soup)
+    result.finalize()
+    del result
+    collect()
+    assert soup() is None
+    assert errors[0].context == '<strict><p>Nested</p>'
+
+
+def test_invalid_nodes_errors_budget():
+    markup = '<strict /><strict /><strict />'
+    _, errors = MarkupDistiller(types_module=current_module(), max_errors=2)(markup)
+    assert len(errors) == 2
+    assert errors.total == 3
+
+
+def test_invalid_nodes_errors_deduplication():
+    markup = '<strict /><strict val=ok /><strict />'
+    distill = MarkupDistiller(
+        types_module=current_module(), deduplicate_errors=True, keep_invalid_nodes=True
+    )
+    result, errors = distill(markup)
+    assert len(errors) == 1
+    assert errors[0].count == errors.total == 2
+    kinds = [node['kind'] for node in result.serialize()['nodes']]
+    assert kinds == [INVALID_NODE_KIND, 'strict', INVALID_NODE_KIND]
+
+
+class Hooked(Node):
+    hooked: bool = False
+
+    def postprocess(self) -> None:
+        self.hooked = True
+
+
+def test_targeted_postprocessors_applied():
+    modified = []
+
+    def postprocessor(node: Node) -> None:
+        if node.kind not in {'html', 'body'}:
+            modified.append(node.kind)
+
+    distill = MarkupDistiller(
+        types_module=current_module(),
+        postprocessors={'bar': postprocessor, Foo: [postprocessor], '*': [postprocessor]},
+    )
+    distilled, _ = distill('<foo /><bar /><baz /><hooked />')
+    assert sorted(modified) == ['bar', 'bar', 'baz', 'foo', 'foo', 'hooked']
+    assert distilled.nodes[-1].hooked
+
+
+def test_type_targeted_postprocessors_dispatched_by_type():
+    modified = []
+
+    def postprocessor(node: Node) -> None:
+        modified.append(type(node))
+
+    # Tags are not mapped to types of rules, though nodes of both have the same kind
+    distill = MarkupDistiller(
+        rules={'div.foo': Foo, 'div.hooked': Hooked},
+        postprocessors={Foo: postprocessor, 'foo': postprocessor},
+    )
+    distilled, _ = distill('<div class="foo"></div><foo /><div class="hooked"></div><hooked />')
+    assert [node.kind for node in distilled.nodes] == ['foo', 'foo', 'hooked', 'hooked']
+    assert sorted(modified, key=lambda node_type: node_type.__name__) == [Foo, Foo, Node]
+    *_, hooked, hooked_tag = distilled.nodes
+    assert hooked.hooked and not getattr(hooked_tag, 'hooked', False)
+
+
+@mark.parametrize(
+    'unwrap,expected',
+    [
+        (False, [node_dict('p', text_dict('z'))]),
+        (
+            True,
+            [
+                node_dict('p', text_dict('a'), text_dict('x')),
+                text_dict('t'),
+                node_dict('p', text_dict('z')),
+            ],
+        ),
+    ],
+    ids=['drop', 'unwrap'],
+)
+def test_excluded_subtrees_pruned(unwrap, expected):
+    markup = '<div><p>a<b>x</b></p><table><tr><td>t</td></tr></table></div><p>z</p>'
+    distill = MarkupDistiller(include={'p'}, unwrap_excluded=unwrap, collect_stats=True)
+    result, _ = distill(markup)
+    assert list(result.serialize()['nodes']) == expected
+    assert set(result.stats.nodes) == {'html', 'body', 'p'}
+
+
+class UnprunedTreeBuilder(TreeBuilder):
+    # Excluded elements are in the soup, with nodes left out only
+    def is_tag_pruned(self, tagname):
+        return False
+
+
+PRUNED_MARKUP = [
+    'Intro<br>more text<p>para</p>',
+    '<p>a</p>first<img src=x>second',
+    '<pre>a\n <b>x</b>\n</pre>',
+    '<div>a <b>b\n<i>c</i></b>\n<pre>  <b> </b>\n</pre> <ul><li>d</li></ul>e</div>',
+]
+
+
+@mark.parametrize('markup', PRUNED_MARKUP)
+@mark.parametrize(
+    'options',
+    [{'include': {'p', 'h2'}}, {'include': {'div', 'i'}}, {'exclude': {'b'}}, {'exclude': {'pre'}}],
+)
+@mark.parametrize('unwrap', [False, True])
+def test_pruned_output_same_as_excluded(markup, options, unwrap):
+    distill = MarkupDistiller(unwrap_excluded=unwrap, **options)
+    result, _ = distill(markup)
+    unpruned = MarkupParser(
+        markup,
+        mapper=distill.types_mapper,
+        include=distill.include,
+        exclude=distill.exclude,
+        unwrap_excluded=unwrap,
+        builder_cls=UnprunedTreeBuilder,
+    )
+    assert list(result.serialize()['nodes']) == list(serialize_nodelist(unpruned.nodes))
+    assert result.to_plaintext() == nodelist_to_plaintext(unpruned.nodes)
+
+
+def test_text_around_pruned_elements_not_joined():
+    result, _ = MarkupDistiller(include={'p', 'h2'})(PRUNED_MARKUP[0])
+    assert result.to_plaintext() == 'Intro\n\nmore text\n\npara'
+    result, _ = MarkupDistiller(include={'p'})(PRUNED_MARKUP[1])
+    assert result.to_plaintext() == 'a\n\nfirst\n\nsecond'
+    result, _ = MarkupDistiller(exclude={'b'})(PRUNED_MARKUP[2])
+    assert result.serialize()['nodes'] == (node_dict('pre', text_dict('a\n ')),)
+
+
+def test_excluded_context_tags_kept():
+    distill = MarkupDistiller(exclude={'bar'}, rules={'bar+baz': Custom})
+    result, _ = distill('<bar /><baz />')
+    assert list(result.serialize()['nodes']) == [node_dict('custom')]
+
+
+@mark.parametrize('markup', ['<b>first</b>\n<i>second</i>', '<p><b>first</b>\n<i>second</i></p>'])
+def test_whitespace_between_inline_nodes_kept(markup):
+    reference, _ = MarkupDistiller()(markup)
+    result, _ = MarkupDistiller(whitespace='drop')(markup)
+    assert result.to_plaintext() == reference.to_plaintext()
+    assert result.to_html() == reference.to_html()
+    assert 'firstsecond' not in result.to_plaintext()
+
+
+@mark.parametrize('policy', ['keep', 'intern', 'drop'])
+def test_whitespace_text_nodes(policy):
+    markup = '<div>\n  <p>a <b>b</b> <i>c</i></p>\n  <pre>x\n<b>y</b>\n</pre>\n</div>'
+    reference, _ = MarkupDistiller()(markup)
+    result, _ = MarkupDistiller(whitespace=policy)(markup)
+    assert result.serialize() == reference.serialize()
+    assert result.to_plaintext() == reference.to_plaintext()
+    blank_nodes = [node for node in result.nodes[0].children if node.kind == 'text']
+    if policy == 'drop':
+        assert not blank_nodes
+    elif policy == 'intern':
+        assert len(blank_nodes) > 1
+        assert len(set(map(id, blank_nodes))) == 1
+    else:
+        assert len(set(map(id, blank_nodes))) == len(blank_nodes)
+
+
+def test_invalid_whitespace_policy():
+    with raises(AssertionError):
+        MarkupDistiller(whitespace='collapse')
+
+
+def test_precompiled_mapper(tmp_path):
+    path = tmp_path / 'mapper.pickle'
+    rules = {'bar+baz': Custom, 'foo.bar': Custom}
+    distill = MarkupDistiller(types_module=current_module(), rules=rules, precompiled=path)
+    assert path.exists()
+    # Mapper is loaded as it is for the same types and rules, and compiled again otherwise
+    precompiled = MarkupDistiller(types_module=current_module(), rules=rules, precompiled=path)
+    assert precompiled.types_mapper == distill.types_mapper
+    markup = '<foo class=bar /><bar /><baz />'
+    assert precompiled(markup)[0].serialize() == distill(markup)[0].serialize()
+    other = MarkupDistiller(rules={'bar': Custom}, precompiled=path)
+    assert other('<bar />')[0].nodes[0].kind == 'custom'
+    assert not other.types_mapper.relations_rules
+
+    # Types defined in local scopes are not saved, no temporary files are left
+    class Local(Node):
+        ...
+
+    MarkupDistiller(rules={'bar': Local}, precompiled=tmp_path / 'local.pickle')
+    assert [file.name for file in tmp_path.iterdir()] == ['mapper.pickle']
+
+
+def test_precompiled_node_codecs(tmp_path, monkeypatch):
+    path = tmp_path / 'mapper.pickle'
+    monkeypatch.setattr(codegen, 'NODE_CODECS', {})
+    monkeypatch.setattr(codegen, 'COMPILED_CODECS', {})
+    rules = {'bar': Custom}
+    distill = MarkupDistiller(types_module=current_module(), rules=rules, precompiled=path)
+    compiled = codegen.COMPILED_CODECS
+
+    # Codecs are loaded with the mapper in other processes, so these are not compiled again
+    monkeypatch.setattr(codegen, 'NODE_CODECS', {})
+    monkeypatch.setattr(codegen, 'COMPILED_CODECS', {})
+    monkeypatch.setattr(codegen, 'compile', None, raising=False)
+    precompiled = MarkupDistiller(types_module=current_module(), rules=rules, precompiled=path)
+    assert codegen.COMPILED_CODECS.keys() == compiled.keys()
+    assert {Custom, Foo, Boolean} <= codegen.NODE_CODECS.keys()
+    markup = '<bar /><foo bar=baz /><boolean enabled />'
+    assert precompiled(markup)[0].to_html() == distill(markup)[0].to_html()
+
+
+def test_markup_distiller_imported_lazily():
+    code = 'import sys, distiller; print("bs4" in sys.modules, distiller.MarkupDistiller.__name__)'
+    output = check_output([executable, '-c', code], cwd=Path(__file__).parents[1], text=True)
+    assert output.split() == ['False', 'MarkupDistiller']
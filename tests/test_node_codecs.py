@@ -0,0 +1,100 @@
+from pydantic import BaseModel, Field
+from pytest import mark
+
+from distiller import MarkupDistiller
+from distiller.codegen import NODE_CODECS, compile_node_codecs, get_node_codec
+from distiller.helpers import current_module
+from distiller.nodes import InvalidNode, Node, TextNode, node, render_html_attrs, text
+
+
+class Nested(BaseModel):
+    pax: int = 42
+
+
+class Flagged(Node):
+    foo: str = 'bar'
+    count: int = 1
+    ratio: float = 0.5
+    this: bool = True
+    that: bool = False
+    items: list = ['such', 'wow', 10]
+    mapping: dict = {'hip': 'hop'}
+    nested: Nested = Nested()
+    missing: str
+
+
+class Hidden(Node):
+    secret: str = Field(default='', exclude=True)
+
+
+compile_node_codecs((Node, TextNode, InvalidNode, Flagged, Hidden))
+
+
+def pydantic_html(obj: Node, include: set = None) -> str:
+    return render_html_attrs(obj.dict(exclude={'children'}, include=include))
+
+
+NODES = [
+    Flagged(missing='yes', href='/', extra={'a': [1, 2]}, flag=True),
+    # Not validated values, missing fields and extra attributes set later
+    Flagged.construct(this='true', that=None, items=('a',), kind='flagged', count=True),
+    node('a', text('link'), href='/path', target=None, data={'x': 'y\n'}),
+    text('plain'),
+    InvalidNode(tagname='blink'),
+]
+
+
+@mark.parametrize('obj', NODES)
+@mark.parametrize('include', [None, set(), {'kind', 'foo', 'href', 'this', 'extra'}])
+@mark.parametrize('exclude', [None, {'children'}, {'kind', 'items', 'flag', 'content'}])
+def test_generated_codecs_output(obj, include, exclude):
+    codec = NODE_CODECS[obj.__class__]
+    expected = obj.dict(include=include, exclude=exclude)
+    expected.pop('children', None)
+    serialized = codec.serialize(obj.__dict__, include, (exclude or set()) | {'children'})
+    assert serialized == expected
+    assert list(serialized) == list(expected)
+    if isinstance(obj, Node):
+        assert codec.render_attrs(obj.__dict__, include) == pydantic_html(obj, include)
+
+
+def test_codecs_dispatch():
+    obj = NODES[0]
+    obj.added = 'later'
+    assert obj.serialize(exclude={'foo'})['added'] == 'later'
+    assert 'added="later"' in obj.to_html()
+
+    assert get_node_codec(obj, {'exclude': {'foo'}}) is NODE_CODECS[Flagged]
+    # Serialization options and nested fields selection are left for pydantic
+    assert get_node_codec(obj, {'exclude_none': True}) is None
+    assert get_node_codec(obj, {'include': {'nested': {'pax'}}}) is None
+    assert obj.serialize(include={'nested': {'pax'}}) == {'nested': {'pax': 42}}
+
+    assert Hidden not in NODE_CODECS
+    assert Hidden(secret='hidden').serialize() == {'kind': 'hidden'}
+
+
+class Trimmed(Node):
+    secret: str = ''
+
+    def dict(self, **kwargs):
+        return {name: value for name, value in super().dict(**kwargs).items() if name != 'secret'}
+
+
+class Rendered(Node):
+    def to_html(self, **kwargs) -> str:
+        return '<rendered />'
+
+
+class Encoded(Node):
+    class Config:
+        json_encoders = {set: sorted}
+
+
+def test_codecs_not_generated_for_custom_serialization():
+    MarkupDistiller(types_module=current_module())
+    assert {Trimmed, Rendered, Encoded}.isdisjoint(NODE_CODECS)
+    assert Flagged in NODE_CODECS
+    # Overridden dict() is respected once distiller is created
+    assert Trimmed(secret='hidden').serialize() == {'kind': 'trimmed'}
+    assert Trimmed(secret='hidden').to_html() == '<trimmed kind="trimmed" />'
@@ -0,0 +1,55 @@
+from pytest import mark
+
+from distiller import MarkupDistiller, Node
+from distiller.diff import OP_DELETE, OP_INSERT, OP_REPLACE, OP_UPDATE, apply_patch
+from distiller.helpers import current_module
+
+
+class Quote(Node):
+    author: str = ''
+
+
+distill = MarkupDistiller(types_module=current_module())
+ARTICLE = (
+    '<h2>Title</h2><p>First paragraph with <b>bold</b> text</p>'
+    '<quote author="Someone"><p>Quoted</p></quote><p>Last one</p>'
+)
+
+
+@mark.parametrize(
+    'edited,operations',
+    [
+        (ARTICLE, []),
+        (ARTICLE.replace('First', 'Edited'), [OP_REPLACE]),
+        (ARTICLE.replace('<b>bold</b>', '<i>bold</i>'), [OP_REPLACE]),
+        (ARTICLE.replace('Someone', 'Other'), [OP_UPDATE]),
+        (ARTICLE.replace('<h2>Title</h2>', ''), [OP_DELETE]),
+        (ARTICLE + '<p>Appended</p>', [OP_INSERT]),
+        ('<p>Prepended</p>' + ARTICLE.replace('<p>Last one</p>', ''), [OP_DELETE, OP_INSERT]),
+        ('<p>Other</p>', None),
+    ],
+)
+def test_diff_and_patch(edited, operations):
+    distilled, _ = distill(ARTICLE)
+    edited_distilled, _ = distill(edited)
+    patch = distilled.diff(edited_distilled)
+    if operations is not None:
+        assert [operation.op for operation in patch] == operations
+    serialized = distilled.serialize()['nodes']
+    expected = edited_distilled.serialize()['nodes']
+    assert apply_patch(serialized, patch) == expected
+    # Source nodes are left intact
+    assert serialized == distilled.serialize()['nodes']
+    assert distill.apply_patch(distilled, patch).to_html() == edited_distilled.to_html()
+
+
+def test_nested_changes_paths():
+    distilled, _ = distill(ARTICLE)
+    edited, _ = distill(ARTICLE.replace('Quoted', 'Changed').replace('Title', 'New'))
+    patch = distilled.diff(edited)
+    # Later nodes go first
+    assert [(operation.op, operation.path) for operation in patch] == [
+        (OP_REPLACE, (2, 0, 0)),
+        (OP_REPLACE, (0, 0)),
+    ]
+    assert isinstance(distill.apply_patch(distilled, patch).nodes[2], Quote)
@@ -0,0 +1,62 @@
+from pytest import raises
+
+from distiller import MarkupDistiller, Node
+from distiller.helpers import current_module
+from distiller.nodes import TextNode
+
+
+class Image(Node):
+    src: str
+
+
+class Figure(Image):
+    ...
+
+
+MARKUP = (
+    '<h2>Title</h2><p>Some <a href="/1">link</a> and <image src="/1.png" /></p>'
+    '<figure src="/2.png"><p>Caption <a href="/2">link</a></p></figure><image src="/3.png" />'
+)
+distill = MarkupDistiller(types_module=current_module())
+
+
+def test_nodes_lookup():
+    distilled, _ = distill(MARKUP)
+    links = distilled.find_all('a')
+    assert [link.href for link in links] == ['/1', '/2']
+    assert distilled.find_first('h2').children[0].content == 'Title'
+    assert distilled.find_first('table') is None
+    # Subclasses are yielded too, in document order
+    assert [image.src for image in distilled.iter_by_type(Image)] == ['/1.png', '/2.png', '/3.png']
+    assert [node.kind for node in distilled.walk()][:5] == ['h2', 'text', 'p', 'text', 'a']
+    assert all(isinstance(node, TextNode) for node in distilled.iter_by_type(TextNode))
+
+
+def test_nodes_navigation():
+    distilled, _ = distill(MARKUP)
+    index = distilled.index
+    link = distilled.find_first('a')
+    paragraph = index.parent(link)
+    assert paragraph.kind == 'p'
+    assert index.parent(paragraph) is None
+    assert index.previous_sibling(link).content == 'Some '
+    assert index.next_sibling(link).content == ' and '
+    assert index.next_sibling(index.siblings(link)[-1]) is None
+    with raises(LookupError):
+        index.parent(Node(kind='p'))
+
+
+def test_index_rebuilt():
+    distilled, _ = distill(MARKUP)
+    index = distilled.index
+    assert distilled.index is index
+    distilled.freeze()
+    assert distilled.index is not index
+    assert [image.src for image in distilled.iter_by_type(Image)] == ['/1.png', '/2.png', '/3.png']
+
+
+def test_lazily_deserialized_nodes_index():
+    serialized = distill(MARKUP)[0].serialize()['nodes']
+    redistilled = distill.deserialize(serialized)
+    assert len(redistilled.find_all('a')) == 2
+    assert redistilled.to_html() == distill(MARKUP)[0].to_html()
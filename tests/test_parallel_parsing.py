@@ -0,0 +1,82 @@
+import pickle
+
+import pytest
+from pydantic import ValidationError
+
+from distiller import MarkupDistiller, Node
+from distiller.helpers import current_module
+from distiller.markup.parser import MarkupParserError
+
+
+class Counter(Node):
+    calls: int = 0
+
+    def post_init(self):
+        self.calls += 1
+
+
+class Strict(Node):
+    required: int
+
+
+class Title(Node):
+    ...
+
+
+MARKUP = ''.join(f'<h2>Title {i}</h2>\n<p>Paragraph <b>{i}</b></p>\n<counter />' for i in range(20))
+distill = MarkupDistiller(types_module=current_module(), collect_stats=True)
+
+
+def test_parallel_distillation():
+    obj, errors = distill.distill_parallel(MARKUP, context={'lang': 'en'}, chunk_size=100)
+    expected, _ = distill(MARKUP, context={'lang': 'en'})
+    assert not errors
+    assert obj.serialize() == expected.serialize()
+    assert obj._stats.nodes == expected._stats.nodes
+    # Nodes are bound to the context with parents kept, post-init tasks are collected
+    bold = obj.select_first('p > b')
+    assert bold.context.data == {'lang': 'en'}
+    assert bold.context.parent is obj.select_first('p')
+    assert obj._stats.tasks == 20
+    obj.finalize()
+    assert all(node.calls == 1 for node in obj.find_all('counter'))
+
+
+def test_parallel_distillation_postprocessors():
+    postprocessed = []
+
+    def mark_postprocessed(node):
+        postprocessed.append(node)
+        node.lang = node.context.data['lang']
+
+    postprocessing_distill = MarkupDistiller(postprocessors={'b': mark_postprocessed})
+    # Postprocessors are called in the current process, context is not passed to workers
+    context = {'lang': 'en', 'unpicklable': lambda: None}
+    obj, _ = postprocessing_distill.distill_parallel(MARKUP, context=context, chunk_size=100)
+    assert postprocessed == obj.find_all('b') and len(postprocessed) == 20
+    assert all(node.lang == 'en' for node in postprocessed)
+
+
+def test_parallel_distillation_errors():
+    markup = '<p>Valid</p><strict>Invalid</strict>' * 5
+    _, errors = distill.distill_parallel(markup, chunk_size=20)
+    assert len(errors) == errors.total == 5
+    assert errors[0].context == '<strict>Invalid</strict>'
+    with pytest.raises(ValidationError):
+        distill.distill_parallel(markup, raise_validation_error=True, chunk_size=20)
+
+    error = pickle.loads(pickle.dumps(errors[0]))
+    assert isinstance(error, MarkupParserError)
+    assert error.context == errors[0].context
+
+
+def test_parallel_distillation_fallbacks():
+    # Small and not splittable sources are distilled in the current process
+    obj, _ = distill.distill_parallel(MARKUP)
+    assert obj.serialize() == distill(MARKUP)[0].serialize()
+    obj, _ = distill.distill_parallel('<p>Unclosed <b>tags</p>' * 10, chunk_size=10)
+    assert obj.to_html() == distill('<p>Unclosed <b>tags</p>' * 10)[0].to_html()
+
+    sibling_distill = MarkupDistiller(types_module=current_module(), rules={'h2 + p': Title})
+    obj, _ = sibling_distill.distill_parallel(MARKUP, chunk_size=100)
+    assert obj.serialize() == sibling_distill(MARKUP)[0].serialize()
@@ -0,0 +1,104 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy, deepcopy
+from multiprocessing import get_context
+
+from distiller import MarkupDistiller, Node
+from distiller.helpers import current_module
+from distiller.interning import Interner
+from distiller.markup.parser import MarkupParserError
+from distiller.nodes import DESERIALIZE_CACHED
+
+
+class Counter(Node):
+    calls: int = 0
+
+    def post_init(self):
+        self.calls += 1
+
+
+class Strict(Node):
+    required: int
+
+
+class Custom(Node):
+    ...
+
+
+def mark_processed(node):
+    node.processed = True
+
+
+MARKUP = '<p class="custom">Text <b>bold</b> [counter]</p><strict />\n<div><p>Nested</p></div>'
+distill = MarkupDistiller(
+    types_module=current_module(),
+    rules={'*': Node, 'p.custom': Custom},
+    tagify='[/]',
+    postprocessors={'b': mark_processed},
+    interner=Interner(),
+    collect_stats=True,
+    stats_hook=print,
+)
+distill.context = {'lang': 'en'}
+
+
+def distill_in_worker(distiller, markup):
+    obj, errors = distiller(markup)
+    obj.finalize()
+    return obj, errors
+
+
+def test_distiller_pickled_as_config():
+    restored = pickle.loads(pickle.dumps(distill))
+    assert restored.context == {'lang': 'en'}
+    assert restored.types_mapper.default_node_type is Node
+    assert restored.interner is not distill.interner
+    assert restored(MARKUP)[0].serialize() == distill(MARKUP)[0].serialize()
+    # Stats hooks are not pickled, these may be local functions
+    hooked = MarkupDistiller(stats_hook=lambda stats: None)
+    restored = pickle.loads(pickle.dumps(hooked))
+    assert restored.stats_hook is None and restored.collect_stats
+
+
+def test_distilled_object_pickled():
+    obj, errors = distill(MARKUP)
+    obj.find_all('b')
+    restored = pickle.loads(pickle.dumps(obj))
+    assert restored.serialize() == obj.serialize()
+    assert restored._index is None
+    assert restored.stats.nodes == obj.stats.nodes and restored.stats.hook is None
+    # Parents are linked back, context data is not pickled
+    bold = restored.find_first('b')
+    assert bold.context.parent is restored.find_first('custom')
+    assert bold.context.data == {}
+
+    error = pickle.loads(pickle.dumps(errors[0]))
+    assert isinstance(error, MarkupParserError)
+    assert error.context == errors[0].context
+
+    lazy = distill.deserialize(obj.serialize()['nodes'], mode=DESERIALIZE_CACHED)
+    assert pickle.loads(pickle.dumps(lazy)).serialize() == obj.serialize()
+
+
+def test_nodes_copied_with_context():
+    obj, _ = distill(MARKUP)
+    custom = obj.find_first('custom')
+    bold = obj.find_first('b')
+    copied = deepcopy(custom)
+    copied_bold = copied.children[1]
+    assert copied_bold is not bold and copied_bold.serialize() == bold.serialize()
+    assert copied_bold.context.parent is copied
+    assert copied.context.parent is None
+    assert copied_bold.context.data == bold.context.data == {'lang': 'en'}
+    # Shallow copies share children, which stay bound to the original node
+    assert copy(custom).context == custom.context
+    assert copy(custom).children is custom.children and bold.context.parent is custom
+
+
+def test_distilling_in_spawned_processes():
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        obj, errors = pool.submit(distill_in_worker, distill, MARKUP).result()
+    assert obj.find_first('counter').calls == 1
+    assert obj.find_first('b').processed
+    assert errors[0].kind == 'strict'
+    assert obj.serialize(exclude={'calls'}) == distill(MARKUP)[0].serialize(exclude={'calls'})
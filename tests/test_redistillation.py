@@ -0,0 +1,175 @@
+import pickle
+from random import Random
+from threading import Lock
+
+from pytest import mark
+
+from distiller import MarkupDistiller, Node
+from distiller.helpers import current_module
+from distiller.markup.splitter import split_blocks
+
+
+class Counter(Node):
+    calls: int = 0
+
+    def post_init(self):
+        self.calls += 1
+
+
+class Title(Node):
+    ...
+
+
+class Required(Node):
+    value: int
+
+
+MARKUP = '<h2>Title</h2>\n<p>First <b>paragraph</b></p>\n<counter />\n<p>Last</p>'
+EDITED = MARKUP.replace('Last', 'Edited')
+distill = MarkupDistiller(types_module=current_module(), keep_source_blocks=True)
+
+
+def test_markup_splitting():
+    assert split_blocks('text <p>a</p> tail<br><div><script>a<b</script><p>b</p></div>') == [
+        'text ',
+        '<p>a</p> tail',
+        '<br>',
+        '<div><script>a<b</script><p>b</p></div>',
+    ]
+    # Head elements at block starts are moved into head, once a block is parsed alone
+    assert split_blocks('<p>a</p><title>t</title>') is None
+    assert split_blocks('<style>p {}</style><p>a</p>') is None
+    assert split_blocks('<p>a<p>b') is None
+    assert split_blocks('<p>a</b></p>') is None
+    assert split_blocks('<body><p>a</p></body>') is None
+
+
+def test_redistilled_blocks_reused():
+    # Result distilled as a whole is split into blocks once redistilled
+    previous, _ = distill(MARKUP)
+    previous.finalize()
+    redistilled, errors = distill.redistill(previous, EDITED)
+    assert not errors
+    # Finalized nodes are reused as they are, no tasks are collected for these
+    assert not redistilled._state.tasks
+    assert redistilled.serialize(exclude={'calls'}) == distill(EDITED)[0].serialize(
+        exclude={'calls'}
+    )
+    *reused, last = [node for node in redistilled.nodes if node.kind != 'text']
+    *previous_reused, previous_last = [node for node in previous.nodes if node.kind != 'text']
+    assert all(node is previous_node for node, previous_node in zip(reused, previous_reused))
+    assert last is not previous_last
+    assert reused[-1].calls == 1
+
+    # Redistilled result is reused the same way
+    again, _ = distill.redistill(redistilled, MARKUP)
+    assert all(node is reused for node, reused in zip(again.nodes, redistilled.nodes[:-1]))
+    assert again.nodes[-1].children[0].content == 'Last'
+
+
+def test_source_blocks_kept_on_request():
+    assert distill(MARKUP, context={'lock': Lock()})[0]._source_blocks is not None
+    assert MarkupDistiller(types_module=current_module())(MARKUP)[0]._source_blocks is None
+    # Blocks are kept as keys and nodes, neither markup nor context is pickled with these
+    previous, _ = distill(MARKUP, context={'lock': Lock()})
+    restored = pickle.loads(pickle.dumps(previous))
+    assert restored._source_blocks is None
+    assert restored.serialize(exclude={'calls'}) == previous.serialize(exclude={'calls'})
+    previous.freeze()
+    assert previous._source_blocks is None
+
+
+def test_redistilled_errors():
+    markup = 'Leading <required />\n<required />\n<p>Text</p>'
+    edited = markup.replace('Text', 'Edited')
+    limited_distill = MarkupDistiller(
+        types_module=current_module(), max_errors=1, keep_source_blocks=True
+    )
+    previous, previous_errors = limited_distill(markup)
+    assert (len(previous_errors), previous_errors.total) == (1, 2)
+
+    redistilled, errors = limited_distill.redistill(previous, edited)
+    assert redistilled.serialize() == limited_distill(edited)[0].serialize()
+    assert errors == previous_errors
+    assert errors.total == 2
+    # Errors of distilled blocks are limited as a whole
+    redistilled, errors = limited_distill.redistill(redistilled, '<p>New</p>' + markup)
+    assert (len(errors), errors.total) == (1, 2)
+    reparsed = markup.replace(' />', '></required>')
+    redistilled, errors = limited_distill.redistill(redistilled, reparsed)
+    assert (len(errors), errors.total) == (1, 2)
+
+
+def test_redistillation_fallbacks():
+    previous, _ = distill.redistill(distill(MARKUP)[0], MARKUP)
+    # Changed context makes all the blocks distilled again
+    redistilled, _ = distill.redistill(previous, MARKUP, context={'lang': 'en'})
+    assert all(
+        node is not previous_node for node, previous_node in zip(redistilled.nodes, previous.nodes)
+    )
+
+    # Rules depending on siblings may cross blocks, so markup is distilled as a whole
+    sibling_distill = MarkupDistiller(types_module=current_module(), rules={'h2 + p': Title})
+    previous, _ = sibling_distill.redistill(sibling_distill(MARKUP)[0], MARKUP)
+    redistilled, _ = sibling_distill.redistill(previous, EDITED)
+    assert redistilled.nodes[2].kind == 'title'
+    assert redistilled.serialize() == sibling_distill(EDITED)[0].serialize()
+
+    redistilled, _ = distill.redistill(previous, '<p>Unclosed <b>tags</p>')
+    assert redistilled.to_html() == distill('<p>Unclosed <b>tags</p>')[0].to_html()
+
+
+BLOCKS = [
+    'Leading text ',
+    '\n',
+    '<h2>Title</h2>',
+    '<p>Some <b>bold</b> text</p>',
+    '<p>Other <i>text</i></p> tail',
+    '<counter />',
+    '<required />',
+    '<required value=1 />',
+    '<div><p>Nested <span>span</span></p><br></div>',
+    '<pre> spaced\n text </pre>',
+    '<title>Head</title>',
+    '<script>a<b</script>',
+    '<style>p {}</style>',
+    '<meta name=a>',
+    '<p>Unclosed <b>tags</p>',
+    '<ul><li>One<li>Two</ul>',
+]
+
+
+@mark.parametrize(
+    'options',
+    [
+        {},
+        {'include': ['p', 'h2', 'b', 'div', 'text']},
+        {'exclude': ['b', 'span', 'pre']},
+        {'exclude': ['b', 'span', 'pre'], 'unwrap_excluded': True},
+        {'max_errors': 1},
+    ],
+    ids=['default', 'include', 'exclude', 'unwrap', 'max_errors'],
+)
+@mark.parametrize('seed', range(10))
+def test_redistilled_same_as_distilled(options, seed):
+    random = Random(seed)
+    config_distill = MarkupDistiller(
+        types_module=current_module(), keep_source_blocks=True, **options
+    )
+    blocks = random.choices(BLOCKS, k=8)
+    previous, _ = config_distill(''.join(blocks))
+    for _ in range(5):
+        position = random.randrange(len(blocks))
+        edit = random.choice(('insert', 'replace', 'delete'))
+        if edit == 'insert':
+            blocks.insert(position, random.choice(BLOCKS))
+        elif edit == 'replace':
+            blocks[position] = random.choice(BLOCKS)
+        elif len(blocks) > 1:
+            del blocks[position]
+        markup = ''.join(blocks)
+        redistilled, errors = config_distill.redistill(previous, markup)
+        distilled, distilled_errors = config_distill(markup)
+        assert redistilled.serialize(exclude={'calls'}) == distilled.serialize(exclude={'calls'})
+        assert (len(errors), errors.total) == (len(distilled_errors), distilled_errors.total)
+        previous = redistilled
@@ -0,0 +1,62 @@
+from pytest import mark, raises
+
+from distiller import MarkupDistiller, Node
+from distiller.helpers import current_module
+from distiller.selectors import SelectorSyntaxError, compile_selector
+
+
+class Quote(Node):
+    author: str = ''
+
+
+MARKUP = (
+    '<div class="post wide" id="main"><p lang="en-US">Some <b>bold</b> text</p>'
+    '<quote author="Someone"><p><b>Quoted</b></p></quote></div>'
+    '<p><b>Outer</b> <a href="https://example.com/page" target>link</a></p>'
+)
+distill = MarkupDistiller(types_module=current_module())
+
+
+@mark.parametrize(
+    'pattern,expected',
+    [
+        ('b', ['bold', 'Quoted', 'Outer']),
+        ('div b', ['bold', 'Quoted']),
+        ('div > b', []),
+        ('p > b', ['bold', 'Quoted', 'Outer']),
+        ('quote b', ['Quoted']),
+        ('.wide > p > b', ['bold']),
+        ('#main quote[author=Someone] b', ['Quoted']),
+        ('[lang|=en] b, p:not-supported', None),
+        ('[lang|="en"] b', ['bold']),
+        ('a[href^="https://"], a[href$=page]', ['link']),
+        ('a[target]', ['link']),
+        ('a[target=yes]', []),
+        ('div.post.wide *  > b', ['bold', 'Quoted']),
+    ],
+)
+def test_selectors(pattern, expected):
+    distilled, _ = distill(MARKUP)
+    if expected is None:
+        with raises(SelectorSyntaxError):
+            distilled.select(pattern)
+        return
+    selected = distilled.select(pattern)
+    assert [node.to_plaintext() for node in selected] == expected
+    # Walk-based selection gives the same results as indexed one
+    assert list(compile_selector(pattern).select(distilled.nodes)) == selected
+    distilled.freeze()
+    assert [node.to_plaintext() for node in distilled.select(pattern)] == expected
+
+
+def test_selector_compiled_once():
+    assert compile_selector('p > b') is compile_selector('p > b')
+    distilled, _ = distill(MARKUP)
+    assert distilled.select_first('quote').author == 'Someone'
+    assert distilled.select_first('table') is None
+
+
+@mark.parametrize('pattern', ['', 'p >', '> p', 'p,,b', 'p[', 'b p.'])
+def test_invalid_selectors(pattern):
+    with raises(SelectorSyntaxError):
+        compile_selector(pattern)
@@ -0,0 +1,59 @@
+from distiller import MarkupDistiller, Node
+from distiller.helpers import current_module
+from distiller.stats import (
+    STAGE_FINALIZE,
+    STAGE_PARSE,
+    STAGE_POSTPROCESS,
+    STAGE_PREPROCESS,
+    STAGE_RELATIONS,
+    DistillationStats,
+)
+
+
+class Mutable(Node):
+    def post_init(self):
+        ...
+
+
+class Strict(Node):
+    val: str
+
+
+MARKUP = '<p>Text <mutable /></p><strict /><p>More</p>'
+
+
+def test_stats_disabled_by_default():
+    distilled, _ = MarkupDistiller(types_module=current_module())(MARKUP)
+    assert distilled.stats is None
+
+
+def test_stats_collected():
+    distill = MarkupDistiller(
+        types_module=current_module(), collect_stats=True, postprocessors=[lambda node: None]
+    )
+    distilled, errors = distill(MARKUP)
+    stats = distilled.stats
+    assert isinstance(stats, DistillationStats)
+    assert {STAGE_PREPROCESS, STAGE_PARSE, STAGE_RELATIONS, STAGE_POSTPROCESS} <= set(
+        stats.timings
+    )
+    assert stats.nodes['p'] == 2
+    assert stats.nodes['mutable'] == 1
+    assert stats.invalid_nodes == 1
+    assert stats.errors == len(errors) == 1
+    assert stats.tasks == 1
+    assert not stats.finalized
+
+    distilled.finalize()
+    assert stats.finalized
+    assert STAGE_FINALIZE in stats.timings
+
+
+def test_stats_hook_called():
+    reported = []
+    distill = MarkupDistiller(types_module=current_module(), stats_hook=reported.append)
+    distilled, _ = distill(MARKUP)
+    assert reported == [distilled.stats]
+    distilled.finalize()
+    assert len(reported) == 2
+    assert reported[-1].finalized
@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from distiller import MarkupDistiller, Node
+from distiller.helpers import current_module
+from distiller.interning import Interner
+
+
+class Counter(Node):
+    calls: int = 0
+
+    def post_init(self):
+        self.calls += 1
+
+
+class Strict(Node):
+    required: int
+
+
+class Lead(Node):
+    ...
+
+
+def count_postprocessed(node):
+    node.postprocessed = True
+
+
+distill = MarkupDistiller(
+    types_module=current_module(),
+    rules={'h2 + p': Lead},
+    postprocessors={'b': count_postprocessed},
+    interner=Interner(),
+    collect_stats=True,
+)
+
+
+def document(i):
+    counters = '<counter />' * (i % 5)
+    return f'<h2>Title {i}</h2><p>Lead {i}</p><p><b>{i}</b> {counters}</p><strict>{i}</strict>'
+
+
+def test_concurrent_calls_isolated():
+    threads = 8
+    sources = [document(i) for i in range(200)]
+    barrier = Barrier(threads)
+
+    def distill_synchronized(i):
+        # All the threads start at once to make calls overlap
+        if i < threads:
+            barrier.wait()
+        return distill(sources[i], context={'i': i})
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(distill_synchronized, range(len(sources))))
+
+    for i, (obj, errors) in enumerate(results):
+        expected, _ = distill(sources[i], context={'i': i})
+        assert obj.serialize() == expected.serialize()
+        assert len(errors) == 1 and errors[0].context == f'<strict>{i}</strict>'
+        assert all(node.context.data == {'i': i} for node in obj.walk() if isinstance(node, Node))
+        assert obj.find_first('b').postprocessed
+        # Every result has own tasks only
+        assert len(obj._state.tasks) == obj.stats.tasks == i % 5
+        obj.finalize()
+        assert all(node.calls == 1 for node in obj.find_all('counter'))
+
+
+def test_distill_many_threaded():
+    sources = [document(i) for i in range(50)]
+    results = distill.distill_many_threaded(sources, context={'lang': 'en'}, workers=4)
+    assert [obj.serialize() for obj, _ in results] == [
+        distill(source)[0].serialize() for source in sources
+    ]
+    assert results[0][0].find_first('lead').context.data == {'lang': 'en'}
+
+
+def test_mapper_rules_left_intact():
+    rules = {'*': Lead, 'p': Node}
+    MarkupDistiller(rules=rules)
+    assert rules == {'*': Lead, 'p': Node}